@@ -0,0 +1,48 @@
+"""add password update session event
+
+Revision ID: 3b1e7c9d2a45
+Revises: 0f199b88e3f0
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3b1e7c9d2a45"
+down_revision: Union[str, None] = "0f199b88e3f0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # ADD VALUE нельзя использовать в той же транзакции
+    with op.get_context().autocommit_block():
+        op.execute(
+            "ALTER TYPE public.sessionhistorychoices "
+            "ADD VALUE IF NOT EXISTS 'PASSWORD_UPDATE'"
+        )
+
+
+def downgrade() -> None:
+    # значение из enum в PostgreSQL не удалить - тип пересоздаётся
+    op.execute(
+        "UPDATE content.session_history SET name = 'REFRESH_TOKEN_UPDATE' "
+        "WHERE name = 'PASSWORD_UPDATE'"
+    )
+    op.execute(
+        "ALTER TYPE public.sessionhistorychoices "
+        "RENAME TO sessionhistorychoices_old"
+    )
+    op.execute(
+        "CREATE TYPE public.sessionhistorychoices AS ENUM "
+        "('LOGIN_WITH_PASSWORD', 'REFRESH_TOKEN_UPDATE', 'USER_LOGOUT')"
+    )
+    op.execute(
+        "ALTER TABLE content.session_history ALTER COLUMN name "
+        "TYPE public.sessionhistorychoices "
+        "USING name::text::public.sessionhistorychoices"
+    )
+    op.execute("DROP TYPE public.sessionhistorychoices_old")
@@ -1,7 +1,9 @@
 from fastapi.routing import APIRouter
 
 from api.v1.admin import router as admin_router
+from api.v1.admin import users_router
 from api.v1.auth import router as auth_router
+from api.v1.metrics import router as metrics_router
 from api.v1.oauth import google_router
 from api.v1.oauth import router as oauth_router
 from api.v1.profile import router as profile_router
@@ -12,3 +14,5 @@ router.include_router(auth_router)
 oauth_router.include_router(google_router)
 router.include_router(oauth_router)
 router.include_router(admin_router)
+router.include_router(users_router)
+router.include_router(metrics_router)
@@ -7,6 +7,7 @@ from fastapi.params import Depends
 
 from core.config import UserRoleDefault
 from responses.admin_responses import (
+    get_logout_everywhere_response,
     get_role_assign_response,
     get_role_create_response,
     get_role_del_response,
@@ -14,21 +15,28 @@ from responses.admin_responses import (
     get_role_upd_response,
 )
 from schemas.role import RoleAssign, RoleCreate, RoleRead, RoleUpdate
+from services.auth.auth_service import AuthService, get_auth_service
 from services.helpers import PermissionChecker
 from services.role.role_service import RoleService, get_role_service
 
 logger = logging.getLogger(__name__)
 
+admin_permission = Depends(
+    PermissionChecker(
+        required={UserRoleDefault.ADMIN, UserRoleDefault.SUPERUSER}
+    )
+)
+
 router = APIRouter(
     prefix="/role",
     tags=["Admin"],
-    dependencies=[
-        Depends(
-            PermissionChecker(
-                required={UserRoleDefault.ADMIN, UserRoleDefault.SUPERUSER}
-            )
-        )
-    ],
+    dependencies=[admin_permission],
+)
+
+users_router = APIRouter(
+    prefix="/users",
+    tags=["Admin"],
+    dependencies=[admin_permission],
 )
 
 
@@ -136,3 +144,17 @@ async def revoke_role(
     role_service: RoleService = Depends(get_role_service),
 ) -> None:
     return await role_service.revoke(user_id)
+
+
+@users_router.post(
+    "/{user_id}/logout_everywhere",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Revoke all user tokens",
+    description="Log the user out on all devices",
+    responses=get_logout_everywhere_response(),
+)
+async def logout_everywhere(
+    user_id: UUID,
+    auth_service: AuthService = Depends(get_auth_service),
+) -> None:
+    await auth_service.revoke_user_tokens(user_id)
@@ -14,26 +14,37 @@ from fastapi import (
 )
 
 from core.config import settings
+from exceptions.errors import UnauthorizedExc
+from models.jwt import AccessJWT, RefreshJWT
 from responses.auth_responses import (
     get_change_psw_response,
     get_login_response,
     get_signup_response,
     get_token_refr_response,
+    get_verify_batch_response,
     get_verify_response,
 )
 from schemas.auth import (
     UserLogin,
     UserLoginResponse,
     UserTokenResponse,
+    VerifyBatchResponse,
     VerifyResponse,
     VerifyRoleToken,
     VerifyToken,
+    VerifyTokenBatch,
+    VerifyTokenResult,
 )
 from schemas.user import UserCreate, UserRead, UserUpdate
 from services.auth.auth_service import AuthService, get_auth_service
-from services.utils import (
-    get_user_id_from_access_token,
-    get_user_id_from_refresh_token,
+from services.limiter import client_ip
+from services.token_context import (
+    TokenContext,
+    get_access_claims,
+    get_refresh_claims,
+    get_token_context,
+    verify_access_token,
+    verify_access_tokens,
 )
 
 logger = logging.getLogger(__name__)
@@ -54,7 +65,7 @@ async def signup_user(
     user_create: UserCreate = Body(
         ...,
         description="login, password, email, "
-                    "phone (опц), first_name (опц), last_name(опц)",
+        "phone (опц), first_name (опц), last_name(опц)",
     ),
     user_agent: Annotated[str | None, Header()] = None,
     auth_service: AuthService = Depends(get_auth_service),
@@ -65,13 +76,9 @@ async def signup_user(
     """
     logger.info("signup user %s", user_create.login)
 
-    auth_user = UserLogin(
-        login=user_create.login,
-        password=user_create.password
+    new_user, tokens = await auth_service.register_and_issue_tokens(
+        user_create, user_agent
     )
-    new_user = await auth_service.signup_user(auth_user)
-
-    user, tokens = await auth_service.login_user(auth_user, user_agent)
 
     response.set_cookie(
         key="access_token",
@@ -86,9 +93,7 @@ async def signup_user(
         samesite="lax",
     )
 
-    cookies = {
-        "access_token": tokens.access_token
-    }
+    cookies = {"access_token": tokens.access_token}
 
     # в следующей итерации заменить на создание через брокер
     async with aiohttp.ClientSession(cookies=cookies) as session:
@@ -97,20 +102,20 @@ async def signup_user(
             json=user_create.model_dump(),
             headers={
                 "Content-Type": "application/json",
-                "accept": "application/json"
-            }
+                "accept": "application/json",
+            },
         ) as response:
             if response.status != status.HTTP_200_OK:
                 logger.error(
                     "Не удалось создать профиль во внешнем сервисе. "
                     "Статус: %s, Тело ответа: %s",
                     response.status,
-                    await response.text()
+                    await response.text(),
                 )
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                     detail="Пользователь создан, "
-                           "но при создании профиля возникла ошибка."
+                    "но при создании профиля возникла ошибка.",
                 )
 
     return new_user
@@ -125,6 +130,7 @@ async def signup_user(
     responses=get_login_response(),
 )
 async def login_user(
+    request: Request,
     response: Response,
     user_login: UserLogin = Body(
         ...,
@@ -139,7 +145,10 @@ async def login_user(
     """
     logger.info("login attempt from user %s", user_login.login)
 
-    user, tokens = await auth_service.login_user(user_login, user_agent)
+    # попытки считаются по реальному IP клиента, а не по адресу nginx
+    user, tokens = await auth_service.login_user(
+        user_login, user_agent, client_ip(request)
+    )
 
     response.set_cookie(
         key="access_token",
@@ -165,9 +174,9 @@ async def login_user(
     responses=get_token_refr_response(),
 )
 async def refresh_token(
-    request: Request,
     response: Response,
-    user_id: str = Depends(get_user_id_from_refresh_token),
+    refresh: RefreshJWT = Depends(get_refresh_claims),
+    tokens: TokenContext = Depends(get_token_context),
     user_agent: Annotated[str | None, Header()] = None,
     auth_service: AuthService = Depends(get_auth_service),
 ) -> UserTokenResponse:
@@ -175,13 +184,10 @@ async def refresh_token(
     Возвращает новую пару access_token/refresh_token токенов
     в обмен на корректный refresh_token
     """
-    logger.info("token refresh from user_id %s", user_id)
-
-    access_token = request.cookies.get("access_token")
-    refresh_token = request.cookies.get("refresh_token")
+    logger.info("token refresh from user_id %s", refresh.user_id)
 
     result = await auth_service.refresh_token(
-        user_id, user_agent, access_token, refresh_token
+        user_agent, refresh, await tokens.access_or_none()
     )
 
     response.set_cookie(
@@ -210,25 +216,22 @@ async def refresh_token(
     description="User logout endpoint",
 )
 async def logout_user(
-    request: Request,
     response: Response,
-    user_id: str = Depends(get_user_id_from_access_token),
+    access: AccessJWT = Depends(get_access_claims),
+    tokens: TokenContext = Depends(get_token_context),
     user_agent: Annotated[str | None, Header()] = None,
     auth_service: AuthService = Depends(get_auth_service),
 ) -> None:
     """
     Выход пользователя - удаление токенов.
     """
-    logger.info("logout user_id %s", user_id)
-
-    access_token = request.cookies.get("access_token")
-    refresh_token = request.cookies.get("refresh_token")
+    logger.info("logout user_id %s", access.user_id)
 
     response.delete_cookie("access_token")
     response.delete_cookie("refresh_token")
 
     await auth_service.logout_user(
-        user_id, user_agent, access_token, refresh_token
+        user_agent, access, tokens.refresh_or_none()
     )
 
     return None
@@ -242,26 +245,46 @@ async def logout_user(
     responses=get_change_psw_response(),
 )
 async def password_update(
+    response: Response,
     user_update: UserUpdate = Body(
         ...,
         description="creds for update password",
     ),
-    user_id: str = Depends(get_user_id_from_access_token),
+    access: AccessJWT = Depends(get_access_claims),
+    user_agent: Annotated[str | None, Header()] = None,
     auth_service: AuthService = Depends(get_auth_service),
 ) -> None:
     """
     Обновление пароля пользователя.
+
+    Токены на остальных девайсах отзываются, текущий
+    получает новые в cookies.
     """
     logger.info(
         "password_update for user %s %s (user_id %s)",
         user_update.first_name,
         user_update.last_name,
-        user_id,
+        access.user_id,
     )
 
-    result = await auth_service.password_update(user_id, user_update)
+    tokens = await auth_service.password_update(
+        user_agent, access, user_update
+    )
+
+    response.set_cookie(
+        key="access_token",
+        value=tokens.access_token,
+        httponly=True,
+        samesite="lax",
+    )
+    response.set_cookie(
+        key="refresh_token",
+        value=tokens.refresh_token,
+        httponly=True,
+        samesite="lax",
+    )
 
-    return result
+    return None
 
 
 @router.post(
@@ -299,6 +322,38 @@ async def verify(
     """
     Проверка access токена.
     """
-    await get_user_id_from_access_token(body.access_token)
+    await verify_access_token(body.access_token)
 
     return VerifyResponse(message="User's token is valid")
+
+
+@router.post(
+    "/verify_token/batch",
+    status_code=status.HTTP_200_OK,
+    response_model=VerifyBatchResponse,
+    summary="Verify tokens batch",
+    description="Verify several user tokens in one request",
+    responses=get_verify_batch_response(),
+)
+async def verify_batch(
+    body: VerifyTokenBatch = Body(..., description="Tokens for verify"),
+) -> VerifyBatchResponse:
+    """
+    Проверка пачки access токенов.
+
+    Результаты возвращаются в порядке токенов в запросе.
+    """
+    results = await verify_access_tokens(body.access_tokens)
+
+    return VerifyBatchResponse(
+        results=[
+            (
+                VerifyTokenResult(valid=False, detail=result.detail)
+                if isinstance(result, UnauthorizedExc)
+                else VerifyTokenResult(
+                    valid=True, user_id=result.user_id, role=result.role
+                )
+            )
+            for result in results
+        ]
+    )
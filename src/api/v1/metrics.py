@@ -0,0 +1,47 @@
+import secrets
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from core.config import settings
+from services.metrics import MetricsRegistry, get_metrics_registry
+
+
+def verify_metrics_token(
+    authorization: Annotated[str | None, Header()] = None,
+) -> None:
+    """
+    Пускает к метрикам только с METRICS_TOKEN, если он задан
+    """
+    if not settings.METRICS_TOKEN:
+        return
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(
+        token.encode(), settings.METRICS_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"],
+    dependencies=[Depends(verify_metrics_token)],
+)
+
+
+@router.get(
+    "/",
+    response_class=PlainTextResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Service metrics",
+    description="Metrics of the current worker in Prometheus text format",
+)
+async def metrics(
+    registry: MetricsRegistry = Depends(get_metrics_registry),
+) -> str:
+    return registry.render()
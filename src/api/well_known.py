@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, Response, status
+
+from core.config import settings
+from services.signing import KeyRing, get_key_ring
+
+router = APIRouter(prefix="/.well-known", tags=["Well-known"])
+
+
+@router.get(
+    "/jwks.json",
+    status_code=status.HTTP_200_OK,
+    summary="JSON Web Key Set",
+    description="Public keys for local verification of issued tokens",
+)
+async def jwks(
+    response: Response,
+    key_ring: KeyRing = Depends(get_key_ring),
+) -> dict:
+    """
+    Публичные ключи подписи токенов.
+
+    Сервисы-потребители кэшируют ответ и проверяют токены у себя,
+    без запроса к /auth/verify_token. В списке все ключи, которыми
+    ещё могут быть подписаны действующие токены, поэтому ротация
+    не ломает проверку у потребителей. HS* ключи не публикуются.
+    """
+    max_age = settings.JWKS_MAX_AGE_S
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    return {"keys": key_ring.public_jwks()}
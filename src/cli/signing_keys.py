@@ -0,0 +1,87 @@
+import logging
+from typing import Optional
+
+import typer
+
+from cli.su_management import async_launcher
+from core.config import settings
+from db.redis import create_redis
+from services.signing import KeyStore, SigningKey, generate_private_key
+from services.token_minter import token_minter
+
+app = typer.Typer()
+logger = logging.getLogger(__name__)
+
+
+def _key_store() -> KeyStore:
+    return KeyStore(create_redis())
+
+
+@app.command()
+@async_launcher
+async def rotate(
+    algorithm: str = typer.Option(settings.JWT_TOKEN_ALGORITHM),
+    retire_after_m: Optional[int] = typer.Option(None),
+) -> None:
+    """
+    Генерирует и публикует новый активный ключ подписи.
+
+    Воркеры подхватывают его без перезапуска. Прежний ключ
+    продолжает проверять свои токены ещё retire_after_m минут,
+    по умолчанию - время жизни refresh токена.
+
+    Args:
+        algorithm (str): Алгоритм подписи нового ключа.
+        retire_after_m (int): Сколько минут принимать токены старого ключа.
+    """
+    retire_after = token_minter.refresh_ttl
+    if retire_after_m is not None:
+        retire_after = retire_after_m * 60
+
+    private_key = generate_private_key(algorithm)
+    key = SigningKey(algorithm, private_key)
+    store = _key_store()
+    try:
+        await store.publish(key, private_key, retire_after)
+    finally:
+        await store.redis.aclose()
+
+    typer.secho(f"Active signing key: {key.kid}", fg=typer.colors.GREEN)
+    logger.info("Signing key %s published", key.kid)
+
+
+@app.command()
+@async_launcher
+async def prune() -> None:
+    """Удаляет из Redis ключи, токены которых уже истекли"""
+    store = _key_store()
+    try:
+        removed = await store.prune()
+    finally:
+        await store.redis.aclose()
+
+    for kid in removed:
+        typer.echo(f"Removed signing key: {kid}")
+
+
+@app.command(name="list")
+@async_launcher
+async def list_keys() -> None:
+    """Показывает опубликованные ключи подписи"""
+    store = _key_store()
+    try:
+        version, active, entries = await store.load()
+    finally:
+        await store.redis.aclose()
+
+    typer.echo(f"Version: {version}")
+    for kid, entry in entries.items():
+        if kid == active:
+            state = "active"
+        else:
+            state = f"retire at {entry['retire_at']}"
+        typer.echo(f"{kid} {entry['alg']} {state}")
+
+
+if __name__ == "__main__":
+    app()
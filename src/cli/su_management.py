@@ -4,12 +4,12 @@ from functools import wraps
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from werkzeug.security import generate_password_hash
 
 from core.config import UserRoleDefault, settings
 from db.postrges_db.psql import PostgresService
 from models.user import Role, User
 from schemas.user import UserCreate
+from services.password import AbstractPasswordHasher
 
 
 def async_launcher(func):
@@ -39,7 +39,11 @@ class UserAlreadyExistsError(Exception):
         self.login = login
 
 
-async def insert_superuser(session: AsyncSession, creds: UserCreate) -> User:
+async def insert_superuser(
+    session: AsyncSession,
+    creds: UserCreate,
+    hasher: AbstractPasswordHasher,
+) -> User:
     """
     Создает нового супер пользователя с указанным логином и паролем.
 
@@ -49,6 +53,7 @@ async def insert_superuser(session: AsyncSession, creds: UserCreate) -> User:
     Args:
         session (AsyncSession): Асинхронная сессия базы данных.
         creds (UserCreate): пароль и логин
+        hasher (AbstractPasswordHasher): хэширование пароля
 
     Raises:
         UserAlreadyExistsError: Если не удалось создаьть запись
@@ -57,7 +62,7 @@ async def insert_superuser(session: AsyncSession, creds: UserCreate) -> User:
     user_create_dict = creds.model_dump()
 
     password = user_create_dict.pop("password")
-    user_create_dict["password_hash"] = generate_password_hash(password)
+    user_create_dict["password_hash"] = await hasher.hash(password)
     new_su = User(**user_create_dict)
 
     stmt = select(Role).where(Role.name == ROLE)
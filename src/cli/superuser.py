@@ -8,7 +8,10 @@ from cli.su_management import (
     init_postgresql_service,
     insert_superuser,
 )
+from core.config import settings
 from schemas.user import AdminUser
+from services.password.algorithms import get_algorithm
+from services.password.pool import ProcessPoolPasswordHasher
 
 app = typer.Typer()
 logger = logging.getLogger(__name__)
@@ -37,11 +40,23 @@ async def createsuperuser(
     """
     credentials = AdminUser(login=login, password=password)
     psql = await init_postgresql_service()
+    hasher = ProcessPoolPasswordHasher(
+        max_workers=1,
+        algorithm=get_algorithm(
+            settings.PASSWORD_HASH_ALGORITHM, settings.PASSWORD_HASH_COST
+        ),
+        time_budget=settings.PASSWORD_HASH_TIME_BUDGET_MS / 1000,
+    )
     try:
-        async for session in psql.session_getter():
-            await insert_superuser(session=session, creds=credentials)
-            typer.secho("Superuser successfuly created", fg=typer.colors.GREEN)
-            logger.info("Superuser created...")
+        async with hasher:
+            async for session in psql.session_getter():
+                await insert_superuser(
+                    session=session, creds=credentials, hasher=hasher
+                )
+                typer.secho(
+                    "Superuser successfuly created", fg=typer.colors.GREEN
+                )
+                logger.info("Superuser created...")
     except UserAlreadyExistsError as e:
         typer.secho(str(e), fg=typer.colors.RED)
         logger.error("Failed to create superuser %s: %s", login, e)
@@ -29,6 +29,12 @@ class EnvMode(StrEnum):
     TEST = auto()
 
 
+class RedisMode(StrEnum):
+    STANDALONE = auto()
+    SENTINEL = auto()
+    CLUSTER = auto()
+
+
 class AuthFlow(StrEnum):
     YANDEX = auto()
     VK = auto()
@@ -164,12 +170,68 @@ class Settings(BaseSettings):
 
     REDIS_HOST: str = "127.0.0.1"
     REDIS_PORT: int = 6379
+    REDIS_MODE: RedisMode = RedisMode.STANDALONE
+    # host:port через запятую: адреса sentinel или стартовые узлы
+    # кластера; в режиме STANDALONE - REDIS_HOST и REDIS_PORT
+    REDIS_NODES: str = ""
+    REDIS_SENTINEL_SERVICE: str = "mymaster"
+    REDIS_MAX_CONNECTIONS: int = 64
+    # ожидание свободного соединения пула
+    REDIS_POOL_TIMEOUT_S: float = 0.5
+    REDIS_CONNECT_TIMEOUT_S: float = 0.5
+    REDIS_SOCKET_TIMEOUT_S: float = 0.5
+    REDIS_HEALTH_CHECK_INTERVAL_S: int = 30
+    REDIS_BREAKER_FAILURES: int = 5
+    REDIS_BREAKER_RESET_S: float = 5.0
+    # сколько воркер может отдавать значение из in-process кэша
+    # cache_method, если инвалидация до него не дошла
+    CACHE_LOCAL_TTL_S: float = 5.0
 
     JWT_TOKEN_SECRET_KEY: str
     JWT_TOKEN_ALGORITHM: str = "HS256"
+    # PEM приватного ключа для RS*/ES*/PS*/EdDSA, для HS* не нужен
+    JWT_PRIVATE_KEY_PATH: str | None = None
+    JWT_KEY_ID: str | None = None
+    JWKS_MAX_AGE_S: int = 3600
+    JWT_KEYS_POLL_INTERVAL_S: float = 5.0
     JWT_TOKEN_EXPIRE_TIME_M: int = 15
-
+    JWT_CLAIMS_CACHE_SIZE: int = 10_000
+    JWT_CLAIMS_CACHE_REVALIDATE_S: float = 1.0
+    JWT_VERIFY_BATCH_MAX: int = 100
+    # читать отзывы прежнего формата blacklist:{jti}; выключить,
+    # когда после перехода пройдёт время жизни refresh токена
+    REVOCATION_LEGACY_KEYS: bool = True
+
+    # лимит на клиента: ровный темп и допустимый всплеск
     REQUEST_LIMIT_PER_SECOND: int = 10
+    REQUEST_LIMIT_BURST: int = 20
+    # заголовок с IP клиента от nginx; пусто - адрес соединения
+    RATE_LIMIT_IP_HEADER: str | None = "X-Real-IP"
+    # клиентов, которых воркер помнит: аренды квоты и запасной
+    # лимитер, пока Redis недоступен
+    RATE_LIMIT_LOCAL_SIZE: int = 10_000
+    # сколько запросов клиента воркер арендует у Redis за раз
+    # и сколько держит аренду
+    RATE_LIMIT_LEASE_MAX: int = 5
+    RATE_LIMIT_LEASE_TTL_S: float = 1.0
+
+    # токен Prometheus для /api/v1/metrics (Authorization: Bearer);
+    # без него эндпоинт открыт, и снаружи его закрывает nginx
+    METRICS_TOKEN: str | None = None
+
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MP_CONTEXT: str = "spawn"
+    PASSWORD_HASH_ALGORITHM: str = "scrypt"
+    PASSWORD_HASH_COST: int | None = None
+    PASSWORD_HASH_TIME_BUDGET_MS: int = 0
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    PASSWORD_HASH_QUEUE_TIMEOUT_MS: int = 2000
+
+    LOGIN_THROTTLE_FREE_ATTEMPTS: int = 5
+    LOGIN_THROTTLE_IP_FREE_ATTEMPTS: int = 50
+    LOGIN_THROTTLE_BASE_DELAY_S: int = 1
+    LOGIN_THROTTLE_MAX_DELAY_S: int = 900
+    LOGIN_THROTTLE_WINDOW_S: int = 3600
 
     jaeger: JaegerSettings = Field(default_factory=JaegerSettings)
 
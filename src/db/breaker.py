@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from redis.exceptions import ClusterDownError
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import MaxConnectionsError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from core.config import settings
+from services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+BREAKER_OPEN = registry.gauge(
+    "redis_circuit_open",
+    "1 while calls to Redis are short-circuited",
+)
+BREAKER_REJECTED = registry.counter(
+    "redis_circuit_rejected_total",
+    "Redis calls rejected by the open circuit breaker",
+)
+POOL_EXHAUSTED_TOTAL = registry.counter(
+    "redis_pool_exhausted_total",
+    "Redis calls that got no free pool connection in time",
+)
+
+# ошибки, говорящие о недоступности Redis, а не о неверной команде;
+# MasterNotFoundError из Sentinel - подкласс ConnectionError
+FAILURES = (
+    RedisConnectionError,
+    ClusterDownError,
+    RedisTimeoutError,
+    asyncio.TimeoutError,
+    OSError,
+)
+
+
+class PoolExhaustedError(RedisConnectionError):
+    """Свободного соединения пула не дождались"""
+
+
+# нехватка соединений пула (у кластера - MaxConnectionsError) -
+# всплеск нагрузки на воркер, а не отказ Redis: разомкнутая из-за
+# неё цепь отключила бы отзывы и ограничения для всех запросов
+POOL_EXHAUSTED = (PoolExhaustedError, MaxConnectionsError)
+
+
+class CircuitOpenError(RedisConnectionError):
+    """Redis недоступен, вызов не выполнялся"""
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи для вызовов Redis.
+
+    После failure_threshold отказов подряд цепь размыкается,
+    и вызовы сразу получают CircuitOpenError, не дожидаясь таймаутов.
+    Через reset_timeout один пробный вызов пропускается: успех
+    замыкает цепь, отказ снова размыкает её на reset_timeout.
+    Вызывающий код в это время работает на локальных запасных
+    вариантах.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        if self._probing:
+            return False
+        if self.clock() - self._opened_at >= self.reset_timeout:
+            self._probing = True
+            return True
+        return False
+
+    def success(self) -> None:
+        if self._opened_at is not None:
+            logger.warning("Redis circuit closed")
+            BREAKER_OPEN.set(0)
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def failure(self) -> None:
+        self._failures += 1
+        if self._probing or self._failures >= self.failure_threshold:
+            if self._opened_at is None:
+                logger.error(
+                    "Redis circuit opened after %s failures", self._failures
+                )
+                BREAKER_OPEN.set(1)
+            self._opened_at = self.clock()
+            self._probing = False
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """
+        Выполняет блок, если цепь замкнута, и учитывает его исход.
+
+        :raise CircuitOpenError: Если цепь разомкнута
+        """
+        if not self.allow():
+            BREAKER_REJECTED.inc()
+            raise CircuitOpenError("Redis circuit is open")
+        try:
+            yield
+        except POOL_EXHAUSTED:
+            POOL_EXHAUSTED_TOTAL.inc()
+            self._probing = False
+            raise
+        except FAILURES:
+            self.failure()
+            raise
+        except BaseException:
+            # отмена или ошибка команды - о доступности Redis
+            # ничего не говорит, пробу отпускаем
+            self._probing = False
+            raise
+        else:
+            self.success()
+
+
+redis_breaker = CircuitBreaker(
+    failure_threshold=settings.REDIS_BREAKER_FAILURES,
+    reset_timeout=settings.REDIS_BREAKER_RESET_S,
+)
@@ -1,4 +1,35 @@
-from typing import Any, Optional, Protocol
+from typing import (
+    Any,
+    AsyncContextManager,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Protocol,
+    Sequence,
+)
+
+
+class PipelineResult:
+    """Результат чтения в pipeline, заполняется после его выполнения"""
+
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value: Optional[Any] = None
+
+
+class CachePipeline(Protocol):
+    """Операции кэша, отправляемые одним запросом"""
+
+    def get(self, key: str) -> PipelineResult:
+        ...
+
+    def set(self, key: str, value: Any, expire: int) -> None:
+        ...
+
+    def delete(self, key: str) -> None:
+        ...
 
 
 class AbstractCache(Protocol):
@@ -10,6 +41,50 @@ class AbstractCache(Protocol):
     async def get(self, key: str) -> Optional[Any]:
         ...
 
+    async def delete(self, key: str) -> None:
+        ...
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        """Значения ключей в том же порядке, None - промах"""
+        ...
+
+    async def set_many(self, items: Mapping[str, Any], expire: int) -> None:
+        ...
+
+    async def delete_many(self, keys: Iterable[str]) -> None:
+        ...
+
+    async def generation(self, namespace: str) -> int:
+        """Текущее поколение ключей пространства имён"""
+        ...
+
+    async def bump_generation(self, namespace: str) -> int:
+        """Сбрасывает все ключи пространства имён"""
+        ...
+
+    async def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        """
+        Короткая блокировка ключа между воркерами. Возвращает токен
+        владельца или None, если блокировка занята. Пустой токен -
+        хранилище недоступно, и работать приходится без блокировки.
+        """
+        ...
+
+    async def release_lock(self, key: str, token: str) -> None:
+        ...
+
+    def pipeline(self) -> AsyncContextManager[CachePipeline]:
+        """
+        Накапливает разнородные операции и выполняет их одним
+        запросом при выходе из блока:
+
+            async with cache.pipeline() as pipe:
+                profile = pipe.get(profile_key)
+                pipe.set(roles_key, roles, expire)
+            profile.value
+        """
+        ...
+
 
 cacher = Optional[AbstractCache]
 
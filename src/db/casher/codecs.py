@@ -0,0 +1,170 @@
+"""
+Кодеки значений кэша.
+
+Значение в Redis - байт формата, 4 байта отпечатка схемы
+и данные. Типизированный кодек собирает pydantic TypeAdapter
+для типа значения (модели, списка моделей, UUID, datetime...)
+и при чтении возвращает значения того же типа. Отпечаток считается
+по JSON schema типа: после изменения модели старые записи
+не совпадут по отпечатку и будут считаться промахом, а не
+разобраны в неверную структуру.
+
+Кодек выбирается по пространству имён ключа - части ключа
+до первого ":".
+"""
+
+import hashlib
+import pickle
+import struct
+from typing import Any, Dict, NamedTuple, Optional, Protocol
+
+import orjson
+from pydantic import BaseModel, TypeAdapter
+
+
+class CodecError(ValueError):
+    """Запись не может быть разобрана этим кодеком"""
+
+
+class Codec(Protocol):
+    def dumps(self, value: Any) -> bytes:
+        ...
+
+    def loads(self, data: bytes) -> Any:
+        ...
+
+
+_UNTYPED = b"\x00" * 4
+
+
+def schema_fingerprint(adapter: TypeAdapter) -> bytes:
+    try:
+        schema = orjson.dumps(
+            adapter.json_schema(), option=orjson.OPT_SORT_KEYS
+        )
+    except Exception:
+        # тип без JSON schema - отличаем хотя бы по имени
+        schema = repr(adapter._type).encode()
+    return hashlib.sha256(schema).digest()[:4]
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not serializable: {type(value)}")
+
+
+class _TaggedCodec:
+    FORMAT: bytes
+
+    def __init__(self, schema: Any = None) -> None:
+        self.schema = schema
+        self.adapter = None if schema is None else TypeAdapter(schema)
+        self.tag = self.FORMAT + (
+            _UNTYPED
+            if self.adapter is None
+            else schema_fingerprint(self.adapter)
+        )
+
+    def dumps(self, value: Any) -> bytes:
+        return self.tag + self._encode(value)
+
+    def loads(self, data: bytes) -> Any:
+        if data[:5] != self.tag:
+            raise CodecError("Cache entry format or schema mismatch")
+        return self._decode(memoryview(data)[5:])
+
+    def _encode(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def _decode(self, payload: memoryview) -> Any:
+        raise NotImplementedError
+
+
+class JsonCodec(_TaggedCodec):
+    """
+    JSON кодек. С типом значения кодирует и проверяет его
+    сериализатором pydantic-core, без типа - через orjson
+    (UUID и datetime при чтении останутся строками,
+    модели - словарями).
+    """
+
+    FORMAT = b"J"
+
+    def _encode(self, value: Any) -> bytes:
+        if self.adapter is not None:
+            return self.adapter.dump_json(value)
+        return orjson.dumps(value, default=_to_json)
+
+    def _decode(self, payload: memoryview) -> Any:
+        if self.adapter is not None:
+            return self.adapter.validate_json(bytes(payload))
+        return orjson.loads(payload)
+
+
+class PickleCodec:
+    """
+    Прежний формат. Разбирает любые объекты Python, поэтому
+    подходит только для Redis, куда пишут лишь свои сервисы.
+    """
+
+    def dumps(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+class CacheEntry(NamedTuple):
+    """
+    Значение с метаданными свежести: до fresh_until (epoch секунды)
+    значение свежее, после - устаревшее, но ещё пригодное, пока
+    запись не удалит TTL Redis. delta - сколько секунд заняло
+    вычисление значения, по нему планируется раннее обновление.
+    """
+
+    value: Any
+    fresh_until: float
+    delta: float
+
+
+class EntryCodec:
+    """Кодек CacheEntry: 16 байт метаданных перед значением"""
+
+    HEADER = struct.Struct("<dd")
+
+    def __init__(self, codec: Codec) -> None:
+        self.codec = codec
+
+    def dumps(self, entry: CacheEntry) -> bytes:
+        return self.HEADER.pack(
+            entry.fresh_until, entry.delta
+        ) + self.codec.dumps(entry.value)
+
+    def loads(self, data: bytes) -> CacheEntry:
+        if len(data) < self.HEADER.size:
+            raise CodecError("Cache entry is too short")
+        fresh_until, delta = self.HEADER.unpack_from(data)
+        size = self.HEADER.size
+        value = self.codec.loads(data[size:])
+        return CacheEntry(value, fresh_until, delta)
+
+
+class CodecRegistry:
+    """Кодеки по пространствам имён ключей"""
+
+    def __init__(self, default: Optional[Codec] = None) -> None:
+        self.default = default or JsonCodec()
+        self._codecs: Dict[str, Codec] = {}
+
+    def register(self, namespace: str, codec: Codec) -> None:
+        self._codecs[namespace] = codec
+
+    def for_key(self, key: str) -> Codec:
+        namespace, sep, _ = key.partition(":")
+        if not sep:
+            return self.default
+        return self._codecs.get(namespace, self.default)
+
+
+codecs = CodecRegistry()
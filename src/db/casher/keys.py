@@ -0,0 +1,94 @@
+"""
+Ключи кэша: {namespace}:v{version}:g{generation}:{аргументы}.
+
+Пространство имён отделяет методы и задаёт кодек значений,
+версия меняется вместе со схемой результата, а поколение
+увеличивается в Redis, чтобы разом сбросить всё пространство
+имён: старые ключи просто перестают читаться и истекают по TTL.
+"""
+
+import hashlib
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Callable, Dict, Tuple
+from uuid import UUID
+
+import orjson
+
+# аргументы длиннее хэшируются, короче - остаются в ключе как есть
+MAX_PLAIN_LENGTH = 64
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("|", "\\|")
+
+
+_ENCODERS: Dict[type, Callable[[Any], str]] = {
+    str: lambda value: "s" + _escape(value),
+    int: lambda value: "i" + str(value),
+    bool: lambda value: "b1" if value else "b0",
+    UUID: lambda value: "u" + value.hex,
+    type(None): lambda value: "n",
+    float: lambda value: "f" + repr(value),
+    datetime: lambda value: "d" + value.isoformat(),
+    date: lambda value: "d" + value.isoformat(),
+}
+
+
+def encode_arg(value: Any) -> str:
+    """
+    Однозначное строковое представление аргумента: простые типы
+    кодируются с префиксом типа, остальное - через orjson.
+    """
+    encoder = _ENCODERS.get(type(value))
+    if encoder is not None:
+        return encoder(value)
+    if isinstance(value, Enum):
+        return "e" + _escape(str(value.value))
+    # подклассы простых типов
+    for base, encoder in _ENCODERS.items():
+        if isinstance(value, base):
+            return encoder(value)
+    return "j" + _escape(
+        orjson.dumps(
+            value,
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+            default=_model_dump,
+        ).decode()
+    )
+
+
+def _model_dump(value: Any) -> Any:
+    model_dump = getattr(value, "model_dump", None)
+    if model_dump is None:
+        raise TypeError(f"Can't build cache key from {type(value)}")
+    return model_dump(mode="json")
+
+
+class KeyBuilder:
+    """Ключи одного пространства имён"""
+
+    def __init__(self, namespace: str, version: int = 1) -> None:
+        if ":" in namespace:
+            raise ValueError("Cache namespace can't contain ':'")
+        self.namespace = namespace
+        self.version = version
+        self._prefix = f"{namespace}:v{version}:g"
+
+    def args_part(self, args: Tuple, kwargs: Dict[str, Any]) -> str:
+        parts = [encode_arg(arg) for arg in args]
+        if kwargs:
+            parts.extend(
+                f"{name}={encode_arg(kwargs[name])}" for name in sorted(kwargs)
+            )
+        plain = "|".join(parts)
+        if len(plain) <= MAX_PLAIN_LENGTH:
+            return plain
+        return (
+            "#" + hashlib.blake2b(plain.encode(), digest_size=16).hexdigest()
+        )
+
+    def build(
+        self, args: Tuple, kwargs: Dict[str, Any], generation: int = 0
+    ) -> str:
+        return f"{self._prefix}{generation}:{self.args_part(args, kwargs)}"
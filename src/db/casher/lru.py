@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class LRUCache:
+    """
+    In-process LRU-кэш с ограничением по размеру и TTL на запись.
+
+    Не потокобезопасен: рассчитан на использование из одного
+    event loop. Просроченные записи удаляются лениво - при чтении
+    или при вытеснении самых старых записей.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data: OrderedDict[Hashable, Tuple[Any, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(
+        self, key: Hashable, default: Any = None, count: bool = True
+    ) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            if count:
+                self.misses += 1
+            return default
+
+        value, expires_at = item
+        if expires_at <= self.clock():
+            del self._data[key]
+            if count:
+                self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        if count:
+            self.hits += 1
+        return value
+
+    def set(
+        self, key: Hashable, value: Any, ttl: Optional[float] = None
+    ) -> None:
+        """
+        Сохраняет значение. ttl - время жизни записи в секундах,
+        по умолчанию берётся ttl кэша; без обоих запись бессрочная.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            self._data.pop(key, None)
+            return
+
+        expires_at = float("inf") if ttl is None else self.clock() + ttl
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+_MISSING = object()
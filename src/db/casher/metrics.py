@@ -0,0 +1,90 @@
+"""
+Метрики кэша по пространствам имён ключей.
+
+Пространство имён - часть ключа до первого ":" (для cache_method -
+его namespace), а для хранилищ со своей схемой ключей - имя,
+заданное явно: "blacklist", "limiter".
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from services.metrics import registry
+
+# операции Redis в основном укладываются в доли миллисекунды
+CACHE_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    1.0,
+)
+
+CACHE_OPERATIONS = registry.counter(
+    "cache_operations_total",
+    "Cache operations sent to Redis",
+    labels=("namespace", "operation"),
+)
+CACHE_ERRORS = registry.counter(
+    "cache_errors_total",
+    "Cache operations that failed",
+    labels=("namespace", "operation"),
+)
+CACHE_LATENCY = registry.histogram(
+    "cache_operation_seconds",
+    "Latency of cache operations",
+    labels=("namespace", "operation"),
+    buckets=CACHE_BUCKETS,
+)
+CACHE_LOOKUPS = registry.counter(
+    "cache_lookups_total",
+    "Cache lookups by result: hit, miss, local_hit (in-process L1),"
+    " stale (served while refreshing)",
+    labels=("namespace", "result"),
+)
+CACHE_BYTES = registry.counter(
+    "cache_bytes_total",
+    "Encoded bytes read from and written to the cache",
+    labels=("namespace", "direction"),
+)
+
+DEFAULT_NAMESPACE = "default"
+
+
+def namespace_of(key: str) -> str:
+    namespace, sep, _ = key.partition(":")
+    return namespace if sep else DEFAULT_NAMESPACE
+
+
+@contextmanager
+def track(namespace: str, operation: str) -> Iterator[None]:
+    """Считает операцию, её задержку и ошибку, если она случилась"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        CACHE_ERRORS.inc(namespace=namespace, operation=operation)
+        raise
+    finally:
+        CACHE_OPERATIONS.inc(namespace=namespace, operation=operation)
+        CACHE_LATENCY.observe(
+            time.perf_counter() - started,
+            namespace=namespace,
+            operation=operation,
+        )
+
+
+def record_lookup(namespace: str, result: str) -> None:
+    CACHE_LOOKUPS.inc(namespace=namespace, result=result)
+
+
+def record_bytes(namespace: str, direction: str, size: int) -> None:
+    CACHE_BYTES.inc(size, namespace=namespace, direction=direction)
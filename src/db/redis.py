@@ -1,83 +1,803 @@
+import asyncio
 import logging
-import pickle
+import math
+import random
+import secrets
+import time
+from contextlib import asynccontextmanager
 from functools import wraps
-from hashlib import sha256
-from typing import Any, Callable, Optional
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    get_type_hints,
+)
 
-from redis.asyncio import Redis
+from redis.asyncio import BlockingConnectionPool, Redis, RedisCluster
+from redis.asyncio.client import PubSub
+from redis.asyncio.cluster import ClusterNode
+from redis.asyncio.sentinel import Sentinel
+from redis.exceptions import ConnectionError as RedisConnectionError
 
-from db.casher import AbstractCache
+from core.config import RedisMode, settings
+from db.breaker import CircuitBreaker, PoolExhaustedError, redis_breaker
+from db.casher import AbstractCache, CachePipeline, PipelineResult
+from db.casher.codecs import (
+    CacheEntry,
+    Codec,
+    CodecError,
+    CodecRegistry,
+    EntryCodec,
+    JsonCodec,
+    PickleCodec,
+    codecs,
+)
+from db.casher.keys import KeyBuilder
+from db.casher.lru import LRUCache
+from db.casher.metrics import (
+    CACHE_ERRORS,
+    namespace_of,
+    record_bytes,
+    record_lookup,
+    track,
+)
 
 logger = logging.getLogger(__name__)
 
 
+# снимает блокировку, только если она всё ещё наша
+RELEASE_LOCK = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+# поколения пространств имён, прочитанные из Redis; устаревают
+# так же, как L1, и сбрасываются рассылкой инвалидации
+generations = LRUCache(maxsize=1024, ttl=settings.CACHE_LOCAL_TTL_S)
+
+
 class RedisCache(AbstractCache):
-    """Реализация кэша с помощью Redis"""
+    """
+    Реализация кэша с помощью Redis.
 
-    def __init__(self, cache_type: Redis) -> None:
+    Значения кодируются кодеком пространства имён ключа
+    (см. db.casher.codecs), по умолчанию - JSON. Операции,
+    попадания, промахи, ошибки и объём данных считаются
+    по пространствам имён (см. db.casher.metrics).
+    """
+
+    LOCK_PREFIX = "lock:"
+    GENERATION_PREFIX = "gen:"
+
+    def __init__(
+        self,
+        cache_type: Redis,
+        codecs: CodecRegistry = codecs,
+        breaker: CircuitBreaker = redis_breaker,
+    ) -> None:
         self.cacher = cache_type
+        self.codecs = codecs
+        self.breaker = breaker
+        self._release_lock = cache_type.register_script(RELEASE_LOCK)
 
     async def set(self, key: str, value: Any, expire: int) -> None:
+        namespace = namespace_of(key)
         try:
-            await self.cacher.set(key, pickle.dumps(value), ex=expire)
+            data = self.codecs.for_key(key).dumps(value)
+            with track(namespace, "set"), self.breaker.guard():
+                await self.cacher.set(key, data, ex=expire)
+            record_bytes(namespace, "written", len(data))
             logger.debug("Result stored in cache")
         except Exception as ex:
             logger.error("Error storing to cache: %s", ex)
 
     async def get(self, key: str) -> Optional[Any]:
         try:
-            cache_value = await self.cacher.get(key)
-            return pickle.loads(cache_value) if cache_value else None
+            with track(namespace_of(key), "get"), self.breaker.guard():
+                cache_value = await self.cacher.get(key)
         except Exception as ex:
             logger.error("Error retrieving from cache: %s", ex)
             return None
+        return self._decode(key, cache_value)
+
+    async def delete(self, key: str) -> None:
+        await self.delete_many([key])
+
+    async def get_many(self, keys: Sequence[str]) -> List[Optional[Any]]:
+        if not keys:
+            return []
+        try:
+            with track(namespace_of(keys[0]), "mget"), self.breaker.guard():
+                if is_cluster(self.cacher):
+                    # ключи разных слотов - MGET на каждый узел
+                    values = await self.cacher.mget_nonatomic(keys)
+                else:
+                    values = await self.cacher.mget(keys)
+        except Exception as ex:
+            logger.error("Error retrieving from cache: %s", ex)
+            return [None] * len(keys)
+        return [self._decode(key, value) for key, value in zip(keys, values)]
+
+    async def set_many(self, items: Mapping[str, Any], expire: int) -> None:
+        # у MSET нет TTL - отдельные SET одним pipeline
+        async with self.pipeline() as pipe:
+            for key, value in items.items():
+                pipe.set(key, value, expire)
+
+    async def delete_many(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if not keys:
+            return
+        try:
+            with track(namespace_of(keys[0]), "delete"), self.breaker.guard():
+                await self.cacher.delete(*keys)
+        except Exception as ex:
+            logger.error("Error deleting from cache: %s", ex)
+
+    async def generation(self, namespace: str) -> int:
+        value = generations.get(namespace)
+        if value is not None:
+            return value
+        try:
+            with self.breaker.guard():
+                raw = await self.cacher.get(self.GENERATION_PREFIX + namespace)
+        except Exception as ex:
+            logger.error("Error retrieving cache generation: %s", ex)
+            return 0
+        value = int(raw or 0)
+        generations.set(namespace, value)
+        return value
+
+    async def bump_generation(self, namespace: str) -> int:
+        """
+        :raise RedisError: Если Redis недоступен - сброс
+            не должен теряться молча
+        """
+        with self.breaker.guard():
+            value = await self.cacher.incr(self.GENERATION_PREFIX + namespace)
+        generations.set(namespace, value)
+        return value
+
+    async def acquire_lock(self, key: str, ttl: float) -> Optional[str]:
+        token = secrets.token_hex(8)
+        try:
+            with track(namespace_of(key), "lock"), self.breaker.guard():
+                acquired = await self.cacher.set(
+                    self.LOCK_PREFIX + key,
+                    token,
+                    nx=True,
+                    px=int(ttl * 1000),
+                )
+        except Exception as ex:
+            logger.error("Error acquiring cache lock: %s", ex)
+            return ""
+        return token if acquired else None
+
+    async def release_lock(self, key: str, token: str) -> None:
+        if not token:
+            return
+        try:
+            with self.breaker.guard():
+                await self._release_lock(
+                    keys=[self.LOCK_PREFIX + key], args=[token]
+                )
+        except Exception as ex:
+            logger.error("Error releasing cache lock: %s", ex)
+
+    @asynccontextmanager
+    async def pipeline(self) -> AsyncIterator[CachePipeline]:
+        pipe = RedisCachePipeline(self)
+        yield pipe
+        await pipe.execute()
+
+    def _decode(self, key: str, cache_value: Optional[bytes]) -> Any:
+        namespace = namespace_of(key)
+        if not cache_value:
+            record_lookup(namespace, "miss")
+            return None
+        record_bytes(namespace, "read", len(cache_value))
+        try:
+            value = self.codecs.for_key(key).loads(cache_value)
+        except CodecError:
+            # запись старого формата или схемы - считаем промахом
+            logger.debug("Stale cache entry format for %s", key)
+        except Exception as ex:
+            CACHE_ERRORS.inc(namespace=namespace, operation="decode")
+            logger.error("Error decoding cache entry %s: %s", key, ex)
+        else:
+            record_lookup(namespace, "hit")
+            return value
+        record_lookup(namespace, "miss")
+        return None
+
+
+class RedisCachePipeline:
+    """
+    Операции RedisCache, накопленные для одного запроса к Redis.
+
+    Значения кодируются сразу, чтение возвращает PipelineResult,
+    который заполняется после execute(). Ошибка Redis, как и в
+    одиночных операциях, логируется, а чтения остаются промахами.
+    """
+
+    def __init__(self, cache: RedisCache) -> None:
+        self.cache = cache
+        self._pipe = cache.cacher.pipeline(transaction=False)
+        self._reads: List[tuple[int, str, PipelineResult]] = []
+        self._size = 0
+        self._written = 0
+        self._namespace: Optional[str] = None
+
+    def _queue(self, key: str) -> None:
+        if self._namespace is None:
+            self._namespace = namespace_of(key)
+        self._size += 1
+
+    def get(self, key: str) -> PipelineResult:
+        result = PipelineResult()
+        self._pipe.get(key)
+        self._reads.append((self._size, key, result))
+        self._queue(key)
+        return result
+
+    def set(self, key: str, value: Any, expire: int) -> None:
+        try:
+            data = self.cache.codecs.for_key(key).dumps(value)
+        except Exception as ex:
+            logger.error("Error storing to cache: %s", ex)
+            return
+        self._pipe.set(key, data, ex=expire)
+        self._written += len(data)
+        self._queue(key)
+
+    def delete(self, key: str) -> None:
+        self._pipe.delete(key)
+        self._queue(key)
+
+    async def execute(self) -> None:
+        if not self._size:
+            return
+        breaker = self.cache.breaker
+        try:
+            with track(self._namespace, "pipeline"), breaker.guard():
+                replies = await self._pipe.execute(raise_on_error=False)
+        except Exception as ex:
+            logger.error("Error executing cache pipeline: %s", ex)
+            return
+        finally:
+            await self._pipe.reset()
+        if self._written:
+            record_bytes(self._namespace, "written", self._written)
+
+        for position, key, result in self._reads:
+            reply = replies[position]
+            if isinstance(reply, Exception):
+                logger.error("Error retrieving from cache: %s", reply)
+                continue
+            result.value = self.cache._decode(key, reply)
 
 
 redis: Optional[Redis] = None
 
 
+class ClusterRedis(RedisCluster):
+    """
+    RedisCluster с pub/sub.
+
+    PUBLISH в кластере доходит до подписчиков на любом узле,
+    поэтому подписка открывается обычным клиентом к одному
+    из узлов. Клиент создаётся при первой подписке, общий
+    для всех подписок, и закрывается вместе с кластерным.
+    """
+
+    def __init__(self, startup_nodes: List[ClusterNode], **kwargs) -> None:
+        super().__init__(startup_nodes=startup_nodes, **kwargs)
+        self._startup_nodes = startup_nodes
+        self._pubsub_client: Optional[Redis] = None
+
+    def pubsub(self, **kwargs) -> PubSub:
+        if self._pubsub_client is None:
+            node = random.choice(self.get_nodes() or self._startup_nodes)
+            self._pubsub_client = Redis(
+                host=node.host,
+                port=node.port,
+                socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_S,
+                health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL_S,
+            )
+        return self._pubsub_client.pubsub(**kwargs)
+
+    async def aclose(self) -> None:
+        if self._pubsub_client is not None:
+            await self._pubsub_client.aclose(close_connection_pool=True)
+            self._pubsub_client = None
+        await super().aclose()
+
+
+RedisClient = Union[Redis, ClusterRedis]
+
+
+def is_cluster(client: RedisClient) -> bool:
+    return isinstance(client, RedisCluster)
+
+
+def hash_tag(value: str) -> str:
+    """
+    Тег слота кластера: ключи с одинаковым {тегом} лежат в одном
+    слоте, и их можно менять одним скриптом или транзакцией.
+    Вне кластера тег - просто часть ключа.
+    """
+    return "{" + value + "}"
+
+
+def parse_nodes(value: str) -> List[Tuple[str, int]]:
+    """'host:port,host:port' -> [(host, port), ...]"""
+    nodes = []
+    for address in filter(None, map(str.strip, value.split(","))):
+        host, _, port = address.rpartition(":")
+        nodes.append((host, int(port)))
+    return nodes
+
+
+class BoundedConnectionPool(BlockingConnectionPool):
+    """
+    BlockingConnectionPool, который отличает нехватку соединений
+    от недоступности Redis: не дождавшись свободного соединения
+    за timeout, поднимает PoolExhaustedError, и redis_breaker
+    не считает это отказом Redis.
+    """
+
+    async def get_connection(self, command_name, *keys, **options):
+        try:
+            return await super().get_connection(command_name, *keys, **options)
+        except RedisConnectionError as ex:
+            # ожидание пула redis-py заворачивает свой таймаут
+            # в ConnectionError, ошибки соединения - нет
+            if isinstance(ex.__cause__, asyncio.TimeoutError):
+                raise PoolExhaustedError(*ex.args) from ex
+            raise
+
+
+def create_redis() -> RedisClient:
+    """
+    Клиент Redis с ограниченным пулом соединений и таймаутами:
+    медленный Redis не должен держать запросы дольше таймаута,
+    а после нескольких отказов подряд вызовы отсекает
+    redis_breaker.
+
+    REDIS_MODE выбирает топологию: один узел, мастер, который
+    находят через Sentinel, или Redis Cluster.
+    """
+    timeouts = dict(
+        socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_S,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT_S,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL_S,
+    )
+    nodes = parse_nodes(settings.REDIS_NODES)
+
+    if settings.REDIS_MODE == RedisMode.SENTINEL:
+        sentinel = Sentinel(
+            nodes,
+            sentinel_kwargs=dict(
+                socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT_S,
+                socket_timeout=settings.REDIS_SOCKET_TIMEOUT_S,
+            ),
+            **timeouts,
+        )
+        return sentinel.master_for(
+            settings.REDIS_SENTINEL_SERVICE,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+        )
+
+    if settings.REDIS_MODE == RedisMode.CLUSTER:
+        return ClusterRedis(
+            startup_nodes=[ClusterNode(host, port) for host, port in nodes],
+            # пул на каждый узел кластера
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            **timeouts,
+        )
+
+    pool = BoundedConnectionPool(
+        host=settings.REDIS_HOST,
+        port=settings.REDIS_PORT,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT_S,
+        **timeouts,
+    )
+    return Redis(connection_pool=pool)
+
+
 async def get_redis() -> Redis:
     return redis
 
 
-def form_key(*args, **kwargs) -> str:
-    return sha256(pickle.dumps((args, kwargs))).hexdigest()
+# L1 кэши методов по имени метода, для рассылки инвалидаций
+local_caches: Dict[str, LRUCache] = {}
 
 
-def cache_method(cache_attr: str, expire: int = 1800):
+class LocalCacheInvalidator:
+    """
+    Рассылка инвалидаций in-process кэшей (L1) между воркерами.
+
+    Сообщение в канал pub/sub - пространство имён и ключ, "*"
+    очищает L1 пространства имён целиком и перечитывает его
+    поколение. Pub/sub не гарантирует доставку, поэтому
+    после обрыва подписки все L1 очищаются, а TTL записей L1
+    ограничивает устаревание, даже если сообщение потерялось.
+    """
+
+    CHANNEL = "cache_invalidation"
+    ALL = "*"
+
+    def __init__(self, redis: Redis, retry_delay: float = 1.0) -> None:
+        self.redis = redis
+        self.retry_delay = retry_delay
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, name: str, key: str) -> None:
+        """Инвалидирует запись локально и у остальных воркеров"""
+        self.apply(name, key)
+        try:
+            await self.redis.publish(self.CHANNEL, f"{name} {key}")
+        except Exception as ex:
+            logger.error("Can't publish cache invalidation: %s", ex)
+
+    @classmethod
+    def apply(cls, name: str, key: str) -> None:
+        if key == cls.ALL:
+            generations.delete(name)
+        cache = local_caches.get(name)
+        if cache is None:
+            return
+        if key == cls.ALL:
+            cache.clear()
+        else:
+            cache.delete(key)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                if self._pubsub is None:
+                    self._pubsub = self.redis.pubsub()
+                    await self._pubsub.subscribe(self.CHANNEL)
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if message is not None:
+                    name, key = message["data"].decode().split(" ", 1)
+                    self.apply(name, key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                logger.error("Cache invalidation listener failed: %s", ex)
+                # пропущенные инвалидации не восстановить - сбрасываем L1
+                for cache in local_caches.values():
+                    cache.clear()
+                generations.clear()
+                if self._pubsub is not None:
+                    await self._pubsub.aclose()
+                    self._pubsub = None
+                await asyncio.sleep(self.retry_delay)
+
+
+cache_invalidator: Optional[LocalCacheInvalidator] = None
+
+
+def result_codec(func: Callable) -> Codec:
+    """
+    Типизированный JSON кодек по аннотации результата функции.
+    Если тип не описан или pydantic его не поддерживает, результат
+    хранится pickle, как раньше.
+    """
+    try:
+        schema = get_type_hints(func).get("return")
+        if schema is None:
+            raise TypeError("no return annotation")
+        return JsonCodec(schema)
+    except Exception as ex:
+        logger.warning(
+            "Can't build cache codec for %s, using pickle: %s",
+            func.__qualname__,
+            ex,
+        )
+        return PickleCodec()
+
+
+async def wait_for_value(
+    cache: AbstractCache, key: str, timeout: float
+) -> Optional[Any]:
+    """
+    Ждёт, пока значение ключа вычислит владелец блокировки.
+    Опрашивает кэш с нарастающим интервалом, None - не дождались.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = 0.01
+    while (left := deadline - loop.time()) > 0:
+        await asyncio.sleep(min(delay, left))
+        value = await cache.get(key)
+        if value is not None:
+            return value
+        delay = min(delay * 2, 0.2)
+    return None
+
+
+def cache_method(
+    cache_attr: str,
+    expire: int = 1800,
+    local_size: int = 0,
+    local_ttl: Optional[float] = None,
+    codec: Optional[Codec] = None,
+    lock_ttl: Optional[float] = None,
+    lock_wait: Optional[float] = None,
+    stale_ttl: int = 0,
+    xfetch_beta: float = 1.0,
+    namespace: Optional[str] = None,
+    version: int = 1,
+    detached: Optional[Callable[[Any], AsyncContextManager[Any]]] = None,
+):
     """
     cache_method is a decorator that caches the result
     of an asynchronous method in a store.
 
+    A result is fresh for ``expire`` seconds and then stays in the
+    store as stale for ``stale_ttl`` more seconds. A stale result is
+    returned at once while a background task recomputes it on the
+    ``detached`` instance; without one the caller recomputes it
+    inline and gets the stale result only if that fails. Fresh
+    results may also be recomputed early, with probability growing
+    towards expiry and with the time the computation takes (XFetch,
+    ``xfetch_beta`` > 1 favours earlier refreshes, 0 disables them),
+    so refreshes of popular keys spread out instead of piling up
+    at the expiry moment.
+
+    With local_size > 0 results are also kept in an in-process
+    LRU (L1) in front of the store, so hot values skip the network
+    and unpickling. L1 entries live at most local_ttl seconds
+    (CACHE_LOCAL_TTL_S by default) and never past their freshness:
+    this bounds how long a worker may serve a stale value if an
+    invalidation broadcast is lost.
+
+    Keys are built by KeyBuilder from the namespace (the method's
+    qualified name by default), ``version`` and the namespace's
+    generation. Bump ``version`` when the result schema changes;
+    ``invalidate_all(self)`` bumps the generation and drops every
+    cached result of the namespace at once. The namespace also
+    selects the codec: results are stored with ``codec`` or, by
+    default, a typed JSON codec built from the method's return
+    annotation.
+
+    Concurrent misses of the same key in a worker share one
+    computation. It may outlive the caller that started it, so it
+    must not use that caller's request-scoped resources, such as
+    its DB session: ``detached(self)`` is an async context manager
+    yielding an instance with resources of its own (e.g.
+    a repository on a fresh session), and shared computations run
+    the method on that instance. Without ``detached`` every caller
+    computes the result on its own instance.
+
+    With lock_ttl set, workers also take a short Redis lock
+    on the key: the holder computes the value, the others poll
+    the cache for up to lock_wait seconds (lock_ttl by default) and
+    compute it themselves only if the holder did not make it.
+    Background refreshes take the same lock and are skipped when
+    another worker holds it.
+
+    The wrapper gets an ``invalidate(self, *args, **kwargs)``
+    coroutine that drops the cached result from the store and from
+    L1 of every worker.
+
     Parameters:
     - cache_attr (str): The attribute name for the instance
                         of store in the class.
-    - expire (int): The cache expiration time in seconds.
+    - expire (int): How long a result is fresh, in seconds.
                     Defaults to 1800 seconds (30 minutes).
+    - local_size (int): Max entries of the L1 cache, 0 disables it.
+    - local_ttl (float): Max age of an L1 entry in seconds.
+    - codec (Codec): Codec of the cached results.
+    - lock_ttl (float): TTL of the cross-worker lock in seconds,
+                        None disables the lock.
+    - lock_wait (float): How long to wait for the lock holder.
+    - stale_ttl (int): How long a stale result may be served
+                       while it is being refreshed, in seconds.
+    - xfetch_beta (float): Eagerness of early refreshes.
+    - namespace (str): Key namespace, must not contain ':'.
+    - version (int): Version of the cached result schema.
+    - detached (Callable): Builds the instance shared computations
+                           run on, as an async context manager.
 
     Raises:
     - ValueError: If the cacher instance is not set.
     """
 
     def decorator(func: Callable) -> Callable:
-        @wraps(func)
-        async def wrapper(self, *args, **kwargs):
-            cache = getattr(self, cache_attr, None)
+        name = namespace or func.__qualname__
+        keys = KeyBuilder(name, version)
+        codecs.register(name, EntryCodec(codec or result_codec(func)))
+        local = None
+        if local_size > 0:
+            ttl = local_ttl
+            if ttl is None:
+                ttl = settings.CACHE_LOCAL_TTL_S
+            local = LRUCache(maxsize=local_size, ttl=ttl)
+            local_caches[name] = local
+        # вычисления и фоновые обновления, которые сейчас идут
+        # в этом воркере, по ключу
+        in_flight: Dict[str, asyncio.Task] = {}
+        refreshing: Dict[str, asyncio.Task] = {}
+        wait = lock_ttl if lock_wait is None else lock_wait
 
+        def get_cache(instance) -> AbstractCache:
+            cache = getattr(instance, cache_attr, None)
             if cache is None:
                 raise ValueError("Cache instance is not set")
+            return cache
+
+        def start(tasks: Dict[str, asyncio.Task], key: str, coro):
+            task = asyncio.ensure_future(coro)
+            tasks[key] = task
+            task.add_done_callback(lambda done: forget(tasks, key, done))
+            return task
 
-            key = form_key(func.__name__, args, kwargs)
+        def forget(tasks, key: str, task: asyncio.Task) -> None:
+            tasks.pop(key, None)
+            if not task.cancelled():
+                # ошибку получат ждущие, если они ещё есть
+                task.exception()
 
-            cache_result = await cache.get(key)
-            if cache_result is not None:
+        def remember(key: str, entry: CacheEntry) -> None:
+            if local is not None:
+                fresh_for = entry.fresh_until - time.time()
+                if fresh_for > 0:
+                    local.set(key, entry.value, min(local.ttl, fresh_for))
+
+        def should_refresh(entry: CacheEntry) -> bool:
+            now = time.time()
+            if now >= entry.fresh_until:
+                return True
+            if xfetch_beta <= 0:
+                return False
+            # XFetch: now - delta * beta * ln(rand) >= fresh_until
+            early = (
+                -entry.delta * xfetch_beta * math.log(1.0 - random.random())
+            )
+            return now + early >= entry.fresh_until
+
+        @wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            cache = get_cache(self)
+
+            key = keys.build(args, kwargs, await cache.generation(name))
+
+            if local is not None:
+                local_result = local.get(key)
+                if local_result is not None:
+                    record_lookup(name, "local_hit")
+                    return local_result
+
+            if detached is None:
+                return await load(self, cache, key, args, kwargs)
+
+            task = in_flight.get(key)
+            if task is None:
+                task = start(
+                    in_flight, key, load(self, cache, key, args, kwargs)
+                )
+            # отмена одного из ждущих не отменяет общее вычисление
+            return await asyncio.shield(task)
+
+        async def load(self, cache: AbstractCache, key: str, args, kwargs):
+            entry = await cache.get(key)
+            if entry is not None:
                 logger.debug("Response from cache")
-                return cache_result
+                if entry.fresh_until <= time.time():
+                    record_lookup(name, "stale")
+                if should_refresh(entry):
+                    if detached is None:
+                        # фоновая задача пережила бы сессию вызывающего
+                        result = await refresh(self, cache, key, args, kwargs)
+                        if result is not None:
+                            return result
+                    elif key not in refreshing:
+                        start(
+                            refreshing,
+                            key,
+                            refresh(self, cache, key, args, kwargs),
+                        )
+                remember(key, entry)
+                return entry.value
+
+            token = ""
+            if lock_ttl is not None:
+                token = await cache.acquire_lock(key, lock_ttl)
+                if token is None:
+                    entry = await wait_for_value(cache, key, wait)
+                    if entry is not None:
+                        remember(key, entry)
+                        return entry.value
+                    logger.warning("Cache lock wait timed out for %s", key)
+
+            try:
+                return await compute(self, cache, key, args, kwargs)
+            finally:
+                if token:
+                    await cache.release_lock(key, token)
+
+        async def refresh(self, cache: AbstractCache, key: str, args, kwargs):
+            token = ""
+            if lock_ttl is not None:
+                token = await cache.acquire_lock(key, lock_ttl)
+                if token is None:
+                    # обновляет другой воркер
+                    return
+            try:
+                return await compute(self, cache, key, args, kwargs)
+            except Exception as ex:
+                logger.error("Cache refresh of %s failed: %s", key, ex)
+            finally:
+                if token:
+                    await cache.release_lock(key, token)
 
-            result = await func(self, *args, **kwargs)
-            await cache.set(key, result, expire)
+        async def call(self, args, kwargs):
+            if detached is None:
+                return await func(self, *args, **kwargs)
+            async with detached(self) as owner:
+                return await func(owner, *args, **kwargs)
+
+        async def compute(self, cache: AbstractCache, key: str, args, kwargs):
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            result = await call(self, args, kwargs)
+            if result is None:
+                return None
+            entry = CacheEntry(
+                result, time.time() + expire, loop.time() - started
+            )
+            await cache.set(key, entry, expire + stale_ttl)
+            remember(key, entry)
             return result
 
+        async def invalidate(self, *args, **kwargs) -> None:
+            cache = get_cache(self)
+            key = keys.build(args, kwargs, await cache.generation(name))
+            await cache.delete(key)
+            await broadcast(key)
+
+        async def invalidate_all(self) -> None:
+            await get_cache(self).bump_generation(name)
+            await broadcast(LocalCacheInvalidator.ALL)
+
+        async def broadcast(key: str) -> None:
+            if cache_invalidator is not None:
+                await cache_invalidator.publish(name, key)
+            else:
+                LocalCacheInvalidator.apply(name, key)
+
+        wrapper.invalidate = invalidate
+        wrapper.invalidate_all = invalidate_all
+        wrapper.keys = keys
+        wrapper.local_cache = local
         return wrapper
 
     return decorator
@@ -21,3 +21,21 @@ class NoResult(Exception):
     """Данные по запросу не были найдены"""
 
     pass
+
+
+class ServiceOverloadedExc(Exception):
+    """Сервис перегружен и не может принять запрос"""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+
+
+class TooManyLoginAttemptsExc(Exception):
+    """Слишком много неудачных попыток входа"""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+
+
+class RevocationUnavailableExc(Exception):
+    """Отзыв токенов не записан в Redis и не дошёл до других воркеров"""
@@ -1,7 +1,12 @@
 from fastapi import Request, Response, status
 from fastapi.responses import JSONResponse
 
-from exceptions.errors import UnauthorizedExc
+from exceptions.errors import (
+    RevocationUnavailableExc,
+    ServiceOverloadedExc,
+    TooManyLoginAttemptsExc,
+    UnauthorizedExc,
+)
 
 
 async def integrity_error_handler(
@@ -78,3 +83,38 @@ async def role_service_error_handler(
             "detail": str(exc),
         },
     )
+
+
+async def service_overloaded_error_handler(
+    _: Request,
+    exc: ServiceOverloadedExc,
+) -> Response:
+    """Service overloaded error handler"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Service is overloaded, try again later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+async def too_many_login_attempts_error_handler(
+    _: Request,
+    exc: TooManyLoginAttemptsExc,
+) -> Response:
+    """Too many login attempts error handler"""
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many failed login attempts"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+async def revocation_unavailable_error_handler(
+    _: Request,
+    __: RevocationUnavailableExc,
+) -> Response:
+    """Revocation unavailable error handler"""
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Token revocation failed, try again later"},
+    )
@@ -9,7 +9,10 @@ from exceptions.exc_handlers import (
     no_result_error_400_handler,
     no_result_error_handler,
     password_or_login_error_handler,
+    revocation_unavailable_error_handler,
     role_service_error_handler,
+    service_overloaded_error_handler,
+    too_many_login_attempts_error_handler,
     unauthorized_error_handler,
 )
 
@@ -23,4 +26,7 @@ exception_handlers: dict[
     errors.UnauthorizedExc: unauthorized_error_handler,
     errors.NoResult: no_result_error_400_handler,
     errors.RoleServiceExc: role_service_error_handler,
+    errors.ServiceOverloadedExc: service_overloaded_error_handler,
+    errors.TooManyLoginAttemptsExc: too_many_login_attempts_error_handler,
+    errors.RevocationUnavailableExc: revocation_unavailable_error_handler,
 }
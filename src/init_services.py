@@ -1,4 +1,6 @@
-from redis.asyncio import Redis
+import asyncio
+import logging
+from pathlib import Path
 
 import db.casher as cacher
 import services
@@ -7,10 +9,16 @@ from db import redis
 from db.postrges_db import psql
 from db.postrges_db.psql import PostgresService
 from scripts.create_default_roles import insert_roles
+from services import limiter, login_throttle, password, revocation, signing
 from services.auth.auth_repository import SQLAlchemyAuthRepository
+from services.password.algorithms import get_algorithm
+from services.password.pool import ProcessPoolPasswordHasher
 from services.role.role_repository import SQLAlchemyRoleRepository
+from services.token_minter import token_minter
 from services.user.user_repository import SQLAlchemyUserRepository
 
+logger = logging.getLogger(__name__)
+
 
 async def init_postgresql_service():
     psql.psql_service = PostgresService(
@@ -30,8 +38,66 @@ async def init_repositories():
 
 
 async def init_casher():
-    redis.redis = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+    redis.redis = redis.create_redis()
     cacher.cacher = redis.RedisCache(redis.redis)
+    redis.cache_invalidator = redis.LocalCacheInvalidator(redis.redis)
+    await redis.cache_invalidator.start()
+    login_throttle.login_throttle = login_throttle.LoginThrottle(redis.redis)
+    limiter.rate_limiter = limiter.RateLimiter(redis.redis)
+    await limiter.rate_limiter.start()
+
+
+async def init_password_hasher():
+    password.password_hasher = ProcessPoolPasswordHasher(
+        max_workers=settings.PASSWORD_HASH_WORKERS,
+        mp_context=settings.PASSWORD_HASH_MP_CONTEXT,
+        algorithm=get_algorithm(
+            settings.PASSWORD_HASH_ALGORITHM, settings.PASSWORD_HASH_COST
+        ),
+        time_budget=settings.PASSWORD_HASH_TIME_BUDGET_MS / 1000,
+        max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+        queue_timeout=settings.PASSWORD_HASH_QUEUE_TIMEOUT_MS / 1000,
+    )
+    await password.password_hasher.start()
+
+
+def default_signing_key() -> signing.SigningKey:
+    private_key = settings.JWT_TOKEN_SECRET_KEY
+    if settings.JWT_PRIVATE_KEY_PATH:
+        private_key = Path(settings.JWT_PRIVATE_KEY_PATH).read_bytes()
+
+    return signing.SigningKey(
+        settings.JWT_TOKEN_ALGORITHM, private_key, kid=settings.JWT_KEY_ID
+    )
+
+
+async def init_key_ring() -> asyncio.Task:
+    """
+    Загружает ключи подписи и запускает фоновое отслеживание
+    их ротации в Redis
+    """
+    default = default_signing_key()
+    store = signing.KeyStore(redis.redis)
+    try:
+        signing.key_ring = await store.build_ring(default)
+    except Exception as ex:
+        logger.error("Can't load signing keys from Redis: %s", ex)
+        signing.key_ring = signing.KeyRing(default)
+
+    return asyncio.create_task(
+        signing.watch_key_ring(
+            store, default, settings.JWT_KEYS_POLL_INTERVAL_S
+        )
+    )
+
+
+async def init_revocations():
+    revocation.revocations = revocation.RevocationReplica(
+        redis.redis,
+        retention=settings.JWT_TOKEN_EXPIRE_TIME_M * 60,
+        epoch_ttl=token_minter.refresh_ttl,
+    )
+    await revocation.revocations.start()
 
 
 async def insert_default_roles():
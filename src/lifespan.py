@@ -3,12 +3,17 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
+from db import redis
 from db.postrges_db.psql import psql_service
 from init_services import (
     init_casher,
+    init_key_ring,
+    init_password_hasher,
     init_postgresql_service,
     init_repositories,
+    init_revocations,
 )
+from services import limiter, password, revocation
 
 logger = logging.getLogger(__name__)
 
@@ -22,8 +27,17 @@ async def lifespan(app: FastAPI):
     await init_postgresql_service()
     await init_repositories()
     await init_casher()
+    await init_password_hasher()
+    key_ring_watcher = await init_key_ring()
+    await init_revocations()
 
     logger.info("App ready")
     yield
+    key_ring_watcher.cancel()
+    await revocation.revocations.close()
+    await redis.cache_invalidator.close()
+    await limiter.rate_limiter.close()
+    await redis.redis.aclose()
+    await password.password_hasher.close()
     await psql_service.dispose()
     logger.debug("Closing connections")
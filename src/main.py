@@ -6,6 +6,7 @@ from fastapi.responses import ORJSONResponse
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 
 from api import router as api_router
+from api.well_known import router as well_known_router
 from core.config import EnvMode, settings
 from core.log_config import setup_logging
 from exceptions.exception import exception_handlers
@@ -45,3 +46,4 @@ app.add_middleware(
 )
 
 app.include_router(api_router, prefix="/api")
+app.include_router(well_known_router)
@@ -3,8 +3,7 @@ import logging
 from fastapi import Request, status
 from fastapi.responses import JSONResponse, ORJSONResponse, Response
 
-from db.redis import Redis, get_redis
-from services.limiter import RateLimiter
+from services.limiter import RateLimiter, client_identity, get_rate_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -16,16 +15,16 @@ async def log_stuff(request: Request, call_next):
 
 
 async def limiter(request: Request, call_next):
-    redis: Redis = await get_redis()
-
-    limiter = RateLimiter(redis)
-
-    limit_result = await limiter.check_limit()
-    if limit_result:
+    limiter: RateLimiter = await get_rate_limiter()
+    result = await limiter.check_limit(client_identity(request))
+    if not result.allowed:
         return JSONResponse(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS, content=None
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            content=None,
+            headers=result.headers(),
         )
     response = await call_next(request)
+    response.headers.update(result.headers())
     return response
 
 
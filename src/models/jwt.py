@@ -1,9 +1,12 @@
 from datetime import datetime
-from typing import Self
+from typing import Any, Dict, List, NamedTuple, Type, TypeVar
 from uuid import UUID
 
+import jwt
 from pydantic import BaseModel, Field
 
+T = TypeVar("T", bound="ProtoJWT")
+
 
 class ProtoJWT(BaseModel):
     """
@@ -12,8 +15,13 @@ class ProtoJWT(BaseModel):
 
     jti: UUID = Field(..., description="UUID токена")
     user_id: UUID = Field(..., description="UUID пользователя")
-    iat: int = Field(..., description="Время создания токена в формате epoch")
-    exp: int = Field(..., description="Время истечения токена в формате epoch")
+    iat: float = Field(
+        ..., description="Время создания токена в формате epoch"
+    )
+    exp: float = Field(
+        ..., description="Время истечения токена в формате epoch"
+    )
+    role: str | None = Field(None, description="Связанная роль")
 
     @property
     def issued_at(self) -> datetime:
@@ -24,15 +32,30 @@ class ProtoJWT(BaseModel):
         return datetime.fromtimestamp(self.exp)
 
     @classmethod
-    def from_jwt(cls, token: str, secret_key: str) -> Self:
+    def from_payload(cls: Type[T], payload: Dict[str, Any]) -> T:
+        """
+        Создает экземпляр из уже проверенного payload токена.
+
+        :param payload: Декодированный payload JWT токена.
+        :return: Экземпляр модели токена.
+        """
+        return cls.model_validate(payload)
+
+    @classmethod
+    def from_jwt(
+        cls: Type[T], token: str, secret_key: str, algorithms: List[str]
+    ) -> T:
         """
         Создает экземпляр ProtoJWT из JWT токена.
 
         :param token: JWT токен в виде строки.
         :param secret_key: Секретный ключ для декодирования токена.
+        :param algorithms: Допустимые алгоритмы подписи.
         :return: Экземпляр ProtoJWT.
+        :raise jwt.InvalidTokenError: Если токен не прошёл проверку.
         """
-        pass
+        payload = jwt.decode(token, secret_key, algorithms=algorithms)
+        return cls.from_payload(payload)
 
 
 class AccessJWT(ProtoJWT):
@@ -41,3 +64,15 @@ class AccessJWT(ProtoJWT):
 
 class RefreshJWT(ProtoJWT):
     pass
+
+
+class IssuedTokens(NamedTuple):
+    """
+    Только что выпущенная пара токенов: закодированные строки
+    для клиента и их claims для записи сессии без повторного декодирования
+    """
+
+    access_token: str
+    refresh_token: str
+    access: AccessJWT
+    refresh: RefreshJWT
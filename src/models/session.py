@@ -57,6 +57,7 @@ class SessionHistoryChoices(enum.Enum):
     LOGIN_WITH_PASSWORD = "Login with password"
     REFRESH_TOKEN_UPDATE = "Refreshable token updated"
     USER_LOGOUT = "User logout"
+    PASSWORD_UPDATE = "Password updated"
 
 
 class SessionHistory(Base):
@@ -82,6 +82,19 @@ def get_role_del_response():
     return resp
 
 
+def get_logout_everywhere_response():
+    resp = {
+        status.HTTP_204_NO_CONTENT: {
+            "description": "All user tokens and sessions revoked",
+        },
+        status.HTTP_403_FORBIDDEN: {
+            "description": "Not enough permissions for perform",
+            **get_content("Not enough permissions"),
+        },
+    }
+    return resp
+
+
 def get_role_assign_response():
     resp = {
         status.HTTP_204_NO_CONTENT: {
@@ -1,6 +1,11 @@
 from fastapi import status
 
-from schemas.auth import UserLoginResponse, UserTokenResponse, VerifyResponse
+from schemas.auth import (
+    UserLoginResponse,
+    UserTokenResponse,
+    VerifyBatchResponse,
+    VerifyResponse,
+)
 from schemas.session import HistoryRead
 from schemas.user import UserRead, UserUpdate
 
@@ -41,6 +46,14 @@ def get_login_response():
             "description": "Session already exists",
             **get_content("Record already exists"),
         },
+        status.HTTP_429_TOO_MANY_REQUESTS: {
+            "description": "Login or IP is throttled, see Retry-After",
+            **get_content("Too many failed login attempts"),
+        },
+        status.HTTP_503_SERVICE_UNAVAILABLE: {
+            "description": "Too many concurrent logins, see Retry-After",
+            **get_content("Service is overloaded, try again later"),
+        },
     }
     return resp
 
@@ -122,3 +135,13 @@ def get_verify_response():
         },
     }
     return resp
+
+
+def get_verify_batch_response():
+    resp = {
+        status.HTTP_200_OK: {
+            "description": "Verification result for every token",
+            "model": VerifyBatchResponse,
+        },
+    }
+    return resp
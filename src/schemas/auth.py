@@ -1,50 +1,9 @@
-from datetime import datetime
+from typing import List
 from uuid import UUID
 
 from pydantic import BaseModel, Field
 
-
-class ProtoJWT(BaseModel):
-    """
-    Модель прототипа JWT токенов
-    """
-
-    jti: UUID = Field(..., description="UUID токена")
-    user_id: UUID = Field(..., description="UUID пользователя")
-    iat: float = Field(
-        ..., description="Время создания токена в формате epoch"
-    )
-    exp: float = Field(
-        ..., description="Время истечения токена в формате epoch"
-    )
-    role: str = Field(..., description="Связанная роль")
-
-    @property
-    def issued_at(self) -> datetime:
-        return datetime.fromtimestamp(self.iat)
-
-    @property
-    def expires_at(self) -> datetime:
-        return datetime.fromtimestamp(self.exp)
-
-    @classmethod
-    def from_jwt(cls, token: str, secret_key: str):
-        """
-        Создает экземпляр ProtoJWT из JWT токена.
-
-        :param token: JWT токен в виде строки.
-        :param secret_key: Секретный ключ для декодирования токена.
-        :return: Экземпляр ProtoJWT.
-        """
-        pass
-
-
-class AccessJWT(ProtoJWT):
-    pass
-
-
-class RefreshJWT(ProtoJWT):
-    pass
+from core.config import settings
 
 
 class UserLogin(BaseModel):
@@ -75,3 +34,20 @@ class VerifyToken(BaseModel):
 
 class VerifyResponse(BaseModel):
     message: str
+
+
+class VerifyTokenBatch(BaseModel):
+    access_tokens: List[str] = Field(
+        ..., min_length=1, max_length=settings.JWT_VERIFY_BATCH_MAX
+    )
+
+
+class VerifyTokenResult(BaseModel):
+    valid: bool
+    user_id: UUID | None = None
+    role: str | None = None
+    detail: str | None = None
+
+
+class VerifyBatchResponse(BaseModel):
+    results: List[VerifyTokenResult]
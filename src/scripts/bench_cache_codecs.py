@@ -0,0 +1,65 @@
+"""
+Сравнение кодеков кэша: размер записи и время кодирования/разбора.
+
+Запуск из src: python -m scripts.bench_cache_codecs [--number 20000]
+"""
+
+import argparse
+import timeit
+from datetime import datetime, timezone
+from typing import Any, Callable, List, Tuple
+from uuid import uuid4
+
+from db.casher.codecs import Codec, JsonCodec, PickleCodec
+from schemas.role import RoleFull
+from schemas.user import UserRead
+
+
+def samples() -> List[Tuple[str, Any, Any]]:
+    """Название, тип и значение, которые кэширует сервис"""
+    user = UserRead(
+        id=uuid4(),
+        login="terminator1",
+        first_name="John",
+        last_name="Connor",
+        created_at=datetime.now(timezone.utc),
+    )
+    roles = [
+        RoleFull(id=uuid4(), name=name, description=f"{name} role")
+        for name in ("user", "subscriber", "admin", "superuser")
+    ]
+    return [
+        ("UserRead", UserRead, user),
+        ("List[RoleFull]", List[RoleFull], roles),
+    ]
+
+
+def codecs_for(schema: Any) -> List[Tuple[str, Codec]]:
+    return [("pickle", PickleCodec()), ("json", JsonCodec(schema))]
+
+
+def measure(func: Callable, number: int) -> float:
+    seconds = min(timeit.repeat(func, number=number, repeat=3))
+    return seconds / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20_000)
+    args = parser.parse_args()
+
+    for title, schema, value in samples():
+        print(title)
+        for name, codec in codecs_for(schema):
+            data = codec.dumps(value)
+            assert codec.loads(data) == value
+            encode = measure(lambda: codec.dumps(value), args.number)
+            decode = measure(lambda: codec.loads(data), args.number)
+            print(
+                f"  {name:<8} {len(data):5d} B"
+                f" encode {encode:7.2f} us  decode {decode:7.2f} us"
+            )
+
+
+if __name__ == "__main__":
+    main()
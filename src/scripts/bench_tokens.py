@@ -0,0 +1,89 @@
+"""
+Сравнение выпуска токенов через jwt.encode и через TokenMinter.
+
+Запуск из src: python -m scripts.bench_tokens [--algorithm EdDSA]
+"""
+
+import argparse
+import time
+import timeit
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import jwt
+
+from services.signing import SigningKey, generate_private_key
+from services.token_minter import TokenMinter
+
+EXPIRE_M = 15
+USER_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
+
+
+def legacy_tokens(key: SigningKey, user_id: str, role: str):
+    """Прежний путь: два dict, datetime в exp и два полных jwt.encode"""
+    now = datetime.now()
+    access = {"user_id": user_id, "iat": now.timestamp(), "role": role}
+    refresh = access.copy()
+    access.update(
+        {"jti": str(uuid4()), "exp": now + timedelta(minutes=EXPIRE_M)}
+    )
+    refresh.update(
+        {"jti": str(uuid4()), "exp": now + timedelta(minutes=EXPIRE_M * 100)}
+    )
+    headers = {"kid": key.kid}
+    return (
+        jwt.encode(access, key.signing_key, key.algorithm, headers=headers),
+        jwt.encode(refresh, key.signing_key, key.algorithm, headers=headers),
+    )
+
+
+def check_same_output(key: SigningKey) -> None:
+    """Токены обоих путей побайтно совпадают для одинаковых claims"""
+    payload = {
+        "user_id": USER_ID,
+        "iat": 1_700_000_000,
+        "role": "user",
+        "jti": str(uuid4()),
+        "exp": 1_700_000_900,
+    }
+    options = {"verify_exp": False}
+    expected = jwt.encode(
+        payload, key.signing_key, key.algorithm, headers={"kid": key.kid}
+    )
+    minted = key.encode(payload)
+    if key.algorithm.startswith(("HS", "RS", "EdDSA")):
+        # детерминированные подписи сравниваются целиком
+        assert minted == expected, (minted, expected)
+    assert jwt.get_unverified_header(minted) == jwt.get_unverified_header(
+        expected
+    )
+    decoded = jwt.decode(
+        minted, key.verifying_key, [key.algorithm], options=options
+    )
+    assert decoded == payload
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--algorithm", default="HS256")
+    parser.add_argument("--number", type=int, default=20_000)
+    args = parser.parse_args()
+
+    key = SigningKey(args.algorithm, generate_private_key(args.algorithm))
+    minter = TokenMinter(EXPIRE_M * 60, EXPIRE_M * 100 * 60, time.time)
+    check_same_output(key)
+
+    for name, func in (
+        ("jwt.encode", lambda: legacy_tokens(key, USER_ID, "user")),
+        ("TokenMinter", lambda: minter.mint(key, USER_ID, "user")),
+    ):
+        seconds = min(timeit.repeat(func, number=args.number, repeat=3))
+        per_call = seconds / args.number * 1e6
+        print(
+            f"{name:<12} {per_call:8.2f} us per token pair,"
+            f" {args.number / seconds:10.0f} pairs/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Локальные Redis Sentinel и Redis Cluster из процессов redis-server
+и проверка работы сервиса с ними.
+
+Запуск из src (нужны redis-server и redis-cli в PATH):
+
+    python -m scripts.redis_topology up cluster
+    python -m scripts.redis_topology up sentinel
+    REDIS_MODE=CLUSTER REDIS_NODES=127.0.0.1:7000 \\
+        python -m scripts.redis_topology check
+    python -m scripts.redis_topology down
+
+up выводит переменные окружения для check и для самого сервиса.
+"""
+
+import argparse
+import asyncio
+import shutil
+import subprocess
+import time
+from pathlib import Path
+from typing import Optional
+from uuid import uuid4
+
+DEFAULT_DIR = Path("/tmp/auth-redis-topology")
+CLUSTER_NODES = 6
+SENTINELS = 3
+SERVICE = "mymaster"
+
+
+def start_server(
+    workdir: Path, port: int, *args: str, config: Optional[Path] = None
+) -> None:
+    node_dir = workdir / str(port)
+    node_dir.mkdir(parents=True, exist_ok=True)
+    subprocess.run(
+        [
+            "redis-server",
+            *([str(config)] if config is not None else []),
+            "--port",
+            str(port),
+            "--dir",
+            str(node_dir),
+            "--daemonize",
+            "yes",
+            "--pidfile",
+            str(node_dir / "redis.pid"),
+            "--logfile",
+            str(node_dir / "redis.log"),
+            *args,
+        ],
+        check=True,
+    )
+
+
+def wait_ping(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        ping = subprocess.run(
+            ["redis-cli", "-p", str(port), "ping"],
+            capture_output=True,
+            text=True,
+        )
+        if ping.stdout.strip() == "PONG":
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"redis-server on port {port} did not start")
+
+
+def up_cluster(workdir: Path, base_port: int) -> str:
+    ports = range(base_port, base_port + CLUSTER_NODES)
+    for port in ports:
+        start_server(
+            workdir,
+            port,
+            "--save",
+            "",
+            "--cluster-enabled",
+            "yes",
+            "--cluster-config-file",
+            "nodes.conf",
+        )
+    for port in ports:
+        wait_ping(port)
+    subprocess.run(
+        [
+            "redis-cli",
+            "--cluster",
+            "create",
+            *(f"127.0.0.1:{port}" for port in ports),
+            "--cluster-replicas",
+            "1",
+            "--cluster-yes",
+        ],
+        check=True,
+    )
+    return f"REDIS_MODE=CLUSTER REDIS_NODES=127.0.0.1:{base_port}"
+
+
+def up_sentinel(workdir: Path, base_port: int) -> str:
+    start_server(workdir, base_port, "--save", "")
+    start_server(
+        workdir,
+        base_port + 1,
+        "--save",
+        "",
+        "--replicaof",
+        "127.0.0.1",
+        str(base_port),
+    )
+    sentinel_ports = range(base_port + 100, base_port + 100 + SENTINELS)
+    for port in sentinel_ports:
+        # sentinel переписывает свой конфиг, поэтому нужен файл
+        config = workdir / f"sentinel-{port}.conf"
+        config.write_text(
+            f"sentinel monitor {SERVICE} 127.0.0.1 {base_port} 2\n"
+            f"sentinel down-after-milliseconds {SERVICE} 1000\n"
+            f"sentinel failover-timeout {SERVICE} 5000\n"
+        )
+        start_server(workdir, port, "--sentinel", config=config)
+    for port in (base_port, base_port + 1, *sentinel_ports):
+        wait_ping(port)
+    nodes = ",".join(f"127.0.0.1:{port}" for port in sentinel_ports)
+    return (
+        f"REDIS_MODE=SENTINEL REDIS_NODES={nodes}"
+        f" REDIS_SENTINEL_SERVICE={SERVICE}"
+    )
+
+
+def down(workdir: Path) -> None:
+    for pidfile in workdir.glob("*/redis.pid"):
+        port = pidfile.parent.name
+        subprocess.run(
+            ["redis-cli", "-p", port, "shutdown", "nosave"],
+            capture_output=True,
+        )
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+async def check() -> None:
+    """
+    Прогоняет через настроенную топологию операции сервиса,
+    которые трогают несколько ключей или pub/sub
+    """
+    from core.config import settings
+    from db.redis import RedisCache, create_redis, is_cluster
+    from models.jwt import AccessJWT
+    from services.limiter import RateLimiter
+    from services.login_throttle import LoginThrottle
+    from services.revocation import RevocationStore
+    from services.signing import KeyStore
+
+    client = create_redis()
+    print(f"mode {settings.REDIS_MODE.value}, cluster: {is_cluster(client)}")
+
+    pubsub = client.pubsub()
+    await pubsub.subscribe("topology_check")
+    await client.publish("topology_check", "ping")
+    message = None
+    for _ in range(50):
+        message = await pubsub.get_message(
+            ignore_subscribe_messages=True, timeout=0.1
+        )
+        if message is not None:
+            break
+    await pubsub.aclose()
+    assert message is not None and message["data"] == b"ping"
+    print("pub/sub: ok")
+
+    cache = RedisCache(client)
+    items = {f"ns{i}:v1:g0:check": i for i in range(20)}
+    await cache.set_many(items, 60)
+    assert await cache.get_many(list(items)) == list(items.values())
+    await cache.delete_many(items)
+    assert await cache.get_many(list(items)) == [None] * len(items)
+    print("cache get_many/set_many/delete_many: ok")
+
+    now = int(time.time())
+    store = RevocationStore(client, epoch_ttl=60)
+    tokens = [
+        AccessJWT(
+            user_id=uuid4(), jti=uuid4(), iat=now, exp=now + 60, role="user"
+        )
+        for _ in range(20)
+    ]
+    async with client.pipeline(transaction=False) as pipe:
+        store.queue_revoke(
+            pipe, tokens[0].jti, tokens[0].exp, user_id=tokens[0].user_id
+        )
+        store.queue_user_epoch(pipe, tokens[1].user_id, now + 1)
+        await pipe.execute()
+    revoked = await store.revoked_many(tokens)
+    assert revoked == [True, True] + [False] * (len(tokens) - 2)
+    print("blacklist batch: ok")
+
+    throttle = LoginThrottle(client)
+    login, ip = f"check-{uuid4()}", "127.0.0.1"
+    await throttle.register_failure(login, ip)
+    await throttle.check(login, ip)
+    await throttle.reset(login)
+    print("login throttle: ok")
+
+    keys = KeyStore(client)
+    await keys.load()
+    print("signing key store: ok")
+
+    limit = await RateLimiter(client).check_limit(f"ip:{uuid4()}")
+    assert limit.allowed
+    print("rate limiter: ok")
+
+    await client.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dir", type=Path, default=DEFAULT_DIR)
+    parser.add_argument("--base-port", type=int, default=7000)
+    commands = parser.add_subparsers(dest="command", required=True)
+    up = commands.add_parser("up")
+    up.add_argument("mode", choices=("cluster", "sentinel"))
+    commands.add_parser("down")
+    commands.add_parser("check")
+    args = parser.parse_args()
+
+    if args.command == "up":
+        args.dir.mkdir(parents=True, exist_ok=True)
+        starter = up_cluster if args.mode == "cluster" else up_sentinel
+        print(starter(args.dir, args.base_port))
+    elif args.command == "down":
+        down(args.dir)
+    else:
+        asyncio.run(check())
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ from typing import Type
 from uuid import UUID
 
 from models import SessionHistoryChoices, User
+from models.jwt import RefreshJWT
 from schemas.user import UserCreate, UserRead, UserRole
 from schemas.yndx_oauth import UserInfoSchema
 
@@ -18,6 +19,20 @@ class IAuthRepository(ABC):
         """
         pass
 
+    @abstractmethod
+    async def create_user_with_session(
+        self, user: User, user_agent: str, refresh: RefreshJWT
+    ) -> UserRead:
+        """
+        Создаёт нового пользователя с ролью юзер и сразу открывает
+        ему активную сессию - всё в одной транзакции
+
+        :param user: Новый пользователь с заполненным id
+        :param user_agent: девайс пользователя
+        :param refresh: claims refresh токена, выданного пользователю
+        """
+        pass
+
     @abstractmethod
     async def update_user(
         self, user_db: User, user_info: UserInfoSchema
@@ -49,27 +64,27 @@ class IAuthRepository(ABC):
 
     @abstractmethod
     async def check_refresh_token_in_active_session(
-        self, user_id: UUID, user_agent: str, refresh_token: str
+        self, user_id: UUID, user_agent: str, refresh: RefreshJWT
     ) -> bool:
         """
         Проверяет наличие refresh токена в списке активных сессий в БД
 
         :param user_id: ID пользователя
         :param user_agent: девайс пользователя
-        :param refresh_token: закодированный токен
+        :param refresh: claims refresh токена
         """
         pass
 
     @abstractmethod
     async def insert_new_active_session(
-        self, user_id: UUID, user_agent: str, refresh_token: str
+        self, user_id: UUID, user_agent: str, refresh: RefreshJWT
     ) -> None:
         """
         Добавляет новую активную сессию с refresh токеном в БД
 
         :param user_id: ID пользователя
         :param user_agent: девайс пользователя
-        :param refresh_token: закодированный токен
+        :param refresh: claims refresh токена
         """
         pass
 
@@ -85,12 +100,21 @@ class IAuthRepository(ABC):
         """
         pass
 
+    @abstractmethod
+    async def delete_user_sessions(self, user_id: UUID) -> None:
+        """
+        Удаляет все активные сессии пользователя на всех девайсах
+
+        :param user_id: ID пользователя
+        """
+        pass
+
     @abstractmethod
     async def insert_event_to_session_hist(
         self,
         user_id: UUID,
         user_agent: str,
-        refresh_token: str,
+        refresh: RefreshJWT,
         event: SessionHistoryChoices,
     ) -> None:
         """
@@ -98,7 +122,7 @@ class IAuthRepository(ABC):
 
         :param user_id: ID пользователя
         :param user_agent: девайс пользователя
-        :param refresh_token: закодированный токен
+        :param refresh: claims refresh токена
         """
         pass
 
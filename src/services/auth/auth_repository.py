@@ -1,6 +1,5 @@
 import logging
 from contextlib import asynccontextmanager
-from datetime import datetime
 from typing import Any, List, Type
 from uuid import UUID
 
@@ -12,12 +11,12 @@ from sqlalchemy.orm import joinedload
 
 from core.config import UserRoleDefault
 from models import Role, User
+from models.jwt import RefreshJWT
 from models.session import ActiveSession, SessionHistory, SessionHistoryChoices
 from schemas.user import UserRead, UserRole
 from schemas.yndx_oauth import UserInfoSchema
 from services import get_data_access
 from services.auth import IAuthRepository, get_auth_repository_class
-from services.utils import decode_jwt_token
 
 
 class AuthServiceExc(Exception):
@@ -62,6 +61,35 @@ class SQLAlchemyAuthRepository(IAuthRepository):
 
         return UserRead.model_validate(user)
 
+    async def create_user_with_session(
+        self, user: User, user_agent: str, refresh: RefreshJWT
+    ) -> UserRead:
+        """
+        Создаёт нового пользователя с ролью user и сразу открывает
+        ему активную сессию - всё в одной транзакции
+
+        :param user: Новый пользователь с заполненным id
+        :param user_agent: девайс пользователя
+        :param refresh: claims refresh токена, выданного пользователю
+        """
+        stmt = select(Role).where(Role.name == UserRoleDefault.USER)
+        role_instance = await self.db_session.scalar(stmt)
+        user.roles.append(role_instance)
+
+        session_dict = self._session_fields(user.id, user_agent, refresh)
+
+        async with self._transaction_handler("Can't create new user"):
+            self.db_session.add(user)
+            self.db_session.add(ActiveSession(**session_dict))
+            self.db_session.add(
+                SessionHistory(
+                    **session_dict,
+                    name=SessionHistoryChoices.LOGIN_WITH_PASSWORD,
+                )
+            )
+
+        return UserRead.model_validate(user)
+
     async def update_user(
         self, user_db: User, user_info: UserInfoSchema
     ) -> UserRead:
@@ -123,22 +151,19 @@ class SQLAlchemyAuthRepository(IAuthRepository):
         return result.first() or []
 
     async def check_refresh_token_in_active_session(
-        self, user_id: UUID, user_agent: str, refresh_token: str
+        self, user_id: UUID, user_agent: str, refresh: RefreshJWT
     ) -> bool:
         """
         Проверяет наличие refresh токена в списке активных сессий в БД
 
         :param user_id: ID пользователя
         :param user_agent: девайс пользователя
-        :param refresh_token: закодированный токен
+        :param refresh: claims refresh токена
         """
-        refresh_token_dict = await decode_jwt_token(refresh_token)
-        refresh_token_id = refresh_token_dict["jti"]
-
         stmt = select(ActiveSession).where(
             and_(
                 ActiveSession.user_id == user_id,
-                ActiveSession.refresh_token_id == refresh_token_id,
+                ActiveSession.refresh_token_id == refresh.jti,
             )
         )
         sess = await self.db_session.scalar(stmt)
@@ -149,25 +174,17 @@ class SQLAlchemyAuthRepository(IAuthRepository):
         return True
 
     async def insert_new_active_session(
-        self, user_id: UUID, user_agent: str, refresh_token: str
+        self, user_id: UUID, user_agent: str, refresh: RefreshJWT
     ) -> None:
         """
         Добавляет новую активную сессию с refresh токеном в БД
 
         :param user_id: ID пользователя
         :param user_agent: девайс пользователя
-        :param refresh_token: закодированный токен
+        :param refresh: claims refresh токена
         """
 
-        refresh_token_dict = await decode_jwt_token(refresh_token)
-
-        session_dict = {
-            "user_id": user_id,
-            "refresh_token_id": refresh_token_dict["jti"],
-            "issued_at": datetime.fromtimestamp(refresh_token_dict["iat"]),
-            "expires_at": datetime.fromtimestamp(refresh_token_dict["exp"]),
-            "device_info": user_agent,
-        }
+        session_dict = self._session_fields(user_id, user_agent, refresh)
 
         session = ActiveSession(**session_dict)
 
@@ -200,11 +217,21 @@ class SQLAlchemyAuthRepository(IAuthRepository):
                 user_agent,
             )
 
+    async def delete_user_sessions(self, user_id: UUID) -> None:
+        """
+        Удаляет все активные сессии пользователя на всех девайсах
+
+        :param user_id: ID пользователя
+        """
+        stmt = delete(ActiveSession).where(ActiveSession.user_id == user_id)
+        async with self._transaction_handler("Can't delete user sessions"):
+            await self.db_session.execute(stmt)
+
     async def insert_event_to_session_hist(
         self,
         user_id: UUID,
         user_agent: str,
-        refresh_token: str,
+        refresh: RefreshJWT,
         event: SessionHistoryChoices,
     ) -> None:
         """
@@ -212,20 +239,11 @@ class SQLAlchemyAuthRepository(IAuthRepository):
 
         :param user_id: ID пользователя
         :param user_agent: девайс пользователя
-        :param refresh_token: закодированный токен
+        :param refresh: claims refresh токена
         """
-        refresh_token_dict = await decode_jwt_token(refresh_token)
-
-        session_dict = {
-            "user_id": user_id,
-            "refresh_token_id": refresh_token_dict["jti"],
-            "issued_at": datetime.fromtimestamp(refresh_token_dict["iat"]),
-            "expires_at": datetime.fromtimestamp(refresh_token_dict["exp"]),
-            "device_info": user_agent,
-            "name": event,
-        }
+        session_dict = self._session_fields(user_id, user_agent, refresh)
 
-        session_hist = SessionHistory(**session_dict)
+        session_hist = SessionHistory(**session_dict, name=event)
 
         async with self._transaction_handler("Can't add session event"):
             self.db_session.add(session_hist)
@@ -250,6 +268,21 @@ class SQLAlchemyAuthRepository(IAuthRepository):
         async with self._transaction_handler("Can't update user"):
             await self.db_session.execute(stmt)
 
+    @staticmethod
+    def _session_fields(
+        user_id: UUID, user_agent: str, refresh: RefreshJWT
+    ) -> dict[str, Any]:
+        """
+        Общие поля записей активной сессии и истории сессий
+        """
+        return {
+            "user_id": user_id,
+            "refresh_token_id": refresh.jti,
+            "issued_at": refresh.issued_at,
+            "expires_at": refresh.expires_at,
+            "device_info": user_agent,
+        }
+
 
 async def get_repository(
     data_access: Any = Depends(get_data_access),
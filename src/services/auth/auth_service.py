@@ -1,13 +1,18 @@
 import logging
 from contextlib import suppress
+from typing import Optional
+from uuid import UUID, uuid4
 
-import jwt
 from fastapi import Depends
-from werkzeug.security import check_password_hash, generate_password_hash
 
-from core.config import UserRoleDefault, settings
+from core.config import UserRoleDefault
 from db.casher import AbstractCache, get_cacher
-from exceptions.errors import PasswordOrLoginExc, UnauthorizedExc
+from exceptions.errors import (
+    PasswordOrLoginExc,
+    RevocationUnavailableExc,
+    UnauthorizedExc,
+)
+from models.jwt import AccessJWT, RefreshJWT
 from models.session import SessionHistoryChoices
 from models.user import User
 from schemas.auth import UserLogin, UserLoginResponse, UserTokenResponse
@@ -16,9 +21,13 @@ from schemas.yndx_oauth import UserInfoSchema
 from services.auth import IAuthRepository
 from services.auth.auth_repository import get_repository
 from services.helpers import generate_secure_password
+from services.login_throttle import LoginThrottle, get_login_throttle
+from services.password import AbstractPasswordHasher, get_password_hasher
+from services.revocation import RevocationReplica, get_revocations
+from services.token_context import verify_access_token
 from services.tracer import Tracer, get_tracer
 from services.user.user_service import UserService, get_user_service
-from services.utils import decode_jwt_token, generate_new_tokens
+from services.utils import generate_new_tokens
 
 logger = logging.getLogger(__name__)
 
@@ -39,13 +48,20 @@ class AuthService:
         cacher (AbstractCache): Интерфейс кэша
             для управления сессионными токенами.
         user_service (UserService): Сервис пользователей, для получения ролей
+        hasher (AbstractPasswordHasher): Хэширование и проверка паролей
+            вне event loop.
+        throttle (LoginThrottle): Ограничение подбора паролей.
 
     Методы:
         signup_user(user_create: UserCreate, role_service: RoleService)
             -> UserRead:
             Регистрирует нового пользователя и назначает роли.
 
-        login_user(user_login: UserLogin, user_agent: str)
+        register_and_issue_tokens(user_create: UserCreate, user_agent: str)
+            -> tuple[UserRead, UserTokenResponse]:
+            Регистрирует нового пользователя и сразу выдаёт ему токены.
+
+        login_user(user_login: UserLogin, user_agent: str, client_ip: str)
             -> tuple[UserRole, UserTokenResponse:
             Аутентифицирует пользователя и возвращает токены доступа
                 и обновления.
@@ -67,8 +83,16 @@ class AuthService:
         ) -> UserTokenResponse:
             Выдает новые токены доступа и обновления для пользователя.
 
-        password_update(user_id: str, user_update: UserUpdate) -> None:
-            Обновляет пароль пользователя.
+        password_update(
+            user_agent: str,
+            access: AccessJWT,
+            user_update: UserUpdate
+        ) -> UserTokenResponse:
+            Обновляет пароль пользователя, отзывает все его токены
+            и выдаёт новые текущему девайсу.
+
+        revoke_user_tokens(user_id: UUID) -> None:
+            Отзывает все токены и сессии пользователя.
 
     Исключения:
         HTTPException: Поднимается при различных ошибках аутентификации,
@@ -81,11 +105,17 @@ class AuthService:
         cacher: AbstractCache,
         user_service: UserService,
         tracer: Tracer,
+        hasher: AbstractPasswordHasher,
+        throttle: LoginThrottle,
+        revocations: RevocationReplica,
     ):
         self.repository = repository
         self.cacher = cacher
         self.user_service = user_service
         self.tracer = tracer
+        self.hasher = hasher
+        self.throttle = throttle
+        self.revocations = revocations
 
     async def signup_user(self, user_create: UserCreate) -> UserRead:
         """
@@ -93,21 +123,57 @@ class AuthService:
         """
         with self.tracer.start_span("auth_service.signup_user") as span:
             span.set_attribute("login", user_create.login)
-            user_create_dict = user_create.model_dump()
+            user = await self._new_user(user_create)
 
-            password = user_create_dict.pop("password")
+            created_user = await self.repository.create_user(user)
+            return created_user
 
-            if len(password) < 8 or len(user_create_dict["login"]) < 3:
-                raise PasswordOrLoginExc()
+    async def register_and_issue_tokens(
+        self, user_create: UserCreate, user_agent: str
+    ) -> tuple[UserRead, UserTokenResponse]:
+        """
+        Регистрация пользователя с одновременным входом.
 
-            user_create_dict["password_hash"] = generate_password_hash(
-                password
+        Пароль хэшируется один раз, токены выпускаются по только что
+        созданному пользователю, без повторного чтения из БД и проверки
+        пароля. Пользователь, его роль и сессия пишутся одной транзакцией.
+        """
+        with self.tracer.start_span(
+            "auth_service.register_and_issue_tokens"
+        ) as span:
+            span.set_attribute("login", user_create.login)
+            user = await self._new_user(user_create)
+
+            tokens = await generate_new_tokens(user.id, UserRoleDefault.USER)
+
+            created_user = await self.repository.create_user_with_session(
+                user, user_agent, tokens.refresh
             )
 
-            created_user = await self.repository.create_user(
-                User(**user_create_dict)
+            return (
+                created_user,
+                UserTokenResponse(
+                    access_token=tokens.access_token,
+                    refresh_token=tokens.refresh_token,
+                ),
             )
-            return created_user
+
+    async def _new_user(self, user_create: UserCreate) -> User:
+        """
+        Проверяет логин и пароль и собирает нового пользователя
+        с захэшированным паролем.
+        """
+        if len(user_create.password) < 8 or len(user_create.login) < 3:
+            raise PasswordOrLoginExc()
+
+        user_create_dict = user_create.model_dump(
+            include={"login", "first_name", "last_name"}, exclude_none=True
+        )
+        user_create_dict["password_hash"] = await self.hasher.hash(
+            user_create.password
+        )
+
+        return User(id=uuid4(), **user_create_dict)
 
     async def get_token(
         self, user: UserRole, user_agent: str
@@ -127,20 +193,17 @@ class AuthService:
                 - UserLoginResponse: Объект с информацией о пользователе.
                 - UserTokenResponse: Объект с токенами доступа и обновления.
         """
-        (
-            access_token_encoded_jwt,
-            refresh_token_encoded_jwt,
-        ) = await generate_new_tokens(user.id, user.role)
+        tokens = await generate_new_tokens(user.id, user.role)
 
         await self.repository.delete_active_session(user.id, user_agent)
 
         await self.repository.insert_new_active_session(
-            user.id, user_agent, refresh_token_encoded_jwt
+            user.id, user_agent, tokens.refresh
         )
         await self.repository.insert_event_to_session_hist(
             user.id,
             user_agent,
-            refresh_token_encoded_jwt,
+            tokens.refresh,
             SessionHistoryChoices.LOGIN_WITH_PASSWORD,
         )
 
@@ -152,29 +215,46 @@ class AuthService:
                 role=user.role,
             ),
             UserTokenResponse(
-                access_token=access_token_encoded_jwt,
-                refresh_token=refresh_token_encoded_jwt,
+                access_token=tokens.access_token,
+                refresh_token=tokens.refresh_token,
             ),
         )
 
     async def login_user(
-        self, user_login: UserLogin, user_agent: str
+        self, user_login: UserLogin, user_agent: str, client_ip: str
     ) -> tuple[UserRole, UserTokenResponse]:
         """
         Аутентификация пользователя логином и паролем.
+
+        Заблокированные логин или IP отклоняются до запроса в БД
+        и вычисления хэша пароля.
         """
+        await self.throttle.check(user_login.login, client_ip)
+
         user = await self.repository.get_user_with_roles_by_login(
             user_login.login
         )
 
         if not user:
             logger.error("User %s not found", user_login.login)
+            await self.throttle.register_failure(user_login.login, client_ip)
             raise UnauthorizedExc("Invalid login or password")
 
-        if not check_password_hash(user.password_hash, user_login.password):
+        if not await self.hasher.verify(
+            user.password_hash, user_login.password
+        ):
             logger.error("Password is incorrect")
+            await self.throttle.register_failure(user_login.login, client_ip)
             raise UnauthorizedExc("Invalid login or password")
 
+        await self.throttle.reset(user_login.login)
+
+        if self.hasher.needs_rehash(user.password_hash):
+            logger.info("Rehashing password of user %s", user.id)
+            await self.repository.update_passord_hash(
+                user.id, await self.hasher.hash(user_login.password)
+            )
+
         user_resp, token_resp = await self.get_token(user, user_agent)
 
         return user_resp, token_resp
@@ -273,39 +353,52 @@ class AuthService:
 
     async def logout_user(
         self,
-        user_id: str,
         user_agent: str,
-        access_token: str,
-        refresh_token: str,
+        access: AccessJWT,
+        refresh: Optional[RefreshJWT],
     ) -> None:
         """
         Выход пользователя.
+
+        Событие выхода пишется в историю, только если вместе
+        с access токеном пришёл валидный refresh токен.
+
+        :raise RevocationUnavailableExc: Если отзыв access токена
+            не дошёл до Redis
         """
+        user_id = access.user_id
         await self.repository.delete_active_session(user_id, user_agent)
 
-        await self._blacklist_access_token(access_token)
+        published = await self._blacklist_access_token(access)
 
-        await self.repository.insert_event_to_session_hist(
-            user_id,
-            user_agent,
-            refresh_token,
-            SessionHistoryChoices.USER_LOGOUT,
-        )
+        if refresh is None:
+            logger.warning("Logout of user %s without refresh token", user_id)
+        else:
+            await self.repository.insert_event_to_session_hist(
+                user_id,
+                user_agent,
+                refresh,
+                SessionHistoryChoices.USER_LOGOUT,
+            )
+
+        if not published:
+            # сессия удалена, но access токен примут другие воркеры
+            raise RevocationUnavailableExc()
 
         return None
 
     async def refresh_token(
         self,
-        user_id: str,
         user_agent: str,
-        access_token: str,
-        refresh_token: str,
+        refresh: RefreshJWT,
+        access: Optional[AccessJWT],
     ) -> UserTokenResponse:
         """
         Выдача новых токенов пользователю.
         """
+        user_id = refresh.user_id
         check = await self.repository.check_refresh_token_in_active_session(
-            user_id, user_agent, refresh_token
+            user_id, user_agent, refresh
         )
         if not check:
             logger.error("Refresh token is invalid")
@@ -313,59 +406,98 @@ class AuthService:
 
         await self.repository.delete_active_session(user_id, user_agent)
 
-        await self._blacklist_access_token(access_token)
+        await self._blacklist_access_token(access)
 
         user_role = await self.repository.get_user_roles(user_id)
-        (
-            access_token_encoded_jwt,
-            refresh_token_encoded_jwt,
-        ) = await generate_new_tokens(user_id, user_role)
+        tokens = await generate_new_tokens(user_id, user_role)
 
         await self.repository.insert_new_active_session(
-            user_id, user_agent, refresh_token_encoded_jwt
+            user_id, user_agent, tokens.refresh
         )
 
         await self.repository.insert_event_to_session_hist(
             user_id,
             user_agent,
-            refresh_token,
+            refresh,
             SessionHistoryChoices.REFRESH_TOKEN_UPDATE,
         )
 
         return UserTokenResponse(
-            access_token=access_token_encoded_jwt,
-            refresh_token=refresh_token_encoded_jwt,
+            access_token=tokens.access_token,
+            refresh_token=tokens.refresh_token,
         )
 
     async def password_update(
         self,
-        user_id: str,
+        user_agent: str,
+        access: AccessJWT,
         user_update: UserUpdate,
-    ) -> None:
+    ) -> UserTokenResponse:
         """
         Смена пароля пользователю.
+
+        Все токены и сессии пользователя отзываются, а текущему
+        девайсу выдаётся новая пара токенов.
         """
+        user_id = access.user_id
         if not user_update.password:
             raise PasswordOrLoginExc()
 
         if len(user_update.password) < 8:
             raise PasswordOrLoginExc()
 
-        new_password_hash = generate_password_hash(user_update.password)
+        new_password_hash = await self.hasher.hash(user_update.password)
 
         await self.repository.update_passord_hash(
             user_id,
             new_password_hash,
         )
 
-        return None
+        await self.revoke_user_tokens(user_id)
+
+        user_role = await self.repository.get_user_roles(user_id)
+        tokens = await generate_new_tokens(user_id, user_role)
+
+        await self.repository.insert_new_active_session(
+            user_id, user_agent, tokens.refresh
+        )
+        await self.repository.insert_event_to_session_hist(
+            user_id,
+            user_agent,
+            tokens.refresh,
+            SessionHistoryChoices.PASSWORD_UPDATE,
+        )
+
+        return UserTokenResponse(
+            access_token=tokens.access_token,
+            refresh_token=tokens.refresh_token,
+        )
+
+    async def revoke_user_tokens(self, user_id: UUID) -> None:
+        """
+        Выход пользователя на всех девайсах.
+
+        Активные сессии удаляются - refresh токены больше
+        не обменять, а эпоха отзыва делает недействительными все
+        access токены, выпущенные до текущего момента, без записи
+        каждого из них в чёрный список.
+
+        :raise RevocationUnavailableExc: Если эпоха не дошла до Redis
+        """
+        await self.repository.delete_user_sessions(user_id)
+        if not await self.revocations.publish_user_epoch(user_id):
+            raise RevocationUnavailableExc()
 
     async def verify_role(self, access_token: str, role: str) -> bool:
         """
         Проверка наличия роли в пользовательском токене доступа.
+        Токен проверяется так же, как в остальных проверках:
+        подпись, срок, отзыв по jti и эпоха пользователя.
+
+        :raise UnauthorizedExc: Если токен невалиден, истёк или отозван
         """
-        access_token_dict: dict = await decode_jwt_token(access_token)
-        token_role: str = access_token_dict.get("role", None)
+        claims = await verify_access_token(access_token)
+        token_role = claims.role
 
         priority = list(UserRoleDefault)
 
@@ -378,20 +510,21 @@ class AuthService:
 
         return False
 
-    async def _blacklist_access_token(self, encoded_jwt_token: str):
+    async def _blacklist_access_token(
+        self, access: Optional[AccessJWT]
+    ) -> bool:
         """
-        Добавление access_token в чёрный список в Redis.
+        Отзыв access_token до истечения его срока.
+
+        Истёкший или невалидный токен (access is None) уже не пройдёт
+        проверку, и в чёрный список его не добавляем.
+        False - отзыв не дошёл до Redis.
         """
-        try:
-            access_token_dict = await decode_jwt_token(encoded_jwt_token)
-        except jwt.exceptions.PyJWTError:
-            return None
-
-        access_token_id = access_token_dict["jti"]
-        await self.cacher.set(
-            f"blacklist:{access_token_id}",
-            access_token_dict["user_id"],
-            settings.JWT_TOKEN_EXPIRE_TIME_M * 60,
+        if access is None:
+            return True
+
+        return await self.revocations.publish(
+            access.jti, access.exp, access.user_id
         )
 
 
@@ -400,6 +533,9 @@ def get_auth_service(
     cacher: AbstractCache = Depends(get_cacher),
     user_service: UserService = Depends(get_user_service),
     tracer: Tracer = Depends(get_tracer),
+    hasher: AbstractPasswordHasher = Depends(get_password_hasher),
+    throttle: LoginThrottle = Depends(get_login_throttle),
+    revocations: RevocationReplica = Depends(get_revocations),
 ) -> AuthService:
     """
     Функция для создания экземпляра класса AuthService
@@ -409,4 +545,7 @@ def get_auth_service(
         cacher=cacher,
         user_service=user_service,
         tracer=tracer,
+        hasher=hasher,
+        throttle=throttle,
+        revocations=revocations,
     )
@@ -7,8 +7,10 @@ import requests
 from fastapi import Depends, HTTPException, Response, status
 
 from core.config import settings
-from schemas.auth import AccessJWT, UserTokenResponse
+from models.jwt import RefreshJWT
+from schemas.auth import UserTokenResponse
 from services.role.role_service import RoleService, get_role_service
+from services.token_context import verify_refresh_epoch
 from services.utils import get_params_from_refresh_token
 
 
@@ -225,21 +227,24 @@ class PermissionChecker:
 
     Этот класс используется как зависимость в маршрутах FastAPI для проверки,
     имеет ли текущий пользователь хотя бы одну из требуемых ролей.
-    Если у пользователя недостаточно прав,
+    Роль берётся из refresh токена, отозванный по эпохе пользователя
+    токен отклоняется с HTTP 401. Если у пользователя недостаточно прав,
     выбрасывается исключение HTTP 403 Forbidden.
     """
 
     def __init__(self, required: Set[str]) -> None:
         self.required = required
 
-    def __call__(
+    async def __call__(
         self,
-        access: AccessJWT = Depends(get_params_from_refresh_token),
+        access: RefreshJWT = Depends(get_params_from_refresh_token),
         role_service: RoleService = Depends(get_role_service),
     ) -> bool:
         """
         Проверяет, имеет ли пользователь хотя бы одну из требуемых ролей.
         """
+        await verify_refresh_epoch(access)
+
         if access.role not in self.required:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
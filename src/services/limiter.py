@@ -1,34 +1,382 @@
-import datetime
+import asyncio
 import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional
+
+from fastapi import Request
 
 from core.config import settings
-from db.redis import Redis
+from db.breaker import CircuitBreaker, redis_breaker
+from db.casher.lru import LRUCache
+from db.casher.metrics import track
+from db.redis import Redis, hash_tag
+from services.metrics import registry
+from services.token_context import access_claims_or_none
 
 logger = logging.getLogger(__name__)
 
+RATE_LIMIT_DECISIONS = registry.counter(
+    "rate_limit_decisions_total",
+    "Rate limit decisions by source: local (leased quota), redis,"
+    " fallback (Redis unavailable)",
+    labels=("source",),
+)
+RATE_LIMITED = registry.counter(
+    "rate_limit_rejected_total",
+    "Requests rejected by the rate limiter",
+    labels=("identity",),
+)
+
+# GCRA с арендой: KEYS[1] - теоретическое время, к которому квота
+# клиента была бы израсходована (TAT), мс
+# ARGV: интервал между запросами и допуск на всплеск в мс,
+#       сколько запросов выдать и сколько неизрасходованных вернуть
+# возвращает: выдано, остаток после выдачи, через сколько мс
+#             появится следующий запрос и через сколько мс квота полная
+LEASE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + tonumber(time[2]) / 1000
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+tat = math.max(tat - tonumber(ARGV[4]) * interval, now)
+local available = math.floor((now + tolerance - tat) / interval)
+local granted = math.max(math.min(tonumber(ARGV[3]), available), 0)
+tat = tat + granted * interval
+if tat > now then
+    redis.call(
+        'SET', KEYS[1], string.format('%.3f', tat),
+        'PX', math.ceil(tat - now)
+    )
+else
+    redis.call('DEL', KEYS[1])
+end
+local retry = 0
+if granted == 0 then
+    retry = math.ceil(tat + interval - tolerance - now)
+end
+return {
+    granted, math.max(available - granted, 0), retry, math.ceil(tat - now)
+}
+"""
+
+
+class RateLimit(NamedTuple):
+    """Решение лимитера по запросу; сроки - в секундах"""
+
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: float
+    reset_after: float
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(math.ceil(self.retry_after))
+        return headers
+
+
+def gcra(
+    tat: float, now: float, interval: float, tolerance: float
+) -> tuple[Optional[float], int, float, float]:
+    """
+    Шаг GCRA, как LEASE_SCRIPT для одного запроса: новый TAT (None, если запрос
+    отклонён), остаток, задержка до повтора и до полной квоты
+    """
+    tat = max(tat, now)
+    new_tat = tat + interval
+    allow_at = new_tat - tolerance
+    if allow_at > now:
+        return None, 0, allow_at - now, tat - now
+    return new_tat, int((now - allow_at) // interval), 0.0, new_tat - now
+
+
+def client_identity(request: Request) -> str:
+    """
+    Кого ограничивает лимитер: владельца access токена (подпись
+    проверяется, отзыв - нет), иначе IP клиента.
+    """
+    claims = access_claims_or_none(request.cookies.get("access_token"))
+    if claims is not None:
+        return f"user:{claims.user_id}"
+    return f"ip:{client_ip(request)}"
+
+
+def client_ip(request: Request) -> str:
+    """
+    IP клиента: за nginx он приходит в RATE_LIMIT_IP_HEADER,
+    адрес соединения - адрес самого nginx
+    """
+    ip = None
+    if settings.RATE_LIMIT_IP_HEADER:
+        ip = request.headers.get(settings.RATE_LIMIT_IP_HEADER)
+    if not ip and request.client:
+        ip = request.client.host
+    return ip or ""
+
+
+class LocalRateLimiter:
+    """
+    GCRA в памяти воркера.
+
+    Запасной вариант, пока Redis недоступен: лимит считается
+    в каждом воркере отдельно, поэтому на весь сервис выходит
+    мягче, зато запросы не ждут Redis.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        maxsize: int,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.limit = burst
+        self.interval = 1000 / rate
+        self.tolerance = self.interval * burst
+        self.clock = clock
+        self._tats = LRUCache(maxsize, clock=clock)
+
+    def check_limit(self, identity: str) -> RateLimit:
+        now = self.clock() * 1000
+        new_tat, remaining, retry_after, reset_after = gcra(
+            self._tats.get(identity, now, count=False),
+            now,
+            self.interval,
+            self.tolerance,
+        )
+        if new_tat is not None:
+            self._tats.set(identity, new_tat, ttl=(new_tat - now) / 1000)
+        return RateLimit(
+            new_tat is not None,
+            self.limit,
+            remaining,
+            retry_after / 1000,
+            reset_after / 1000,
+        )
+
+
+class Lease:
+    """Запросы клиента, заранее списанные с его квоты в Redis"""
+
+    __slots__ = (
+        "tokens",
+        "size",
+        "expires_at",
+        "blocked_until",
+        "remaining",
+        "reset_at",
+    )
+
+    def __init__(self) -> None:
+        self.tokens = 0
+        self.size = 0
+        self.expires_at = 0.0
+        # после отказа Redis раньше Retry-After квоты не появится
+        self.blocked_until = 0.0
+        # остаток квоты в Redis и момент её полного восстановления
+        # на время последней аренды - для заголовков ответа
+        self.remaining = 0
+        self.reset_at = 0.0
+
 
 class RateLimiter:
-    def __init__(self, redis):
+    """
+    Лимит запросов на клиента по GCRA (generic cell rate algorithm).
+
+    На клиента в Redis хранится одно число - время, к которому
+    его квота была бы израсходована при ровном темпе rate запросов
+    в секунду; всплеск до burst запросов допускается. Учёт -
+    один вызов Lua-скрипта, время берётся у Redis, поэтому часы
+    воркеров не влияют на лимит. Ключ клиента не переиспользуется
+    и истекает, когда квота восстанавливается полностью.
+
+    Чтобы не ходить в Redis на каждый запрос, воркер арендует
+    квоту пачками: скрипт списывает сразу несколько запросов,
+    и следующие решаются в памяти, пока аренда не кончится или
+    не истечёт через lease_ttl. Первый запрос клиента арендует
+    один запрос, а каждая аренда, израсходованная до срока,
+    удваивает следующую до lease_max: редкие клиенты проверяются
+    в Redis точно, частые - в основном в памяти. Неизрасходованные
+    истёкшие аренды фоновая сверка возвращает в Redis. Отказ
+    тоже запоминается до Retry-After, так что клиент сверх
+    лимита не стоит запроса к Redis на каждый свой запрос.
+
+    Лимит не превышается: каждый запрос из аренды уже списан
+    в Redis. Цена - ранний отказ: пока другие воркеры держат
+    аренды клиента, ему доступно меньше - не больше чем
+    на lease_max запросов на воркер и не дольше lease_ttl.
+    """
+
+    PREFIX = "rl:"
+
+    def __init__(
+        self,
+        redis: Redis,
+        rate: float = settings.REQUEST_LIMIT_PER_SECOND,
+        burst: int = settings.REQUEST_LIMIT_BURST,
+        lease_max: int = settings.RATE_LIMIT_LEASE_MAX,
+        lease_ttl: float = settings.RATE_LIMIT_LEASE_TTL_S,
+        breaker: CircuitBreaker = redis_breaker,
+        clock: Callable[[], float] = time.monotonic,
+    ):
         self.redis: Redis = redis
+        self.limit = burst
+        self.interval = 1000 / rate
+        self.tolerance = self.interval * burst
+        self.lease_max = max(1, min(lease_max, burst))
+        self.lease_ttl = lease_ttl
+        self.breaker = breaker
+        self.clock = clock
+        self.local = LocalRateLimiter(
+            rate, burst, settings.RATE_LIMIT_LOCAL_SIZE
+        )
+        self._script = redis.register_script(LEASE_SCRIPT)
+        # аренды в порядке последнего обращения - для вытеснения LRU
+        self._leases: OrderedDict[str, Lease] = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
 
-    async def check_limit(self):
-        pipe = self.redis.pipeline()
-        now = datetime.datetime.now()
-        key = f"limit:{now.second}"
-        pipe.incr(key, 1)
-        pipe.expire(key, 2)
-        result = await pipe.execute()
-        request_number = result[0]
-        if request_number > settings.REQUEST_LIMIT_PER_SECOND:
-            logger.warning(
-                "Request limit exceeded: %s requests in one second",
-                request_number,
+    def key(self, identity: str) -> str:
+        return self.PREFIX + hash_tag(identity)
+
+    async def check_limit(self, identity: str) -> RateLimit:
+        now = self.clock()
+        lease = self._leases.get(identity)
+        if lease is not None:
+            self._leases.move_to_end(identity)
+        if lease is not None and lease.tokens and lease.expires_at > now:
+            lease.tokens -= 1
+            RATE_LIMIT_DECISIONS.inc(source="local")
+            return RateLimit(
+                True,
+                self.limit,
+                lease.tokens + lease.remaining,
+                0.0,
+                max(lease.reset_at - now, 0.0),
+            )
+        if lease is not None and lease.blocked_until > now:
+            result = RateLimit(
+                False,
+                self.limit,
+                0,
+                lease.blocked_until - now,
+                max(lease.reset_at - now, 0.0),
             )
-            return True
-        return False
+            RATE_LIMIT_DECISIONS.inc(source="local")
+        else:
+            result = await self._lease(identity, lease, now)
+
+        if not result.allowed:
+            kind = identity.partition(":")[0]
+            RATE_LIMITED.inc(identity=kind)
+            # на каждый отказ - debug: клиент сверх лимита шлёт
+            # запросы потоком, отказы считает RATE_LIMITED
+            logger.debug("Request limit exceeded for %s", identity)
+        return result
+
+    async def _lease(
+        self, identity: str, lease: Optional[Lease], now: float
+    ) -> RateLimit:
+        if lease is None:
+            lease = self._new_lease(identity)
+        if lease.expires_at > now:
+            # аренда кончилась до срока - клиент частый
+            size = min(lease.size * 2, self.lease_max)
+        else:
+            size = 1
+        # остаток истёкшей аренды возвращается тем же вызовом
+        unused, lease.tokens = lease.tokens, 0
+
+        try:
+            with track("limiter", "lease"), self.breaker.guard():
+                granted, remaining, retry_ms, reset_ms = await self._script(
+                    keys=[self.key(identity)],
+                    args=[self.interval, self.tolerance, size, unused],
+                )
+        except Exception as ex:
+            logger.debug("Rate limiter falls back to local counter: %s", ex)
+            RATE_LIMIT_DECISIONS.inc(source="fallback")
+            return self.local.check_limit(identity)
+
+        RATE_LIMIT_DECISIONS.inc(source="redis")
+        if granted:
+            lease.tokens += granted - 1
+            lease.size = size
+            lease.expires_at = now + self.lease_ttl
+        else:
+            lease.blocked_until = now + retry_ms / 1000
+        lease.remaining = remaining
+        lease.reset_at = now + reset_ms / 1000
+        return RateLimit(
+            granted > 0,
+            self.limit,
+            remaining + lease.tokens,
+            retry_ms / 1000,
+            reset_ms / 1000,
+        )
+
+    def _new_lease(self, identity: str) -> Lease:
+        if len(self._leases) >= settings.RATE_LIMIT_LOCAL_SIZE:
+            # вытесняется давно не обращавшийся клиент,
+            # остаток его аренды просто пропадает
+            self._leases.popitem(last=False)
+        lease = self._leases[identity] = Lease()
+        return lease
+
+    async def reconcile(self) -> None:
+        """
+        Забывает истёкшие аренды и возвращает в Redis
+        их неизрасходованные запросы
+        """
+        now = self.clock()
+        unused = []
+        for identity, lease in list(self._leases.items()):
+            if max(lease.expires_at, lease.blocked_until) > now:
+                continue
+            del self._leases[identity]
+            if lease.tokens:
+                unused.append((identity, lease.tokens))
+        if not unused:
+            return
+
+        with track("limiter", "release"), self.breaker.guard():
+            await asyncio.gather(
+                *(
+                    self._script(
+                        keys=[self.key(identity)],
+                        args=[self.interval, self.tolerance, 0, tokens],
+                    )
+                    for identity, tokens in unused
+                )
+            )
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._reconcile())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _reconcile(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_ttl)
+            try:
+                await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                logger.error("Can't return unused rate limit leases: %s", ex)
+
+
+rate_limiter: Optional[RateLimiter] = None
 
-    async def __aenter__(self):
-        return self
 
-    async def __aexit__(self, type, value, traceback):
-        await self.redis.close()
+async def get_rate_limiter() -> RateLimiter:
+    return rate_limiter
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import math
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from core.config import settings
+from db.breaker import CircuitBreaker, redis_breaker
+from db.redis import hash_tag
+from exceptions.errors import TooManyLoginAttemptsExc
+
+logger = logging.getLogger(__name__)
+
+# KEYS: счётчик неудач и ключ блокировки одного логина или IP
+# ARGV: окно счётчика, бесплатные попытки,
+#       базовая и максимальная задержка в секундах
+FAILURE_SCRIPT = """
+local failures = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+local free = tonumber(ARGV[2])
+if failures > free then
+    local delay = math.min(
+        tonumber(ARGV[3]) * 2 ^ (failures - free - 1), tonumber(ARGV[4])
+    )
+    -- PX в целых мс: у EX минимум секунда, а задержка 0 не блокирует
+    local delay_ms = math.ceil(delay * 1000)
+    if delay_ms > 0 then
+        redis.call('SET', KEYS[2], failures, 'PX', delay_ms)
+    end
+end
+return failures
+"""
+
+
+class LoginThrottle:
+    """
+    Ограничение подбора паролей по логину и по IP клиента.
+
+    Неудачные попытки считаются в Redis отдельно для логина и для IP.
+    Когда попыток становится больше бесплатного лимита, ключ
+    блокируется на время, которое удваивается с каждой следующей
+    неудачей. Проверка блокировки - один pipeline из двух PTTL,
+    и выполняется до похода в БД и вычисления хэша пароля.
+
+    Счётчик и блокировка одного логина или IP помечены общим
+    тегом слота, поэтому скрипт работает и в Redis Cluster.
+    Пока Redis недоступен, ограничение не действует: вход
+    работает без него, а не падает.
+    """
+
+    def __init__(
+        self, redis: Redis, breaker: CircuitBreaker = redis_breaker
+    ) -> None:
+        self.redis = redis
+        self.breaker = breaker
+        self._failure = redis.register_script(FAILURE_SCRIPT)
+
+    @staticmethod
+    def _keys(kind: str, value: str) -> tuple[str, str]:
+        tag = hash_tag(f"{kind}:{value}")
+        return f"login_fail:{tag}", f"login_block:{tag}"
+
+    async def check(self, login: str, ip: str) -> None:
+        """
+        Проверяет, не заблокированы ли логин или IP.
+
+        :raise TooManyLoginAttemptsExc: Если блокировка ещё действует
+        """
+        _, login_block = self._keys("login", login)
+        _, ip_block = self._keys("ip", ip)
+        try:
+            with self.breaker.guard():
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.pttl(login_block)
+                    pipe.pttl(ip_block)
+                    wait_ms = max(await pipe.execute())
+        except Exception as ex:
+            # без Redis вход не блокируем, а пропускаем без ограничения
+            logger.warning("Login throttle is unavailable: %s", ex)
+            return
+        if wait_ms > 0:
+            logger.warning("Login throttled for %s from %s", login, ip)
+            raise TooManyLoginAttemptsExc(math.ceil(wait_ms / 1000))
+
+    async def register_failure(self, login: str, ip: str) -> None:
+        """Учитывает неудачную попытку входа"""
+        # логин и IP - разные слоты, два скрипта идут параллельно
+        try:
+            with self.breaker.guard():
+                await asyncio.gather(
+                    self._register(
+                        "login", login, settings.LOGIN_THROTTLE_FREE_ATTEMPTS
+                    ),
+                    self._register(
+                        "ip", ip, settings.LOGIN_THROTTLE_IP_FREE_ATTEMPTS
+                    ),
+                )
+        except Exception as ex:
+            logger.warning("Can't register failed login: %s", ex)
+
+    async def _register(self, kind: str, value: str, free: int) -> None:
+        await self._failure(
+            keys=list(self._keys(kind, value)),
+            args=[
+                settings.LOGIN_THROTTLE_WINDOW_S,
+                free,
+                settings.LOGIN_THROTTLE_BASE_DELAY_S,
+                settings.LOGIN_THROTTLE_MAX_DELAY_S,
+            ],
+        )
+
+    async def reset(self, login: str) -> None:
+        """Сбрасывает счётчик логина после успешного входа"""
+        try:
+            with self.breaker.guard():
+                await self.redis.delete(*self._keys("login", login))
+        except Exception as ex:
+            logger.warning("Can't reset login throttle: %s", ex)
+
+
+login_throttle: Optional[LoginThrottle] = None
+
+
+async def get_login_throttle() -> LoginThrottle:
+    return login_throttle
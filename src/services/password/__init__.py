@@ -0,0 +1,21 @@
+from typing import Optional, Protocol
+
+
+class AbstractPasswordHasher(Protocol):
+    """Абстрактный класс для хэширования и проверки паролей"""
+
+    async def hash(self, password: str) -> str:
+        ...
+
+    async def verify(self, password_hash: str, password: str) -> bool:
+        ...
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        ...
+
+
+password_hasher: Optional[AbstractPasswordHasher] = None
+
+
+async def get_password_hasher() -> AbstractPasswordHasher:
+    return password_hasher
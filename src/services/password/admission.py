@@ -0,0 +1,101 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from exceptions.errors import ServiceOverloadedExc
+from services.metrics import registry
+
+HASH_QUEUED = registry.gauge(
+    "password_hash_queue_depth",
+    "Password hashing jobs waiting for admission",
+)
+HASH_IN_FLIGHT = registry.gauge(
+    "password_hash_in_flight",
+    "Password hashing jobs admitted and running in the pool",
+)
+HASH_REJECTED = registry.counter(
+    "password_hash_rejected_total",
+    "Password hashing jobs rejected by admission control",
+    labels=("reason",),
+)
+
+
+class AdmissionGate:
+    """
+    Контроль допуска задач хэширования в пул процессов.
+
+    Одновременно выполняется не больше max_concurrency задач,
+    остальные ждут в очереди длиной не больше max_queue. Задача,
+    которая не успела начать выполнение до своего дедлайна,
+    снимается с очереди. В обоих случаях поднимается
+    ServiceOverloadedExc с оценкой, через сколько стоит повторить запрос.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queued = 0
+        self._in_flight = 0
+        # скользящее среднее времени выполнения задачи
+        self._service_time = 0.0
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def retry_after(self) -> int:
+        """Оценка времени (в секундах), за которое очередь рассосётся"""
+        backlog = (self._queued + 1) * self._service_time
+        return max(1, math.ceil(backlog / self.max_concurrency))
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """
+        Допускает задачу к выполнению.
+
+        :raise ServiceOverloadedExc: Если очередь переполнена
+            или дедлайн истёк до начала выполнения
+        """
+        if (
+            self.max_queue is not None
+            and self._queued + self._in_flight
+            >= self.max_concurrency + self.max_queue
+        ):
+            HASH_REJECTED.inc(reason="queue_full")
+            raise ServiceOverloadedExc(self.retry_after())
+
+        self._queued += 1
+        HASH_QUEUED.inc()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            HASH_REJECTED.inc(reason="deadline")
+            raise ServiceOverloadedExc(self.retry_after()) from None
+        finally:
+            self._queued -= 1
+            HASH_QUEUED.dec()
+
+        self._in_flight += 1
+        HASH_IN_FLIGHT.inc()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+            self._in_flight -= 1
+            HASH_IN_FLIGHT.dec()
+            self._semaphore.release()
@@ -0,0 +1,258 @@
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Type
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+try:
+    import argon2
+except ImportError:  # pragma: no cover - argon2-cffi не установлен
+    argon2 = None
+
+CALIBRATION_PASSWORD = "calibration-password"
+
+
+class PasswordAlgorithm(ABC):
+    """
+    Алгоритм хэширования паролей с настраиваемой стоимостью.
+
+    Экземпляры передаются в процессы пула, поэтому хранят
+    только простые атрибуты и должны оставаться picklable.
+
+    Атрибуты:
+        name (str): Имя алгоритма в реестре.
+        default_cost (int): Стоимость по умолчанию.
+        min_cost (int): Нижняя граница при калибровке.
+        max_cost (int): Верхняя граница при калибровке.
+    """
+
+    name: str = ""
+    default_cost: int = 0
+    min_cost: int = 1
+    max_cost: int = 0
+
+    def __init__(self, cost: Optional[int] = None) -> None:
+        self.cost = cost or self.default_cost
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(cost={self.cost})"
+
+    def with_cost(self, cost: int) -> "PasswordAlgorithm":
+        return type(self)(cost)
+
+    @abstractmethod
+    def hash(self, password: str) -> str:
+        pass
+
+    @abstractmethod
+    def verify(self, password_hash: str, password: str) -> bool:
+        pass
+
+    @abstractmethod
+    def identify(self, password_hash: str) -> bool:
+        """Проверяет, создан ли хэш этим алгоритмом"""
+        pass
+
+    @abstractmethod
+    def cost_of(self, password_hash: str) -> int:
+        """Возвращает стоимость, с которой был создан хэш"""
+        pass
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """
+        Хэш нужно пересчитать, если он создан другим алгоритмом
+        или с меньшей стоимостью, чем текущая.
+        """
+        if not self.identify(password_hash):
+            return True
+        return self.cost_of(password_hash) < self.cost
+
+    def scale_cost(self, cost: int, elapsed: float, budget: float) -> int:
+        """
+        Подбирает стоимость под бюджет времени по одному замеру.
+        По умолчанию время считается линейным от стоимости.
+        """
+        return _round_cost(int(cost * budget / elapsed))
+
+    def calibrate(self, budget: float) -> int:
+        """
+        Подбирает стоимость, при которой одно вычисление хэша
+        занимает около budget секунд на текущем железе.
+        """
+        cost = self.min_cost
+        while True:
+            started = time.perf_counter()
+            self.with_cost(cost).hash(CALIBRATION_PASSWORD)
+            elapsed = time.perf_counter() - started
+            # слишком короткие замеры шумные: наращиваем стоимость,
+            # пока вычисление не займёт заметную долю бюджета
+            if elapsed >= budget / 4 or cost >= self.max_cost:
+                break
+            cost *= 2
+
+        scaled = self.scale_cost(cost, elapsed, budget)
+        return max(self.min_cost, min(scaled, self.max_cost))
+
+
+class _WerkzeugAlgorithm(PasswordAlgorithm):
+    """Алгоритмы, которые умеет считать werkzeug.security"""
+
+    @abstractmethod
+    def method(self) -> str:
+        pass
+
+    def hash(self, password: str) -> str:
+        return generate_password_hash(password, method=self.method())
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        return check_password_hash(password_hash, password)
+
+    def identify(self, password_hash: str) -> bool:
+        return password_hash.startswith(f"{self.name}:")
+
+    def _method_args(self, password_hash: str) -> list[str]:
+        return password_hash.split("$", 1)[0].split(":")[1:]
+
+
+class PBKDF2Algorithm(_WerkzeugAlgorithm):
+    """PBKDF2-HMAC-SHA256, стоимость - число итераций"""
+
+    name = "pbkdf2"
+    default_cost = 1_000_000
+    min_cost = 10_000
+    max_cost = 10_000_000
+
+    def method(self) -> str:
+        return f"pbkdf2:sha256:{self.cost}"
+
+    def cost_of(self, password_hash: str) -> int:
+        args = self._method_args(password_hash)
+        if len(args) < 2 or args[0] != "sha256":
+            return 0
+        return int(args[1])
+
+
+class ScryptAlgorithm(_WerkzeugAlgorithm):
+    """
+    scrypt с r=8, p=1, стоимость - параметр N.
+    N - степень двойки, память на хэш равна 128 * N * r байт.
+    """
+
+    name = "scrypt"
+    default_cost = 2**15
+    min_cost = 2**10
+    max_cost = 2**17
+
+    def method(self) -> str:
+        return f"scrypt:{self.cost}:8:1"
+
+    def cost_of(self, password_hash: str) -> int:
+        args = self._method_args(password_hash)
+        if not args:
+            return self.default_cost
+        return int(args[0])
+
+    def scale_cost(self, cost: int, elapsed: float, budget: float) -> int:
+        while cost * 2 <= self.max_cost and elapsed * 2 <= budget:
+            cost *= 2
+            elapsed *= 2
+        while cost > self.min_cost and elapsed > budget:
+            cost //= 2
+            elapsed /= 2
+        return cost
+
+
+class Argon2Algorithm(PasswordAlgorithm):
+    """
+    Argon2id из argon2-cffi, стоимость - time_cost.
+    Память и параллелизм берутся по умолчанию из argon2-cffi.
+    """
+
+    name = "argon2"
+    default_cost = 3
+    min_cost = 1
+    max_cost = 64
+
+    def _hasher(self):
+        return argon2.PasswordHasher(time_cost=self.cost)
+
+    def hash(self, password: str) -> str:
+        return self._hasher().hash(password)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        try:
+            return self._hasher().verify(password_hash, password)
+        except argon2.exceptions.Argon2Error:
+            return False
+
+    def identify(self, password_hash: str) -> bool:
+        return password_hash.startswith("$argon2")
+
+    def cost_of(self, password_hash: str) -> int:
+        return argon2.extract_parameters(password_hash).time_cost
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        if not self.identify(password_hash):
+            return True
+        params = argon2.extract_parameters(password_hash)
+        return (
+            params.time_cost < self.cost
+            or params.memory_cost < argon2.DEFAULT_MEMORY_COST
+        )
+
+    def scale_cost(self, cost: int, elapsed: float, budget: float) -> int:
+        return int(cost * budget / elapsed)
+
+
+ALGORITHMS: Dict[str, Type[PasswordAlgorithm]] = {
+    PBKDF2Algorithm.name: PBKDF2Algorithm,
+    ScryptAlgorithm.name: ScryptAlgorithm,
+}
+if argon2 is not None:
+    ALGORITHMS[Argon2Algorithm.name] = Argon2Algorithm
+
+
+def get_algorithm(name: str, cost: Optional[int] = None) -> PasswordAlgorithm:
+    """
+    Возвращает алгоритм из реестра по имени.
+
+    :raise ValueError: Если алгоритм неизвестен или его
+        зависимость не установлена
+    """
+    try:
+        return ALGORITHMS[name](cost)
+    except KeyError:
+        raise ValueError(
+            f"Unknown password hash algorithm '{name}', "
+            f"available: {', '.join(ALGORITHMS)}"
+        ) from None
+
+
+def identify_algorithm(password_hash: str) -> Optional[PasswordAlgorithm]:
+    """Находит алгоритм, которым был создан хэш"""
+    for algorithm_class in ALGORITHMS.values():
+        algorithm = algorithm_class()
+        if algorithm.identify(password_hash):
+            return algorithm
+    return None
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    """Проверяет пароль алгоритмом, которым был создан хэш"""
+    if not password_hash:
+        return False
+    algorithm = identify_algorithm(password_hash)
+    if algorithm is None:
+        return False
+    return algorithm.verify(password_hash, password)
+
+
+def _round_cost(cost: int) -> int:
+    """
+    Округляет стоимость до двух значащих цифр, чтобы воркеры,
+    откалиброванные с небольшим разбросом, получали одинаковое значение.
+    """
+    if cost < 100:
+        return max(cost, 1)
+    magnitude = 10 ** (len(str(cost)) - 2)
+    return cost // magnitude * magnitude
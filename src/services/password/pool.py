@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+from services.metrics import registry
+from services.password import AbstractPasswordHasher
+from services.password.admission import AdmissionGate
+from services.password.algorithms import (
+    PasswordAlgorithm,
+    ScryptAlgorithm,
+    verify_password,
+)
+
+logger = logging.getLogger(__name__)
+
+HASH_WAIT_SECONDS = registry.histogram(
+    "password_hash_wait_seconds",
+    "Time a password hashing job spent waiting for admission and a worker",
+    labels=("op",),
+)
+HASH_COMPUTE_SECONDS = registry.histogram(
+    "password_hash_compute_seconds",
+    "Time a pool worker spent computing a password hash",
+    labels=("op",),
+)
+
+
+def _timed_call(func: Callable, *args: Any) -> Tuple[Any, float, float]:
+    """
+    Выполняется в процессе пула: вызывает функцию и возвращает
+    результат вместе с моментами начала и конца вычисления.
+    """
+    started = time.time()
+    result = func(*args)
+    return result, started, time.time()
+
+
+def _warm_up(algorithm: PasswordAlgorithm) -> None:
+    """
+    Прогревает процесс пула: импортирует модули хэширования
+    и выполняет одно дешёвое вычисление.
+    """
+    algorithm.with_cost(algorithm.min_cost).hash("warm-up")
+
+
+def _hash(algorithm: PasswordAlgorithm, password: str) -> str:
+    return algorithm.hash(password)
+
+
+def _calibrate(algorithm: PasswordAlgorithm, budget: float) -> int:
+    return algorithm.calibrate(budget)
+
+
+class ProcessPoolPasswordHasher(AbstractPasswordHasher):
+    """
+    Хэширование паролей в пуле процессов.
+
+    KDF нагружает CPU, поэтому вычисление выносится из event loop
+    в ограниченный ProcessPoolExecutor: остальные запросы воркера
+    продолжают обслуживаться, пока считается хэш.
+
+    Новые хэши считаются алгоритмом algorithm. Если задан
+    time_budget (в секундах), при старте стоимость алгоритма
+    калибруется в процессе пула так, чтобы один хэш укладывался
+    в бюджет. Проверка работает для хэшей любого алгоритма из реестра.
+
+    Перед пулом стоит AdmissionGate: в пул попадает не больше задач,
+    чем в нём процессов, очередь ограничена max_queue, а задача,
+    прождавшая дольше queue_timeout секунд, отклоняется с 503.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        mp_context: str = "spawn",
+        algorithm: Optional[PasswordAlgorithm] = None,
+        time_budget: Optional[float] = None,
+        max_queue: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+    ) -> None:
+        self.max_workers = max_workers
+        self.mp_context = mp_context
+        self.algorithm = algorithm or ScryptAlgorithm()
+        self.time_budget = time_budget
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._gate = AdmissionGate(max_workers, max_queue, queue_timeout)
+
+    async def start(self) -> None:
+        """
+        Создаёт пул и заранее поднимает все его процессы,
+        чтобы первый логин не ждал старта интерпретатора.
+        """
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(self.mp_context),
+        )
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(self._executor, _warm_up, self.algorithm)
+                for _ in range(self.max_workers)
+            )
+        )
+        if self.time_budget:
+            cost = await loop.run_in_executor(
+                self._executor, _calibrate, self.algorithm, self.time_budget
+            )
+            self.algorithm = self.algorithm.with_cost(cost)
+        logger.info(
+            "Password hasher pool started with %s workers, algorithm %r",
+            self.max_workers,
+            self.algorithm,
+        )
+
+    async def close(self) -> None:
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    async def __aenter__(self) -> "ProcessPoolPasswordHasher":
+        await self.start()
+        return self
+
+    async def __aexit__(self, type, value, traceback) -> None:
+        await self.close()
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", _hash, self.algorithm, password)
+
+    async def verify(self, password_hash: str, password: str) -> bool:
+        return await self._run(
+            "verify", verify_password, password_hash, password
+        )
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return self.algorithm.needs_rehash(password_hash)
+
+    async def _run(self, op: str, func: Callable, *args: Any) -> Any:
+        if self._executor is None:
+            raise RuntimeError("Password hasher pool is not started")
+
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        async with self._gate.admit():
+            result, started, finished = await loop.run_in_executor(
+                self._executor, _timed_call, func, *args
+            )
+
+        HASH_WAIT_SECONDS.observe(max(started - submitted, 0.0), op=op)
+        HASH_COMPUTE_SECONDS.observe(finished - started, op=op)
+        return result
@@ -0,0 +1,456 @@
+import asyncio
+import logging
+import math
+import time
+from contextlib import suppress
+from functools import partial
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from uuid import UUID
+
+from redis.asyncio import Redis
+
+from core.config import settings
+from db.breaker import CircuitBreaker, redis_breaker
+from db.casher.metrics import record_lookup, track
+from db.redis import hash_tag
+from models.jwt import AccessJWT
+from services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+REVOCATIONS_APPLIED = registry.counter(
+    "token_revocations_applied_total",
+    "Revocations applied to the in-process replica",
+    labels=("source",),
+)
+REVOCATIONS_SIZE = registry.gauge(
+    "token_revocations_replica_size",
+    "Revoked access tokens held by the in-process replica",
+)
+
+
+class RevocationSet:
+    """
+    Множество отозванных токенов с истечением по колесу времени.
+
+    Запись живёт до exp токена: после него токен и так не пройдёт
+    проверку подписи. Записи раскладываются по слотам колеса
+    по секунде истечения, и advance() за один проход вычищает
+    слоты, время которых прошло, не перебирая всё множество.
+    Проверка - поиск в dict.
+    """
+
+    def __init__(
+        self,
+        slots: int = 1024,
+        resolution: float = 1.0,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.resolution = resolution
+        self.clock = clock
+        self._expires: Dict[UUID, float] = {}
+        self._slots: List[Set[UUID]] = [set() for _ in range(slots)]
+        self._tick = self._tick_of(clock())
+
+    def _tick_of(self, moment: float) -> int:
+        return int(moment // self.resolution)
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def __contains__(self, jti: UUID) -> bool:
+        exp = self._expires.get(jti)
+        return exp is not None and exp > self.clock()
+
+    def add(self, jti: UUID, exp: float) -> None:
+        if exp <= self.clock():
+            return
+        self._expires[jti] = exp
+        self._slots[self._tick_of(exp) % len(self._slots)].add(jti)
+
+    def advance(self) -> List[UUID]:
+        """Удаляет записи, срок которых истёк, и возвращает их"""
+        now = self.clock()
+        tick = self._tick_of(now)
+        removed = []
+        # тики до текущего целиком в прошлом; дальше одного оборота
+        # колеса идти незачем - слоты повторяются
+        start = max(self._tick, tick - len(self._slots))
+        for passed in range(start, tick):
+            slot = self._slots[passed % len(self._slots)]
+            # в слоте могут лежать записи с exp дальше одного оборота
+            # и следы записей, перенесённых в другой слот
+            expired = [key for key in slot if self._expires.get(key, 0) <= now]
+            for key in expired:
+                slot.discard(key)
+                if self._expires.pop(key, None) is not None:
+                    removed.append(key)
+        self._tick = tick
+        return removed
+
+
+class UserEpochs:
+    """
+    Эпохи отзыва по пользователям.
+
+    Access токены пользователя, выпущенные раньше его эпохи,
+    недействительны - так одним значением отзываются все токены
+    пользователя. Эпоха - epoch секунды с точностью до миллисекунды,
+    как iat токенов. Эпоха хранится ttl (время жизни access токена):
+    дольше её держит только RevocationStore, для refresh токенов.
+    """
+
+    def __init__(
+        self, ttl: float, clock: Callable[[], float] = time.time
+    ) -> None:
+        self.ttl = ttl
+        self._epochs: Dict[UUID, float] = {}
+        self._expiry = RevocationSet(clock=clock)
+
+    def __len__(self) -> int:
+        return len(self._epochs)
+
+    def get(self, user_id: UUID) -> float:
+        return self._epochs.get(user_id, 0)
+
+    def set(self, user_id: UUID, epoch: float) -> None:
+        if epoch > self._epochs.get(user_id, 0):
+            self._epochs[user_id] = epoch
+            self._expiry.add(user_id, epoch + self.ttl)
+
+    def advance(self) -> None:
+        for user_id in self._expiry.advance():
+            self._epochs.pop(user_id, None)
+
+
+class RevocationStore:
+    """
+    Отозванные access токены и эпохи отзыва пользователей в Redis.
+
+    Ключ отзыва - короткий префикс и 16 байт jti, значение - целое 1
+    (Redis хранит его разделяемым объектом, без отдельной аллокации),
+    срок - EXAT равный exp токена, так что запись живёт ровно столько,
+    сколько токен мог бы пройти проверку подписи. Проверка - EXISTS,
+    без чтения и десериализации значения.
+
+    Ключи токенов и эпоха пользователя помечены тегом слота
+    из первых 4 байт user_id: в Redis Cluster проверка токена
+    (EXISTS отзыва и GET эпохи) идёт в один слот, а pipeline
+    пачки токенов - по одному запросу на узел.
+
+    Память на один отзыв в Redis 7 (jemalloc): запись в словаре
+    ключей 24 Б, sds ключа из 29 символов 40 Б, запись в словаре
+    сроков 24 Б и ячейки двух хэш-таблиц ~16 Б - около 105 Б.
+    Прежний формат (blacklist:{jti} с pickle user_id и полным TTL)
+    занимал около 200 Б и жил дольше токена. Проверить на живом
+    Redis: MEMORY USAGE для ключа отзыва.
+
+    Эпоха пользователя хранится так же компактно: префикс, тег
+    и 16 байт user_id, значение - epoch секунды с точностью
+    до миллисекунды, срок - epoch_ttl после эпохи (время жизни
+    refresh токена: по эпохе проверяются и они).
+
+    Пока legacy включён, проверка читает и прежние ключи
+    blacklist:{jti} - отзывы, записанные до перехода на этот формат.
+    """
+
+    PREFIX = b"rv:"
+    EPOCH_PREFIX = b"ue:"
+    # ключи отзыва до перехода на PREFIX
+    LEGACY_PREFIX = "blacklist:"
+    # пространство имён в метриках кэша
+    NAMESPACE = "blacklist"
+
+    def __init__(
+        self,
+        redis: Redis,
+        epoch_ttl: float,
+        breaker: CircuitBreaker = redis_breaker,
+        legacy: bool = settings.REVOCATION_LEGACY_KEYS,
+    ) -> None:
+        self.redis = redis
+        self.epoch_ttl = epoch_ttl
+        self.breaker = breaker
+        self.legacy = legacy
+
+    @staticmethod
+    def _tag(user_id: UUID) -> bytes:
+        return hash_tag(user_id.hex[:8]).encode()
+
+    def key(self, user_id: UUID, jti: UUID) -> bytes:
+        return self.PREFIX + self._tag(user_id) + jti.bytes
+
+    def epoch_key(self, user_id: UUID) -> bytes:
+        return self.EPOCH_PREFIX + self._tag(user_id) + user_id.bytes
+
+    def queue_revoke(
+        self, pipe, jti: UUID, exp: float, *, user_id: UUID
+    ) -> None:
+        """Добавляет запись об отзыве в pipeline"""
+        pipe.set(self.key(user_id, jti), 1, exat=math.ceil(exp))
+
+    def queue_user_epoch(self, pipe, user_id: UUID, epoch: float) -> None:
+        """Добавляет эпоху отзыва пользователя в pipeline"""
+        pipe.set(
+            self.epoch_key(user_id),
+            epoch,
+            exat=math.ceil(epoch + self.epoch_ttl),
+        )
+
+    async def user_epoch(self, user_id: UUID) -> float:
+        """Эпоха отзыва пользователя, 0 - если её нет"""
+        with track(self.NAMESPACE, "get"), self.breaker.guard():
+            epoch = await self.redis.get(self.epoch_key(user_id))
+        record_lookup(self.NAMESPACE, "hit" if epoch else "miss")
+        return float(epoch or 0)
+
+    async def revoked_many(self, claims: Iterable[AccessJWT]) -> List[bool]:
+        """
+        Проверяет несколько токенов - и отзыв по jti, и эпоху
+        пользователя - за один запрос к Redis
+        """
+        claims = list(claims)
+        step = 3 if self.legacy else 2
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for token in claims:
+                pipe.exists(self.key(token.user_id, token.jti))
+                pipe.get(self.epoch_key(token.user_id))
+                if self.legacy:
+                    pipe.exists(self.LEGACY_PREFIX + str(token.jti))
+            with track(self.NAMESPACE, "mget"), self.breaker.guard():
+                replies = await pipe.execute()
+
+        # ответы по step на токен: отзыв, эпоха и, если legacy,
+        # отзыв в прежнем формате
+        rows = zip(*[iter(replies)] * step)
+        revoked = [
+            bool(found) or token.iat < float(epoch or 0) or any(legacy)
+            for token, (found, epoch, *legacy) in zip(claims, rows)
+        ]
+        for is_revoked in revoked:
+            record_lookup(self.NAMESPACE, "hit" if is_revoked else "miss")
+        return revoked
+
+
+class RevocationReplica:
+    """
+    Реплика отозванных access токенов в памяти воркера.
+
+    Отзыв токена или эпоха пользователя записывается в
+    RevocationStore и в Redis stream (для догоняющего чтения)
+    и публикуется в канал pub/sub одним pipeline. Воркер при старте
+    подписывается на канал и вычитывает stream, а дальше получает
+    отзывы из канала. После обрыва соединения воркер переподписывается
+    и дочитывает stream с последней известной позиции; пока реплика
+    не синхронизирована, ready=False и проверка идёт в Redis.
+    Stream обрезается по MINID до времени жизни access токена.
+
+    Пока legacy включён, при первой синхронизации в реплику
+    переносятся и отзывы прежнего формата blacklist:{jti}:
+    готовая реплика в Redis больше не ходит, а новых ключей
+    в этом формате никто не пишет.
+    """
+
+    STREAM = "token_revocations"
+    CHANNEL = "token_revocations"
+    # виды записей: отзыв токена по jti и эпоха пользователя
+    TOKEN = "t"
+    USER = "u"
+
+    def __init__(
+        self,
+        redis: Redis,
+        retention: float,
+        revoked: Optional[RevocationSet] = None,
+        retry_delay: float = 1.0,
+        epoch_ttl: Optional[float] = None,
+    ) -> None:
+        self.redis = redis
+        self.store = RevocationStore(redis, epoch_ttl=epoch_ttl or retention)
+        self.retention = retention
+        self.revoked = revoked or RevocationSet()
+        self.epochs = UserEpochs(ttl=retention)
+        self.retry_delay = retry_delay
+        self.ready = False
+        self._last_id = "-"
+        self._legacy_loaded = not self.store.legacy
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __contains__(self, jti: UUID) -> bool:
+        return jti in self.revoked
+
+    def apply(self, kind: str, key: UUID, value: float, source: str) -> None:
+        if kind == self.USER:
+            self.epochs.set(key, value)
+        else:
+            self.revoked.add(key, value)
+        REVOCATIONS_APPLIED.inc(source=source)
+        REVOCATIONS_SIZE.set(len(self.revoked))
+
+    async def publish(self, jti: UUID, exp: float, user_id: UUID) -> bool:
+        """
+        Отзывает токен: локально, в Redis и у остальных воркеров.
+        False - отзыв не записан в Redis и действует только
+        в этом воркере.
+        """
+        return await self._publish(
+            self.TOKEN,
+            jti,
+            exp,
+            partial(self.store.queue_revoke, user_id=user_id),
+        )
+
+    async def publish_user_epoch(
+        self, user_id: UUID, epoch: Optional[float] = None
+    ) -> bool:
+        """
+        Отзывает все токены пользователя, выпущенные раньше epoch
+        (по умолчанию - текущего момента с точностью до миллисекунды).
+        False - как у publish.
+        """
+        if epoch is None:
+            epoch = math.floor(time.time() * 1000) / 1000
+        return await self._publish(
+            self.USER, user_id, epoch, self.store.queue_user_epoch
+        )
+
+    async def _publish(
+        self, kind: str, key: UUID, value: float, queue_store
+    ) -> bool:
+        self.apply(kind, key, value, source="local")
+        min_id = int((time.time() - self.retention) * 1000)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                queue_store(pipe, key, value)
+                pipe.xadd(
+                    self.STREAM,
+                    {"kind": kind, "key": str(key), "value": value},
+                    minid=min_id,
+                    approximate=True,
+                )
+                pipe.publish(self.CHANNEL, f"{kind} {key} {value}")
+                with track(
+                    self.store.NAMESPACE, "set"
+                ), self.store.breaker.guard():
+                    await pipe.execute()
+        except Exception as ex:
+            logger.error("Can't publish revocation %s: %s", key, ex)
+            return False
+        return True
+
+    async def start(self) -> None:
+        try:
+            await self._sync()
+        except Exception as ex:
+            logger.error("Can't sync token revocations: %s", ex)
+        self._task = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+
+    async def _sync(self) -> None:
+        """Подписка на канал и догоняющее чтение stream"""
+        self.ready = False
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        self._pubsub = self.redis.pubsub()
+        # подписываемся до чтения stream: отзыв, пришедший
+        # между ними, придёт дважды, но не потеряется
+        await self._pubsub.subscribe(self.CHANNEL)
+        await self._catch_up()
+        if not self._legacy_loaded:
+            await self._load_legacy()
+            self._legacy_loaded = True
+        self.ready = True
+        logger.info("Token revocations synced, %s revoked", len(self.revoked))
+
+    async def _catch_up(self, batch: int = 1000) -> None:
+        start = self._last_id
+        while True:
+            if start != "-":
+                start = f"({start}"
+            entries = await self.redis.xrange(
+                self.STREAM, min=start, count=batch
+            )
+            for entry_id, fields in entries:
+                self.apply(
+                    fields[b"kind"].decode(),
+                    UUID(fields[b"key"].decode()),
+                    float(fields[b"value"]),
+                    source="stream",
+                )
+                self._last_id = entry_id.decode()
+            if len(entries) < batch:
+                return
+            start = self._last_id
+
+    async def _load_legacy(self, batch: int = 1000) -> None:
+        """
+        Переносит в реплику отзывы прежнего формата. Срок записи -
+        остаток TTL ключа, но не дольше времени жизни access токена:
+        к тому времени отозванный токен истечёт и так.
+        """
+        prefix = self.store.LEGACY_PREFIX
+        names = [
+            name
+            async for name in self.redis.scan_iter(
+                match=prefix + "*", count=batch
+            )
+        ]
+        for start in range(0, len(names), batch):
+            end = start + batch
+            chunk = names[start:end]
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for name in chunk:
+                    pipe.pttl(name)
+                ttls = await pipe.execute()
+
+            now = time.time()
+            for name, ttl in zip(chunk, ttls):
+                # -2 - ключ уже истёк, -1 - ключ без срока
+                if ttl == -2:
+                    continue
+                try:
+                    jti = UUID(name.decode().removeprefix(prefix))
+                except ValueError:
+                    continue
+                lifetime = self.retention
+                if ttl >= 0:
+                    lifetime = min(ttl / 1000, lifetime)
+                self.apply(self.TOKEN, jti, now + lifetime, source="legacy")
+
+        logger.info("Legacy token revocations loaded: %s", len(names))
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                if not self.ready:
+                    await self._sync()
+                message = await self._pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+                if message is not None:
+                    kind, key, value = message["data"].decode().split()
+                    self.apply(kind, UUID(key), float(value), "pubsub")
+                self.revoked.advance()
+                self.epochs.advance()
+                REVOCATIONS_SIZE.set(len(self.revoked))
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:
+                self.ready = False
+                logger.error("Token revocations sync failed: %s", ex)
+                await asyncio.sleep(self.retry_delay)
+
+
+revocations: Optional[RevocationReplica] = None
+
+
+async def get_revocations() -> RevocationReplica:
+    return revocations
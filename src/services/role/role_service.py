@@ -4,17 +4,25 @@ from uuid import UUID
 from fastapi.params import Depends
 
 from schemas.role import RoleCreate, RoleFull, RoleUpdate
+from services.revocation import RevocationReplica, get_revocations
 from services.role import IRoleRepository
 from services.role.role_repository import get_repository
 
 
 class RoleService:
     """
-    Сервис для управления ролями пользователей
+    Сервис для управления ролями пользователей.
+
+    Роль записана в access токенах, поэтому при её смене все access
+    токены пользователя отзываются эпохой - новые с актуальной
+    ролью выдаются при обмене refresh токена.
     """
 
-    def __init__(self, repository: IRoleRepository):
+    def __init__(
+        self, repository: IRoleRepository, revocations: RevocationReplica
+    ):
         self.repository = repository
+        self.revocations = revocations
 
     async def create(self, to_create: RoleCreate) -> RoleFull:
         """
@@ -73,6 +81,7 @@ class RoleService:
         """
 
         await self.repository.assign(role_id, user_id)
+        await self.revocations.publish_user_epoch(user_id)
 
     async def revoke(self, user_id: UUID) -> None:
         """
@@ -82,6 +91,7 @@ class RoleService:
         """
 
         await self.repository.revoke(user_id)
+        await self.revocations.publish_user_epoch(user_id)
 
     async def list_roles(
         self, name_filter: str | None = None
@@ -99,8 +109,9 @@ class RoleService:
 
 def get_role_service(
     repository: IRoleRepository = Depends(get_repository),
+    revocations: RevocationReplica = Depends(get_revocations),
 ) -> RoleService:
     """
     Функция для создания экземпляра класса RoleService
     """
-    return RoleService(repository=repository)
+    return RoleService(repository=repository, revocations=revocations)
@@ -0,0 +1,352 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import jwt
+import orjson
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+from redis.asyncio import Redis
+
+from db.redis import is_cluster
+
+logger = logging.getLogger(__name__)
+
+# обязательные поля JWK для вычисления thumbprint (RFC 7638)
+_THUMBPRINT_MEMBERS = {
+    "oct": ("k", "kty"),
+    "RSA": ("e", "kty", "n"),
+    "EC": ("crv", "kty", "x", "y"),
+    "OKP": ("crv", "kty", "x"),
+}
+
+
+def jwk_thumbprint(jwk: Dict[str, Any]) -> str:
+    """Thumbprint JWK по RFC 7638, используется как kid"""
+    members = {name: jwk[name] for name in _THUMBPRINT_MEMBERS[jwk["kty"]]}
+    canonical = json.dumps(members, separators=(",", ":"), sort_keys=True)
+    digest = hashlib.sha256(canonical.encode()).digest()
+    return _b64(digest).decode()
+
+
+def _b64(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def generate_private_key(algorithm: str) -> bytes:
+    """
+    Генерирует новый ключ для алгоритма: секрет для HS*,
+    приватный ключ в PEM для асимметричных алгоритмов.
+    """
+    if algorithm.startswith("HS"):
+        return secrets.token_urlsafe(64).encode()
+
+    if algorithm == "EdDSA":
+        key = ed25519.Ed25519PrivateKey.generate()
+    elif algorithm[:2] in ("RS", "PS"):
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm in ("ES256", "ES384", "ES512"):
+        curve = {
+            "ES256": ec.SECP256R1,
+            "ES384": ec.SECP384R1,
+            "ES512": ec.SECP521R1,
+        }[algorithm]
+        key = ec.generate_private_key(curve())
+    else:
+        raise ValueError(f"Unsupported signing algorithm: {algorithm}")
+
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+class SigningKey:
+    """
+    Ключ подписи JWT токенов.
+
+    Для HS* это общий секрет, для асимметричных алгоритмов
+    (RS256, ES256, EdDSA и т.д.) - приватный ключ в PEM. Ключи
+    разбираются один раз при создании, а не на каждый токен.
+    Публичная часть асимметричного ключа отдаётся в JWKS, чтобы
+    другие сервисы проверяли токены локально, без запроса к auth.
+
+    Закодированный заголовок токена постоянен для ключа и собирается
+    один раз, для HS* заранее готовится и состояние HMAC с ключом.
+    """
+
+    def __init__(
+        self,
+        algorithm: str,
+        private_key: str | bytes,
+        kid: Optional[str] = None,
+    ) -> None:
+        self.algorithm = algorithm
+        self._algorithm = jwt.get_algorithm_by_name(algorithm)
+        self.symmetric = algorithm.startswith("HS")
+
+        self.signing_key = self._algorithm.prepare_key(private_key)
+        if self.symmetric:
+            self.verifying_key = self.signing_key
+        else:
+            self.verifying_key = self.signing_key.public_key()
+        self._jwk = self._algorithm.to_jwk(self.verifying_key, as_dict=True)
+
+        self.kid = kid or jwk_thumbprint(self._jwk)
+        # тот же заголовок, что собрал бы jwt.encode: ключи отсортированы
+        header = {"alg": algorithm, "kid": self.kid, "typ": "JWT"}
+        self._header_segment = _b64(
+            json.dumps(header, separators=(",", ":")).encode()
+        )
+        self._hmac = (
+            hmac.new(self.signing_key, digestmod=self._algorithm.hash_alg)
+            if self.symmetric
+            else None
+        )
+
+    def public_jwk(self) -> Optional[Dict[str, Any]]:
+        """Публичный ключ в формате JWK, для HS* - None"""
+        if self.symmetric:
+            return None
+        return {
+            **self._jwk,
+            "kid": self.kid,
+            "alg": self.algorithm,
+            "use": "sig",
+        }
+
+    def encode(self, payload: Dict[str, Any]) -> str:
+        """
+        Подписывает payload. Значения должны быть JSON-типами:
+        время - числом секунд epoch, а не datetime.
+        """
+        signing_input = (
+            self._header_segment + b"." + _b64(orjson.dumps(payload))
+        )
+        if self._hmac is not None:
+            mac = self._hmac.copy()
+            mac.update(signing_input)
+            signature = mac.digest()
+        else:
+            signature = self._algorithm.sign(signing_input, self.signing_key)
+        return (signing_input + b"." + _b64(signature)).decode()
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """
+        Проверяет подпись и срок действия токена.
+
+        :raise jwt.InvalidTokenError: Если токен не прошёл проверку
+        """
+        return jwt.decode(
+            token, self.verifying_key, algorithms=[self.algorithm]
+        )
+
+
+class KeyRing:
+    """
+    Набор ключей подписи, проиндексированный по kid.
+
+    Токены подписываются активным ключом. При проверке ключ берётся
+    из dict по kid из заголовка токена, так что старые ключи после
+    ротации продолжают принимать свои токены до их истечения.
+    Токены без kid, выпущенные до появления набора ключей,
+    проверяются ключом по умолчанию из настроек.
+    """
+
+    def __init__(
+        self,
+        active: SigningKey,
+        keys: Iterable[SigningKey] = (),
+        default: Optional[SigningKey] = None,
+        version: int = 0,
+    ) -> None:
+        self.active = active
+        self.default = default or active
+        self.version = version
+        self._keys = {key.kid: key for key in keys}
+        self._keys[self.default.kid] = self.default
+        self._keys[active.kid] = active
+
+    def __contains__(self, kid: str) -> bool:
+        return kid in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, kid: Optional[str]) -> Optional[SigningKey]:
+        if kid is None:
+            return self.default
+        return self._keys.get(kid)
+
+    def public_jwks(self) -> List[Dict[str, Any]]:
+        """Публичные ключи всех асимметричных ключей набора"""
+        return [
+            jwk
+            for key in self._keys.values()
+            if (jwk := key.public_jwk()) is not None
+        ]
+
+    def encode(self, payload: Dict[str, Any]) -> str:
+        return self.active.encode(payload)
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """
+        Проверяет токен ключом, указанным в его заголовке.
+
+        :raise jwt.InvalidTokenError: Если ключ неизвестен
+            или токен не прошёл проверку
+        """
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key {kid}")
+        return key.decode(token)
+
+
+class KeyStore:
+    """
+    Опубликованные ключи подписи в Redis.
+
+    Ключи лежат в hash (kid -> алгоритм, материал ключа и момент
+    вывода из оборота), kid активного ключа - в отдельной строке.
+    Любое изменение увеличивает счётчик версии: воркеры опрашивают
+    только его и перечитывают ключи, когда версия меняется.
+    Redis хранит приватные ключи, поэтому должен быть доступен
+    только сервисам auth.
+
+    Тег {jwt_keys} держит все три ключа в слоте ключа jwt_keys.
+    В Redis Cluster нет MULTI, и pipeline одного слота уходит
+    на один узел по порядку: версия увеличивается последней,
+    поэтому воркер не увидит новую версию раньше самих ключей.
+    """
+
+    KEYS = "jwt_keys"
+    ACTIVE = "{jwt_keys}:active"
+    VERSION = "{jwt_keys}:version"
+
+    def __init__(self, redis: Redis) -> None:
+        self.redis = redis
+        self.transaction = not is_cluster(redis)
+
+    async def version(self) -> int:
+        return int(await self.redis.get(self.VERSION) or 0)
+
+    async def load(
+        self,
+    ) -> Tuple[int, Optional[str], Dict[str, Dict[str, Any]]]:
+        """Версия, kid активного ключа и все опубликованные ключи"""
+        async with self.redis.pipeline(transaction=self.transaction) as pipe:
+            pipe.get(self.VERSION)
+            pipe.get(self.ACTIVE)
+            pipe.hgetall(self.KEYS)
+            version, active, entries = await pipe.execute()
+
+        return (
+            int(version or 0),
+            active.decode() if active else None,
+            {
+                kid.decode(): json.loads(entry)
+                for kid, entry in entries.items()
+            },
+        )
+
+    async def publish(
+        self, key: SigningKey, private_key: bytes, retire_after: float
+    ) -> None:
+        """
+        Публикует новый активный ключ.
+
+        Прежний активный ключ остаётся в наборе для проверки ещё
+        retire_after секунд - на время жизни уже выданных им токенов.
+        """
+        _, active, entries = await self.load()
+        retired = {}
+        if active in entries:
+            retired[active] = json.dumps(
+                {**entries[active], "retire_at": time.time() + retire_after}
+            )
+
+        entry = {
+            "alg": key.algorithm,
+            "key": private_key.decode(),
+            "retire_at": None,
+        }
+        async with self.redis.pipeline(transaction=self.transaction) as pipe:
+            pipe.hset(self.KEYS, mapping={key.kid: json.dumps(entry)})
+            if retired:
+                pipe.hset(self.KEYS, mapping=retired)
+            pipe.set(self.ACTIVE, key.kid)
+            pipe.incr(self.VERSION)
+            await pipe.execute()
+
+    async def prune(self) -> List[str]:
+        """Удаляет ключи, срок проверки которых уже вышел"""
+        _, _, entries = await self.load()
+        now = time.time()
+        expired = [
+            kid
+            for kid, entry in entries.items()
+            if entry["retire_at"] is not None and entry["retire_at"] <= now
+        ]
+        if expired:
+            pipeline = self.redis.pipeline(transaction=self.transaction)
+            async with pipeline as pipe:
+                pipe.hdel(self.KEYS, *expired)
+                pipe.incr(self.VERSION)
+                await pipe.execute()
+        return expired
+
+    async def build_ring(self, default: SigningKey) -> KeyRing:
+        """
+        Собирает набор из опубликованных ключей. Пока ключи
+        не публиковались, подписывает ключ по умолчанию.
+        """
+        version, active_kid, entries = await self.load()
+        now = time.time()
+        keys = {
+            kid: SigningKey(entry["alg"], entry["key"].encode(), kid=kid)
+            for kid, entry in entries.items()
+            if entry["retire_at"] is None or entry["retire_at"] > now
+        }
+        return KeyRing(
+            active=keys.get(active_kid, default),
+            keys=keys.values(),
+            default=default,
+            version=version,
+        )
+
+
+async def watch_key_ring(
+    store: KeyStore, default: SigningKey, interval: float
+) -> None:
+    """
+    Фоновая задача воркера: следит за версией ключей в Redis
+    и подменяет набор ключей без перезапуска.
+    """
+    global key_ring
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if await store.version() != key_ring.version:
+                key_ring = await store.build_ring(default)
+                logger.info(
+                    "Signing keys reloaded, version %s, active kid %s",
+                    key_ring.version,
+                    key_ring.active.kid,
+                )
+        except Exception as ex:
+            logger.error("Can't reload signing keys: %s", ex)
+
+
+key_ring: Optional[KeyRing] = None
+
+
+def get_key_ring() -> KeyRing:
+    return key_ring
@@ -0,0 +1,74 @@
+import time
+from hashlib import blake2b
+from typing import Optional
+
+from core.config import settings
+from db.casher.lru import LRUCache
+from models.jwt import AccessJWT
+from services.metrics import registry
+
+CLAIMS_CACHE_LOOKUPS = registry.counter(
+    "jwt_claims_cache_lookups_total",
+    "Lookups of verified access token claims in the in-process cache",
+    labels=("result",),
+)
+
+
+class CachedClaims:
+    """
+    Проверенные claims access токена и момент последней
+    сверки токена с чёрным списком в Redis.
+    """
+
+    __slots__ = ("claims", "checked_at")
+
+    def __init__(self, claims: AccessJWT) -> None:
+        self.claims = claims
+        self.checked_at = float("-inf")
+
+
+class VerifiedTokenCache:
+    """
+    In-process кэш проверенных access токенов.
+
+    Клиент присылает один и тот же access токен много раз за время
+    его жизни, поэтому результат проверки подписи хранится до exp
+    токена в LRU под ключом - дайджестом токена. Если реплика
+    отозванных токенов не синхронизирована, сверка с чёрным списком
+    в Redis для закэшированного токена выполняется не чаще, чем
+    раз в revalidate_after секунд.
+    """
+
+    def __init__(self, maxsize: int, revalidate_after: float) -> None:
+        self.revalidate_after = revalidate_after
+        self._claims = LRUCache(maxsize)
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, key: bytes) -> Optional[CachedClaims]:
+        entry = self._claims.get(key)
+        CLAIMS_CACHE_LOOKUPS.inc(result="miss" if entry is None else "hit")
+        return entry
+
+    def put(self, key: bytes, claims: AccessJWT) -> CachedClaims:
+        entry = CachedClaims(claims)
+        self._claims.set(key, entry, ttl=claims.exp - time.time())
+        return entry
+
+    def needs_revalidation(self, entry: CachedClaims) -> bool:
+        return time.monotonic() - entry.checked_at >= self.revalidate_after
+
+    def mark_checked(self, entry: CachedClaims) -> None:
+        entry.checked_at = time.monotonic()
+
+
+token_cache = VerifiedTokenCache(
+    maxsize=settings.JWT_CLAIMS_CACHE_SIZE,
+    revalidate_after=settings.JWT_CLAIMS_CACHE_REVALIDATE_S,
+)
+
+
+def get_token_cache() -> VerifiedTokenCache:
+    return token_cache
@@ -0,0 +1,248 @@
+import logging
+from contextlib import suppress
+from typing import List, Optional
+
+import jwt
+from fastapi import Depends, HTTPException, Request, status
+from pydantic import ValidationError
+
+from exceptions.errors import UnauthorizedExc
+from models.jwt import AccessJWT, RefreshJWT
+from services import revocation, signing
+from services.token_cache import CachedClaims, token_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _cached_claims(access_token: str) -> CachedClaims:
+    """
+    Claims access токена из in-process кэша, при промахе - после
+    проверки подписи. Подпись проверяется один раз за время жизни
+    токена в воркере.
+
+    :raise UnauthorizedExc: Если токен невалиден или истёк
+    """
+    key = token_cache.key(access_token)
+    entry = token_cache.get(key)
+
+    if entry is None:
+        try:
+            claims = AccessJWT.from_payload(
+                signing.key_ring.decode(access_token)
+            )
+        except jwt.ExpiredSignatureError:
+            raise UnauthorizedExc("Token is expired")
+        except jwt.InvalidTokenError:
+            raise UnauthorizedExc("Token is invalid")
+        except ValidationError:
+            raise UnauthorizedExc("User ID not found")
+
+        entry = token_cache.put(key, claims)
+
+    return entry
+
+
+def access_claims_or_none(access_token: Optional[str]) -> Optional[AccessJWT]:
+    """
+    Claims access токена после проверки подписи, но без сверки
+    с отзывами - когда нужен лишь владелец токена, а не доступ
+    """
+    if not access_token:
+        return None
+    with suppress(UnauthorizedExc):
+        return _cached_claims(access_token).claims
+    return None
+
+
+async def verify_access_tokens(
+    access_tokens: List[str],
+) -> List[AccessJWT | UnauthorizedExc]:
+    """
+    Проверяет пачку access токенов.
+
+    Подписи и отзыв проверяются локально по реплике отозванных
+    токенов: по jti и по эпохе отзыва пользователя - токены,
+    выпущенные до неё, недействительны. Пока реплика
+    не синхронизирована с Redis, токены, которым пора свериться
+    с чёрным списком, проверяются одним запросом к Redis.
+    Для каждого токена возвращаются его claims или ошибка.
+    """
+    revoked = revocation.revocations
+    results: List[AccessJWT | UnauthorizedExc] = []
+    stale: List[tuple[int, CachedClaims]] = []
+    for position, access_token in enumerate(access_tokens):
+        try:
+            entry = _cached_claims(access_token)
+        except UnauthorizedExc as ex:
+            results.append(ex)
+            continue
+
+        if entry.claims.jti in revoked:
+            results.append(UnauthorizedExc("Token is in blacklist"))
+            continue
+        if entry.claims.iat < revoked.epochs.get(entry.claims.user_id):
+            results.append(UnauthorizedExc("Token is revoked"))
+            continue
+
+        results.append(entry.claims)
+        if not revoked.ready and token_cache.needs_revalidation(entry):
+            stale.append((position, entry))
+
+    if not stale:
+        return results
+
+    try:
+        blacklisted = await revoked.store.revoked_many(
+            entry.claims for _, entry in stale
+        )
+    except Exception as ex:
+        logger.error("Error retrieving from cache: %s", ex)
+        return results
+
+    for (position, entry), is_revoked in zip(stale, blacklisted):
+        if is_revoked:
+            # отзыв по эпохе запоминается как отзыв самого токена
+            revoked.apply(
+                revoked.TOKEN, entry.claims.jti, entry.claims.exp, "redis"
+            )
+            results[position] = UnauthorizedExc("Token is in blacklist")
+        else:
+            token_cache.mark_checked(entry)
+
+    return results
+
+
+async def verify_access_token(access_token: str) -> AccessJWT:
+    """
+    Проверяет access токен и возвращает его claims.
+
+    :raise UnauthorizedExc: Если токен невалиден, истёк или отозван
+    """
+    (result,) = await verify_access_tokens([access_token])
+    if isinstance(result, UnauthorizedExc):
+        raise result
+    return result
+
+
+def verify_refresh_token(refresh_token: str) -> RefreshJWT:
+    """
+    Проверяет refresh токен и возвращает его claims.
+
+    :raise HTTPException: Если токен невалиден или истёк
+    """
+    try:
+        return RefreshJWT.from_payload(signing.key_ring.decode(refresh_token))
+    except jwt.ExpiredSignatureError:
+        detail = "Token expired"
+    except jwt.InvalidTokenError:
+        detail = "Refresh token is invalid"
+    except ValidationError:
+        detail = "Не найден ID пользователя"
+
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED, detail=detail
+    )
+
+
+async def verify_refresh_epoch(claims: RefreshJWT) -> None:
+    """
+    Проверяет, что refresh токен выпущен не раньше эпохи отзыва
+    пользователя. Реплика держит эпохи только время жизни access
+    токена, поэтому без эпохи в реплике она читается из Redis.
+
+    :raise HTTPException: Если токен отозван
+    """
+    revoked = revocation.revocations
+    epoch = revoked.epochs.get(claims.user_id)
+    if not epoch or not revoked.ready:
+        try:
+            epoch = max(epoch, await revoked.store.user_epoch(claims.user_id))
+        except Exception as ex:
+            logger.error("Error retrieving user epoch: %s", ex)
+
+    if claims.iat < epoch:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token is revoked",
+        )
+
+
+class TokenContext:
+    """
+    Токены текущего запроса.
+
+    Создаётся один раз на запрос и хранится в request.state. Каждый
+    токен из cookies декодируется и проверяется не больше одного
+    раза за запрос, сколько бы зависимостей и сервисов его ни
+    запрашивали, а дальше все работают с типизированными claims.
+    """
+
+    def __init__(
+        self, access_token: Optional[str], refresh_token: Optional[str]
+    ) -> None:
+        self.access_token = access_token
+        self.refresh_token = refresh_token
+        self._access: Optional[AccessJWT] = None
+        self._refresh: Optional[RefreshJWT] = None
+
+    async def access(self) -> AccessJWT:
+        """
+        Claims access токена.
+
+        :raise UnauthorizedExc: Если токена нет или он не прошёл проверку
+        """
+        if self._access is None:
+            if not self.access_token:
+                raise UnauthorizedExc("Access token not found")
+            self._access = await verify_access_token(self.access_token)
+        return self._access
+
+    async def access_or_none(self) -> Optional[AccessJWT]:
+        """Claims access токена или None, если токен не прошёл проверку"""
+        with suppress(UnauthorizedExc):
+            return await self.access()
+        return None
+
+    def refresh(self) -> RefreshJWT:
+        """
+        Claims refresh токена.
+
+        :raise HTTPException: Если токена нет или он не прошёл проверку
+        """
+        if self._refresh is None:
+            if not self.refresh_token:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Refresh token not found",
+                )
+            self._refresh = verify_refresh_token(self.refresh_token)
+        return self._refresh
+
+    def refresh_or_none(self) -> Optional[RefreshJWT]:
+        """Claims refresh токена или None, если токен не прошёл проверку"""
+        with suppress(HTTPException):
+            return self.refresh()
+        return None
+
+
+def get_token_context(request: Request) -> TokenContext:
+    context = getattr(request.state, "token_context", None)
+    if context is None:
+        context = TokenContext(
+            request.cookies.get("access_token"),
+            request.cookies.get("refresh_token"),
+        )
+        request.state.token_context = context
+    return context
+
+
+async def get_access_claims(
+    context: TokenContext = Depends(get_token_context),
+) -> AccessJWT:
+    return await context.access()
+
+
+async def get_refresh_claims(
+    context: TokenContext = Depends(get_token_context),
+) -> RefreshJWT:
+    return context.refresh()
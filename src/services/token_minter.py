@@ -0,0 +1,92 @@
+import math
+import time
+from typing import Callable
+from uuid import UUID, uuid4
+
+from core.config import settings
+from models.jwt import AccessJWT, IssuedTokens, RefreshJWT
+from services.signing import SigningKey
+
+
+class TokenMinter:
+    """
+    Выпуск пар access/refresh токенов.
+
+    Claims собираются сразу в секундах epoch, без datetime: exp
+    целым числом, iat - с точностью до миллисекунды, чтобы пара,
+    выпущенная сразу после отзыва по эпохе пользователя, не попала
+    под этот отзыв. Claims подписываются подготовленным ключом,
+    а claims выпущенных токенов строятся без повторной валидации -
+    данные свои.
+    """
+
+    def __init__(
+        self,
+        access_ttl: int,
+        refresh_ttl: int,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+        self.clock = clock
+
+    def mint(
+        self, key: SigningKey, user_id: UUID | str, role: str | None
+    ) -> IssuedTokens:
+        user_id = str(user_id)
+        role = role or None
+        now = self.clock()
+        iat = math.floor(now * 1000) / 1000
+        access_jti = uuid4()
+        refresh_jti = uuid4()
+        access_exp = int(now) + self.access_ttl
+        refresh_exp = int(now) + self.refresh_ttl
+
+        access_token = key.encode(
+            {
+                "user_id": user_id,
+                "iat": iat,
+                "role": role,
+                "jti": str(access_jti),
+                "exp": access_exp,
+            }
+        )
+        refresh_token = key.encode(
+            {
+                "user_id": user_id,
+                "iat": iat,
+                "role": role,
+                "jti": str(refresh_jti),
+                "exp": refresh_exp,
+            }
+        )
+
+        user_uuid = UUID(user_id)
+        return IssuedTokens(
+            access_token,
+            refresh_token,
+            AccessJWT.model_construct(
+                jti=access_jti,
+                user_id=user_uuid,
+                iat=iat,
+                exp=access_exp,
+                role=role,
+            ),
+            RefreshJWT.model_construct(
+                jti=refresh_jti,
+                user_id=user_uuid,
+                iat=iat,
+                exp=refresh_exp,
+                role=role,
+            ),
+        )
+
+
+token_minter = TokenMinter(
+    access_ttl=settings.JWT_TOKEN_EXPIRE_TIME_M * 60,
+    refresh_ttl=settings.JWT_TOKEN_EXPIRE_TIME_M * 100 * 60,
+)
+
+
+def get_token_minter() -> TokenMinter:
+    return token_minter
@@ -4,13 +4,19 @@ from typing import Any, AsyncGenerator, Callable, Dict
 import aiohttp
 import pytest_asyncio
 from settings import test_settings
-from utils.helpers import RequestMethods, init_roles, init_users
+from utils.helpers import (
+    RequestMethods,
+    init_role_target,
+    init_roles,
+    init_users,
+)
 
 
 @pytest_asyncio.fixture(scope="session", autouse=True)
 def setup_before_tests():
     init_roles()
     init_users()
+    init_role_target()
 
 
 @pytest_asyncio.fixture(scope="session")
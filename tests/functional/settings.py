@@ -17,6 +17,8 @@ class TestSettings(BaseSettings):
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str = ""
 
+    REDIS_PORT: int = 6379
+
     ECHO: bool = False
     ECHO_POOL: bool = False
     POOL_SIZE: int = 20
@@ -34,5 +36,10 @@ class TestSettings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    @computed_field
+    @property
+    def REDIS_URL(self) -> str:
+        return f"redis://localhost:{self.REDIS_PORT}"
+
 
 test_settings = TestSettings()
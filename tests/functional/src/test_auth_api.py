@@ -1,11 +1,16 @@
 from http import HTTPStatus
 from typing import Any, Callable, Dict
 
+import aiohttp
 import pytest
 from aiohttp import ClientResponse
+from settings import test_settings
+from utils.helpers import RequestMethods
 
 pytestmark = pytest.mark.asyncio
 
+ADMIN_ROLE_ID = "20afcc37-e8dc-473a-a3ce-a61e6b3d563e"
+
 
 @pytest.mark.parametrize(
     "post_body, exp_status, exp_result",
@@ -311,3 +316,207 @@ async def test_profile_history_again(
     assert response.status == HTTPStatus.OK
     assert "results" in body
     assert len(body.get("results")) == 2
+
+
+async def test_login_throttled(
+    make_post_request: Callable[[str, str, Dict[str, Any]], ClientResponse],
+) -> None:
+    """
+    Проверка блокировки подбора пароля.
+    После исчерпания бесплатных попыток логин блокируется
+    и сервис отвечает 429 с заголовком Retry-After.
+    """
+    post_body = {"login": "brute_force_target", "password": "Qwerty123"}
+
+    for _ in range(5):
+        response = await make_post_request("/auth/login", "", post_body)
+        assert response.status == HTTPStatus.UNAUTHORIZED
+
+    # шестая неудача ставит блокировку, седьмая попытка в неё упирается
+    await make_post_request("/auth/login", "", post_body)
+    response = await make_post_request("/auth/login", "", post_body)
+    body = await response.json()
+
+    assert response.status == HTTPStatus.TOO_MANY_REQUESTS
+    assert body.get("detail") == "Too many failed login attempts"
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+async def test_verify_token_batch(
+    make_post_request: Callable[[str, str, Dict[str, Any]], ClientResponse],
+) -> None:
+    """
+    Проверка пачки токенов: результат для каждого токена
+    в порядке запроса.
+    """
+    response: ClientResponse = await make_post_request(
+        "/auth/login",
+        "",
+        {"login": "terminator1", "password": "QwertyNewPass"},
+    )
+    assert response.status == HTTPStatus.OK
+
+    # вход отдаёт токены только в cookie, в теле их возвращает refresh
+    response = await make_post_request("/auth/token/refresh", "", "")
+    assert response.status == HTTPStatus.OK
+    access_token = (await response.json()).get("access_token")
+    assert access_token
+
+    response = await make_post_request(
+        "/auth/verify_token/batch",
+        "",
+        {"access_tokens": [access_token, "not-a-token"]},
+    )
+    body = await response.json()
+
+    assert response.status == HTTPStatus.OK
+    valid, invalid = body.get("results")
+    assert valid.get("valid") is True
+    assert valid.get("user_id") is not None
+    assert valid.get("role") is not None
+    assert valid.get("detail") is None
+    assert invalid.get("valid") is False
+    assert invalid.get("user_id") is None
+    assert invalid.get("role") is None
+    assert invalid.get("detail") == "Token is invalid"
+
+
+def response_tokens(response: ClientResponse) -> Dict[str, str]:
+    """Токены, которые ответ выставил в cookies"""
+    return {
+        name: response.cookies[name].value
+        for name in ("access_token", "refresh_token")
+    }
+
+
+async def signup_tokens(
+    session: aiohttp.ClientSession, login: str
+) -> tuple[str, Dict[str, str]]:
+    """
+    Регистрирует пользователя и возвращает его id
+    и выданные при регистрации токены.
+    """
+    response = await session.post(
+        test_settings.SERVICE_URL + "/api/v1/auth/signup",
+        json={"login": login, "password": "Qwerty123"},
+    )
+    assert response.status == HTTPStatus.CREATED
+    return (await response.json())["id"], response_tokens(response)
+
+
+async def check_tokens(
+    session: aiohttp.ClientSession, tokens: Dict[str, str]
+) -> tuple[HTTPStatus, HTTPStatus]:
+    """Статусы чтения профиля и обновления токенов с этими токенами"""
+    profile = await session.get(
+        test_settings.SERVICE_URL + "/api/v1/profile/", cookies=tokens
+    )
+    refresh = await session.post(
+        test_settings.SERVICE_URL + "/api/v1/auth/token/refresh",
+        cookies=tokens,
+    )
+    return profile.status, refresh.status
+
+
+async def verify_role_status(
+    session: aiohttp.ClientSession, access_token: str, role: str
+) -> HTTPStatus:
+    """Статус проверки роли в access токене, как её делает админка"""
+    response = await session.post(
+        test_settings.SERVICE_URL + "/api/v1/auth/verify",
+        json={"access_token": access_token, "role": role},
+    )
+    return response.status
+
+
+async def test_logout_everywhere_revokes_tokens(
+    make_request: Callable[..., ClientResponse],
+) -> None:
+    """
+    Проверка выхода пользователя на всех девайсах по запросу админа:
+    выданные до него access и refresh токены больше не принимаются,
+    в том числе проверкой прав по refresh токену и проверкой роли.
+    """
+    async with aiohttp.ClientSession(
+        cookie_jar=aiohttp.DummyCookieJar()
+    ) as session:
+        user_id, _ = await signup_tokens(session, "everywhere_admin")
+        response = await make_request(
+            RequestMethods.POST,
+            "/role",
+            "/assign",
+            "",
+            {"role_id": ADMIN_ROLE_ID, "user_id": user_id},
+        )
+        assert response.status == HTTPStatus.NO_CONTENT
+
+        # смена роли отзывает токены - входим заново уже админом
+        response = await session.post(
+            test_settings.SERVICE_URL + "/api/v1/auth/login",
+            json={"login": "everywhere_admin", "password": "Qwerty123"},
+        )
+        assert response.status == HTTPStatus.OK
+        tokens = response_tokens(response)
+        roles_url = test_settings.SERVICE_URL + "/api/v1/role/"
+        response = await session.get(roles_url, cookies=tokens)
+        assert response.status == HTTPStatus.OK
+        access_token = tokens["access_token"]
+        assert (
+            await verify_role_status(session, access_token, "admin")
+            == HTTPStatus.NO_CONTENT
+        )
+        assert (
+            await verify_role_status(session, "not-a-token", "admin")
+            == HTTPStatus.UNAUTHORIZED
+        )
+
+        response = await make_request(
+            RequestMethods.POST, "/users", f"/{user_id}", "logout_everywhere"
+        )
+        assert response.status == HTTPStatus.NO_CONTENT
+
+        response = await session.get(roles_url, cookies=tokens)
+        assert response.status == HTTPStatus.UNAUTHORIZED
+        assert (await response.json()).get("detail") == "Token is revoked"
+        assert (
+            await verify_role_status(session, access_token, "admin")
+            == HTTPStatus.UNAUTHORIZED
+        )
+        assert await check_tokens(session, tokens) == (
+            HTTPStatus.UNAUTHORIZED,
+            HTTPStatus.UNAUTHORIZED,
+        )
+
+
+async def test_password_update_revokes_tokens() -> None:
+    """
+    Проверка смены пароля: прежние access и refresh токены
+    отзываются, а выданная при смене пара сразу действительна.
+    """
+    async with aiohttp.ClientSession(
+        cookie_jar=aiohttp.DummyCookieJar()
+    ) as session:
+        _, old_tokens = await signup_tokens(session, "password_user")
+
+        response = await session.post(
+            test_settings.SERVICE_URL + "/api/v1/auth/password_update",
+            json={"password": "QwertyNewPass"},
+            cookies=old_tokens,
+        )
+        assert response.status == HTTPStatus.OK
+        new_tokens = response_tokens(response)
+
+        assert await check_tokens(session, old_tokens) == (
+            HTTPStatus.UNAUTHORIZED,
+            HTTPStatus.UNAUTHORIZED,
+        )
+        assert (
+            await verify_role_status(
+                session, old_tokens["access_token"], "user"
+            )
+            == HTTPStatus.UNAUTHORIZED
+        )
+        assert await check_tokens(session, new_tokens) == (
+            HTTPStatus.OK,
+            HTTPStatus.OK,
+        )
@@ -0,0 +1,312 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, List
+from uuid import UUID, uuid4
+
+import pytest
+from pydantic import BaseModel
+from redis.asyncio import Redis
+from settings import test_settings
+
+from db.casher.codecs import (
+    CacheEntry,
+    CodecError,
+    CodecRegistry,
+    EntryCodec,
+    JsonCodec,
+)
+from db.casher.keys import KeyBuilder
+from db.casher.lru import LRUCache
+from db.casher.metrics import CACHE_BYTES, CACHE_LOOKUPS, CACHE_OPERATIONS
+from db.redis import RedisCache, cache_method
+
+pytestmark = pytest.mark.asyncio
+
+
+class Item(BaseModel):
+    id: UUID
+    name: str
+    created: datetime
+
+
+class RenamedItem(BaseModel):
+    """Item после изменения схемы"""
+
+    id: UUID
+    title: str
+    created: datetime
+
+
+class FakeSession:
+    """
+    Сессия БД: запросы записываются, ответ - номер запроса,
+    закрытой сессией пользоваться нельзя
+    """
+
+    queries: List[str] = []
+
+    def __init__(self) -> None:
+        self.closed = False
+
+    async def fetch(self, item_id: str) -> str:
+        await asyncio.sleep(0.3)
+        assert not self.closed, "session is closed"
+        self.queries.append(item_id)
+        return f"{item_id}:{len(self.queries)}"
+
+
+@asynccontextmanager
+async def own_session(catalog: "Catalog") -> AsyncIterator["Catalog"]:
+    session = FakeSession()
+    try:
+        yield Catalog(catalog.cache, session)
+    finally:
+        session.closed = True
+
+
+class Catalog:
+    """Сервис запроса: кэш общий, сессия своя у каждого запроса"""
+
+    def __init__(self, cache: RedisCache, session: FakeSession) -> None:
+        self.cache = cache
+        self.session = session
+
+    @cache_method("cache", expire=5, namespace="catalog", detached=own_session)
+    async def item(self, item_id: str) -> str:
+        return await self.session.fetch(item_id)
+
+    @cache_method(
+        "cache",
+        expire=1,
+        stale_ttl=60,
+        xfetch_beta=0,
+        namespace="catalog_price",
+        detached=own_session,
+    )
+    async def price(self, item_id: str) -> str:
+        return await self.session.fetch(item_id)
+
+    @cache_method(
+        "cache",
+        expire=1,
+        stale_ttl=60,
+        xfetch_beta=0,
+        namespace="catalog_inline_price",
+    )
+    async def inline_price(self, item_id: str) -> str:
+        return await self.session.fetch(item_id)
+
+    @cache_method("cache", expire=5, local_size=16, namespace="catalog_local")
+    async def local_item(self, item_id: str) -> str:
+        return await self.session.fetch(item_id)
+
+
+async def test_concurrent_misses_share_one_load() -> None:
+    """
+    Проверка общего вычисления: одновременные промахи по ключу
+    загружают значение один раз, и общее вычисление переживает
+    отмену запроса, который его начал, и закрытие его сессии.
+    """
+    redis = Redis.from_url(test_settings.REDIS_URL)
+    cache = RedisCache(redis)
+    catalogs = [Catalog(cache, FakeSession()) for _ in range(10)]
+    item_id = str(uuid4())
+    FakeSession.queries.clear()
+
+    try:
+        first = asyncio.ensure_future(catalogs[0].item(item_id))
+        await asyncio.sleep(0.1)
+        others = [catalog.item(item_id) for catalog in catalogs[1:]]
+        waiting = asyncio.gather(*others)
+        await asyncio.sleep(0.05)
+        # запрос, начавший загрузку, завершился раньше неё
+        first.cancel()
+        catalogs[0].session.closed = True
+
+        assert await waiting == [f"{item_id}:1"] * 9
+        assert FakeSession.queries == [item_id]
+        assert first.cancelled()
+        assert await catalogs[0].item(item_id) == f"{item_id}:1"
+    finally:
+        await redis.aclose()
+
+
+async def test_stale_value_refreshed_on_own_session() -> None:
+    """
+    Проверка обновления устаревшего значения: с detached запрос
+    сразу получает устаревшее значение, а фоновое обновление идёт
+    на своей сессии и переживает закрытие сессии запроса.
+    Без detached запрос обновляет значение сам.
+    """
+    redis = Redis.from_url(test_settings.REDIS_URL)
+    cache = RedisCache(redis)
+    item_id = str(uuid4())
+    FakeSession.queries.clear()
+
+    try:
+        stale = await Catalog(cache, FakeSession()).price(item_id)
+        inline = await Catalog(cache, FakeSession()).inline_price(item_id)
+        assert (stale, inline) == (f"{item_id}:1", f"{item_id}:2")
+        await asyncio.sleep(1.1)
+
+        request = Catalog(cache, FakeSession())
+        assert await request.price(item_id) == stale
+        request.session.closed = True
+        await asyncio.sleep(0.5)
+        catalog = Catalog(cache, FakeSession())
+        assert await catalog.price(item_id) == f"{item_id}:3"
+
+        assert await catalog.inline_price(item_id) == f"{item_id}:4"
+    finally:
+        await redis.aclose()
+
+
+async def test_lru_evicts_least_recently_used_and_expired() -> None:
+    """
+    Проверка L1: при переполнении вытесняется запись, которую
+    дольше всех не читали, просроченная запись - промах.
+    """
+    now = 0.0
+    lru = LRUCache(maxsize=2, ttl=10, clock=lambda: now)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+
+    assert "b" not in lru
+    assert (lru.get("a"), lru.get("c")) == (1, 3)
+    assert (lru.hits, lru.misses) == (3, 0)
+
+    lru.set("c", 4, ttl=20)
+    now = 10.0
+    assert lru.get("a") is None
+    assert lru.get("c") == 4
+    assert len(lru) == 1
+
+
+async def test_local_cache_serves_hot_values() -> None:
+    """
+    Проверка L1 в cache_method: повторный вызов отдаёт значение
+    из памяти воркера, не читая Redis, а инвалидация сбрасывает
+    запись и в L1.
+    """
+    redis = Redis.from_url(test_settings.REDIS_URL)
+    cache = RedisCache(redis)
+    catalog = Catalog(cache, FakeSession())
+    item_id = str(uuid4())
+    FakeSession.queries.clear()
+
+    try:
+        value = await catalog.local_item(item_id)
+        generation = await cache.generation("catalog_local")
+        await redis.delete(
+            Catalog.local_item.keys.build((item_id,), {}, generation)
+        )
+        assert await catalog.local_item(item_id) == value
+        assert FakeSession.queries == [item_id]
+
+        await Catalog.local_item.invalidate(catalog, item_id)
+        assert await catalog.local_item(item_id) == f"{item_id}:2"
+    finally:
+        await redis.aclose()
+
+
+async def test_codec_round_trip_and_schema_mismatch() -> None:
+    """
+    Проверка кодеков: запись возвращается теми же типами,
+    а запись прежней схемы не разбирается и считается промахом.
+    """
+    items = [Item(id=uuid4(), name="item", created=datetime.now(timezone.utc))]
+    codec = EntryCodec(JsonCodec(List[Item]))
+    entry = CacheEntry(items, fresh_until=1.5, delta=0.25)
+
+    assert codec.loads(codec.dumps(entry)) == entry
+    with pytest.raises(CodecError):
+        EntryCodec(JsonCodec(List[RenamedItem])).loads(codec.dumps(entry))
+
+    redis = Redis.from_url(test_settings.REDIS_URL)
+    registry = CodecRegistry()
+    registry.register("codec_items", JsonCodec(List[Item]))
+    cache = RedisCache(redis, codecs=registry)
+    key = f"codec_items:v1:g0:{uuid4()}"
+
+    try:
+        await cache.set(key, items, 60)
+        assert await cache.get(key) == items
+        registry.register("codec_items", JsonCodec(List[RenamedItem]))
+        assert await cache.get(key) is None
+    finally:
+        await redis.delete(key)
+        await redis.aclose()
+
+
+async def test_generation_bump_invalidates_namespace() -> None:
+    """
+    Проверка ключей: ключ однозначен для аргументов и не зависит
+    от порядка именованных, а увеличение поколения разом сбрасывает
+    все результаты пространства имён.
+    """
+    keys = KeyBuilder("catalog", version=2)
+    assert keys.build(("a",), {"x": 1, "y": None}, 3) == keys.build(
+        ("a",), {"y": None, "x": 1}, 3
+    )
+    assert keys.build(("a|b",), {}) != keys.build(("a", "b"), {})
+    assert keys.build(("a",), {}, 3) == "catalog:v2:g3:sa"
+    assert keys.build(("a" * 100,), {}).startswith("catalog:v2:g0:#")
+    with pytest.raises(ValueError):
+        KeyBuilder("catalog:items")
+
+    redis = Redis.from_url(test_settings.REDIS_URL)
+    catalog = Catalog(RedisCache(redis), FakeSession())
+    item_ids = [str(uuid4()) for _ in range(2)]
+    FakeSession.queries.clear()
+
+    try:
+        for item_id in item_ids:
+            await catalog.item(item_id)
+        await Catalog.item.invalidate_all(catalog)
+        for item_id in item_ids:
+            await catalog.item(item_id)
+        assert FakeSession.queries == item_ids * 2
+    finally:
+        await redis.aclose()
+
+
+async def test_cache_metrics_per_namespace() -> None:
+    """
+    Проверка метрик кэша: операции, попадания, промахи и объём
+    данных считаются по пространству имён ключа.
+    """
+    redis = Redis.from_url(test_settings.REDIS_URL)
+    cache = RedisCache(redis)
+    namespace = "cache_metrics"
+    key = f"{namespace}:{uuid4()}"
+
+    def snapshot() -> tuple[float, ...]:
+        return (
+            CACHE_LOOKUPS.value(namespace=namespace, result="hit"),
+            CACHE_LOOKUPS.value(namespace=namespace, result="miss"),
+            CACHE_OPERATIONS.value(namespace=namespace, operation="get"),
+            CACHE_OPERATIONS.value(namespace=namespace, operation="set"),
+            CACHE_BYTES.value(namespace=namespace, direction="written"),
+        )
+
+    before = snapshot()
+    try:
+        assert await cache.get(key) is None
+        await cache.set(key, {"name": "item"}, 60)
+        assert await cache.get(key) == {"name": "item"}
+    finally:
+        await redis.delete(key)
+        await redis.aclose()
+
+    hits, misses, gets, sets, written = (
+        value - old for value, old in zip(snapshot(), before)
+    )
+    assert (hits, misses, gets, sets) == (1, 1, 2, 1)
+    assert written > 0
+    assert (
+        f'cache_lookups_total{{namespace="{namespace}",result="hit"}}'
+        in CACHE_LOOKUPS.render()
+    )
@@ -0,0 +1,84 @@
+import asyncio
+from http import HTTPStatus
+from uuid import uuid4
+
+import aiohttp
+import pytest
+from redis.asyncio import Redis
+from settings import test_settings
+
+from services.limiter import RateLimiter
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_rate_limit_exhausted() -> None:
+    """
+    Проверка лимита запросов: после исчерпания всплеска сервис
+    отвечает 429 с Retry-After и заголовками X-RateLimit-*.
+    Клиент отдельный - свой адрес в X-Real-IP, чтобы не задеть
+    лимит остальных тестов.
+    """
+    headers = {
+        "X-Real-IP": f"rate-limit-{uuid4()}",
+        "X-Request-Id": str(uuid4()),
+    }
+    url = test_settings.SERVICE_URL + "/.well-known/jwks.json"
+
+    async with aiohttp.ClientSession(
+        cookie_jar=aiohttp.DummyCookieJar(), headers=headers
+    ) as session:
+        response = await session.get(url)
+        if "X-RateLimit-Limit" not in response.headers:
+            pytest.skip("Rate limiter is disabled outside PROD")
+        assert response.status == HTTPStatus.OK
+        limit = int(response.headers["X-RateLimit-Limit"])
+        assert 0 <= int(response.headers["X-RateLimit-Remaining"]) < limit
+
+        # с восстановлением квоты за время запросов
+        # отказ наступает не позже чем через два всплеска
+        for _ in range(limit * 2):
+            response = await session.get(url)
+            if response.status == HTTPStatus.TOO_MANY_REQUESTS:
+                break
+            assert response.status == HTTPStatus.OK
+
+    assert response.status == HTTPStatus.TOO_MANY_REQUESTS
+    assert int(response.headers["Retry-After"]) >= 1
+    assert int(response.headers["X-RateLimit-Limit"]) == limit
+    assert int(response.headers["X-RateLimit-Remaining"]) == 0
+    assert int(response.headers["X-RateLimit-Reset"]) >= 1
+
+
+async def test_rate_limit_lease_blocks_other_worker() -> None:
+    """
+    Проверка аренды квоты: пока один воркер держит арендованные
+    запросы клиента, другому воркеру они недоступны, а после
+    истечения аренды неизрасходованное возвращается в Redis.
+    """
+    redis = Redis.from_url(test_settings.REDIS_URL)
+    identity = f"ip:lease-{uuid4()}"
+    # квота клиента - 3 запроса, восстанавливается раз в 2 секунды
+    first, second, third = (
+        RateLimiter(redis, rate=0.5, burst=3, lease_max=2, lease_ttl=0.2)
+        for _ in range(3)
+    )
+
+    try:
+        # первый запрос арендует один запрос, второй - сразу два
+        assert (await first.check_limit(identity)).allowed
+        assert (await first.check_limit(identity)).allowed
+
+        # клиент сделал два запроса из трёх, но третий у первого воркера
+        result = await second.check_limit(identity)
+        assert not result.allowed
+        assert result.remaining == 0
+        assert result.retry_after > 0
+
+        # истёкшая аренда возвращает неизрасходованный запрос
+        await asyncio.sleep(0.3)
+        await first.reconcile()
+        assert (await third.check_limit(identity)).allowed
+    finally:
+        await redis.delete(first.key(identity))
+        await redis.aclose()
@@ -0,0 +1,48 @@
+from uuid import uuid4
+
+import pytest
+from redis.asyncio import Redis
+from settings import test_settings
+
+from exceptions.errors import UnauthorizedExc
+from services import revocation, signing
+from services.signing import KeyRing, SigningKey, generate_private_key
+from services.token_context import verify_access_tokens
+from services.token_minter import TokenMinter
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_legacy_revocation_rejected_by_ready_replica(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    Проверка отзыва прежнего формата: токен с ключом blacklist:{jti}
+    отклоняется и после синхронизации реплики, когда проверка
+    в Redis уже не ходит. Отдельная база Redis - реплика сервиса
+    этот отзыв не увидит.
+    """
+    redis = Redis.from_url(test_settings.REDIS_URL + "/1")
+    replica = revocation.RevocationReplica(redis, retention=60)
+    key = SigningKey("HS256", generate_private_key("HS256"))
+    minter = TokenMinter(access_ttl=60, refresh_ttl=120)
+    revoked, valid = (minter.mint(key, uuid4(), None) for _ in range(2))
+    legacy_key = replica.store.LEGACY_PREFIX + str(revoked.access.jti)
+    monkeypatch.setattr(signing, "key_ring", KeyRing(key))
+    monkeypatch.setattr(revocation, "revocations", replica)
+
+    try:
+        await redis.set(legacy_key, 1, ex=60)
+        await replica.start()
+        assert replica.ready
+
+        rejected, accepted = await verify_access_tokens(
+            [revoked.access_token, valid.access_token]
+        )
+        assert isinstance(rejected, UnauthorizedExc)
+        assert rejected.detail == "Token is in blacklist"
+        assert accepted.jti == valid.access.jti
+    finally:
+        await replica.close()
+        await redis.delete(legacy_key)
+        await redis.aclose()
@@ -3,7 +3,7 @@ from typing import Any, Callable, Dict, List
 
 import pytest
 from aiohttp import ClientResponse
-from utils.helpers import RequestMethods
+from utils.helpers import ROLE_TARGET_USER_ID, RequestMethods
 
 pytestmark = pytest.mark.asyncio
 
@@ -239,14 +239,14 @@ async def test_update_role(
     [
         pytest.param(
             "ab1d025b-0e33-42e2-bba8-cf7125044263",
-            "afa6b9a3-5db1-4c44-b467-137394c2b167",
+            ROLE_TARGET_USER_ID,
             HTTPStatus.NO_CONTENT,
             None,
             id="correct assign",
         ),
         pytest.param(
             "11111111-b076-4cda-8851-aa056e96725f",
-            "afa6b9a3-5db1-4c44-b467-137394c2b167",
+            ROLE_TARGET_USER_ID,
             HTTPStatus.BAD_REQUEST,
             "Can't assign role",
             id="non-exist role",
@@ -289,14 +289,14 @@ async def test_assign_role(
     [
         pytest.param(
             "ab1d025b-0e33-42e2-bba8-cf7125044263",
-            "afa6b9a3-5db1-4c44-b467-137394c2b167",
+            ROLE_TARGET_USER_ID,
             HTTPStatus.NO_CONTENT,
             None,
             id="correct revoke",
         ),
         pytest.param(
             "11111111-b076-4cda-8851-aa056e96725f",
-            "afa6b9a3-5db1-4c44-b467-137394c2b167",
+            ROLE_TARGET_USER_ID,
             HTTPStatus.BAD_REQUEST,
             "The requested resource was not found",
             id="non-exist role",
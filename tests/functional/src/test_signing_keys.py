@@ -0,0 +1,87 @@
+import asyncio
+import time
+from http import HTTPStatus
+
+import aiohttp
+import jwt
+import pytest
+from redis.asyncio import Redis
+from settings import test_settings
+
+from services.signing import KeyStore, SigningKey, generate_private_key
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_jwks_verifies_issued_token() -> None:
+    """
+    Проверка JWKS: выданный сервисом access токен проверяется
+    опубликованным публичным ключом с kid из заголовка токена.
+    Ключи HS* не публикуются - при общем секрете набор пуст.
+    """
+    async with aiohttp.ClientSession(
+        cookie_jar=aiohttp.DummyCookieJar()
+    ) as session:
+        response = await session.get(
+            test_settings.SERVICE_URL + "/.well-known/jwks.json"
+        )
+        assert response.status == HTTPStatus.OK
+        keys = (await response.json()).get("keys")
+        if not keys:
+            pytest.skip("Tokens are signed with a shared secret")
+
+        response = await session.post(
+            test_settings.SERVICE_URL + "/api/v1/auth/signup",
+            json={"login": "jwks_user", "password": "Qwerty123"},
+        )
+        assert response.status == HTTPStatus.CREATED
+        user_id = (await response.json())["id"]
+        access_token = response.cookies["access_token"].value
+
+    kid = jwt.get_unverified_header(access_token)["kid"]
+    jwk = next(key for key in keys if key["kid"] == kid)
+    assert jwk["use"] == "sig"
+    claims = jwt.decode(
+        access_token, jwt.PyJWK(jwk).key, algorithms=[jwk["alg"]]
+    )
+
+    assert claims["user_id"] == user_id
+    assert claims["exp"] > claims["iat"]
+
+
+async def test_rotated_key_verifies_until_retired() -> None:
+    """
+    Проверка ротации ключей: после публикации нового ключа токен,
+    подписанный прежним, проверяется по своему kid, пока не истёк
+    retire_after, а затем отклоняется и удаляется при очистке.
+    Набор ключей сервиса не трогаем - отдельная база Redis.
+    """
+    redis = Redis.from_url(test_settings.REDIS_URL + "/1")
+    store = KeyStore(redis)
+    keys = (store.KEYS, store.ACTIVE, store.VERSION)
+    default = SigningKey("HS256", generate_private_key("HS256"))
+    old_pem, new_pem = (generate_private_key("ES256") for _ in range(2))
+    old, new = SigningKey("ES256", old_pem), SigningKey("ES256", new_pem)
+
+    try:
+        await redis.delete(*keys)
+        await store.publish(old, old_pem, retire_after=1)
+        ring = await store.build_ring(default)
+        assert ring.active.kid == old.kid
+        token = ring.encode({"user_id": "rotated", "exp": time.time() + 60})
+
+        await store.publish(new, new_pem, retire_after=1)
+        ring = await store.build_ring(default)
+        assert ring.active.kid == new.kid
+        assert jwt.get_unverified_header(ring.encode({}))["kid"] == new.kid
+        assert ring.decode(token)["user_id"] == "rotated"
+
+        await asyncio.sleep(1.1)
+        ring = await store.build_ring(default)
+        assert old.kid not in ring
+        with pytest.raises(jwt.InvalidTokenError):
+            ring.decode(token)
+        assert await store.prune() == [old.kid]
+    finally:
+        await redis.delete(*keys)
+        await redis.aclose()
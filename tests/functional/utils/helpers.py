@@ -10,6 +10,8 @@ from cli.su_management import async_launcher
 from db.postrges_db.psql import PostgresService
 from models.user import Role, User
 
+ROLE_TARGET_USER_ID = "5c0a3e1f-7d2b-4e6a-9f81-2b4d6c8e0a13"
+
 
 class RequestMethods(Enum):
     GET = "GET"
@@ -70,3 +72,35 @@ async def init_users():
             await session.commit()
         except SQLAlchemyError:
             session.rollback()
+
+
+@async_launcher
+async def init_role_target():
+    """
+    Пользователь, которому тесты назначают и отзывают роли:
+    смена роли отзывает токены пользователя, поэтому
+    тестовому админу роли не меняем.
+    """
+    psql = await init_postgresql_service()
+    async for session in psql.session_getter():
+        try:
+            result = await session.execute(
+                select(Role).where(
+                    Role.id == UUID("ab1d025b-0e33-42e2-bba8-cf7125044263")
+                )
+            )
+            role = result.scalars().first()
+
+            user = User(
+                id=UUID(ROLE_TARGET_USER_ID),
+                login="role_target",
+                password_hash=generate_password_hash(
+                    test_settings.TEST_USER_PASSWORD
+                ),
+                roles=[role],
+            )
+
+            session.add(user)
+            await session.commit()
+        except SQLAlchemyError:
+            session.rollback()